@@ -0,0 +1,65 @@
+"""
+Compara el costo por página de preparar la imagen para el OCR:
+
+- anterior: pixmap RGB -> PNG (pix.tobytes) -> Image.open
+- actual:   pixmap en escala de grises -> Image.frombuffer sobre pix.samples
+
+Uso: python benchmark_ocr.py [ruta.pdf] [--dpi 72] [--ocr]
+Con --ocr también se mide el motor de OCR configurado (requiere tesseract instalado).
+"""
+
+import argparse
+import io
+import time
+
+import fitz
+from PIL import Image
+
+from server.utils.ocr_engine import get_ocr_engine
+from server.utils.pdf_reader import pixmap_to_image, render_page
+
+
+def previous_pipeline(page: fitz.Page, dpi: int, consume) -> None:
+    pix = page.get_pixmap(dpi=dpi)
+    img = Image.open(io.BytesIO(pix.tobytes()))
+    img.load()
+    consume(img)
+
+
+def current_pipeline(page: fitz.Page, dpi: int, consume) -> None:
+    pix = render_page(page, dpi)
+    img = pixmap_to_image(pix)
+    try:
+        img.load()
+        consume(img)
+    finally:
+        img.close()
+
+
+def measure(pdf: fitz.Document, pipeline, dpi: int, ocr: bool) -> float:
+    consume = get_ocr_engine().image_to_string if ocr else (lambda img: None)
+    start = time.process_time()
+    for page in pdf:
+        pipeline(page, dpi, consume)
+    return (time.process_time() - start) / pdf.page_count
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default="s1.pdf")
+    parser.add_argument("--dpi", type=int, default=72)
+    parser.add_argument("--ocr", action="store_true")
+    args = parser.parse_args()
+
+    with fitz.open(args.path) as pdf:
+        print(f"{args.path}: {pdf.page_count} páginas a {args.dpi} DPI")
+        previous = measure(pdf, previous_pipeline, args.dpi, args.ocr)
+        current = measure(pdf, current_pipeline, args.dpi, args.ocr)
+
+    print(f"Anterior: {previous * 1000:.2f} ms de CPU por página")
+    print(f"Actual:   {current * 1000:.2f} ms de CPU por página")
+    print(f"Ahorro:   {(previous - current) * 1000:.2f} ms por página")
+
+
+if __name__ == "__main__":
+    main()
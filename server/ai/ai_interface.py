@@ -1,13 +1,31 @@
 import os
+import asyncio
+import collections
 import shutil
 import json
 import uuid
 import subprocess
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
 from functools import lru_cache
+from typing import Any, NamedTuple
+import httpx
 import requests
-from ollama import Client
+from ollama import AsyncClient, Client
+from pydantic import BaseModel
+from .overload import GuardedProvider
+from .router import RouterProvider, parse_backends
+from ..utils.content_cache import ContentCache, hash_bytes
 from ..utils.printer import Printer
-from openai import OpenAI
+from openai import (
+    NOT_GIVEN,
+    AsyncOpenAI,
+    DefaultAsyncHttpxClient,
+    DefaultHttpxClient,
+    OpenAI,
+)
 
 printer = Printer("AI INTERFACE")
 
@@ -19,6 +37,193 @@ SYSTEM_PROMPT_WITH_FEEDBACK_FILE_PATH = os.path.join(CONTEXT_DIR, "SYSTEM_FEEDBA
 
 DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
 
+# Conexiones HTTP que cada proceso mantiene abiertas con el backend del modelo
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 16))
+# Segundos máximos de una petición al modelo y para establecer la conexión
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 600))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 10))
+# Peticiones async simultáneas al modelo desde un mismo proceso
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=LLM_POOL_SIZE, max_keepalive_connections=LLM_POOL_SIZE
+    )
+
+
+def http_timeout() -> httpx.Timeout:
+    return httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+
+
+class ProcessSemaphore:
+    """
+    Semáforo async compartido por todos los event loops del proceso. Cada
+    asyncio.run (uno por tarea, en cada hilo del worker) tiene su propio loop,
+    así que un asyncio.Semaphore solo limitaría las llamadas de ese loop.
+    """
+
+    def __init__(self, value: int):
+        self.value = value
+        self.lock = threading.Lock()
+        self.waiters: collections.deque = collections.deque()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if self.value > 0 and not self.waiters:
+                self.value -= 1
+                return
+            waiter = (loop, loop.create_future())
+            self.waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self.lock:
+                if waiter in self.waiters:
+                    self.waiters.remove(waiter)
+                    raise
+            # El lugar ya se le había pasado a esta espera: se devuelve
+            self.release()
+            raise
+
+    def release(self):
+        with self.lock:
+            # El lugar pasa directo a la espera más antigua con su loop vivo
+            while self.waiters:
+                loop, future = self.waiters.popleft()
+                try:
+                    loop.call_soon_threadsafe(self.wake, future)
+                    return
+                except RuntimeError:
+                    continue
+            self.value += 1
+
+    def wake(self, future: asyncio.Future):
+        if future.done():
+            # Se canceló antes de enterarse; su `acquire` devuelve el lugar
+            return
+        future.set_result(None)
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+_llm_semaphore = ProcessSemaphore(LLM_MAX_CONCURRENCY)
+
+
+def llm_semaphore() -> ProcessSemaphore:
+    return _llm_semaphore
+
+
+class LoopLocalClient:
+    """
+    Crea un cliente async por event loop con `factory` y lo reutiliza. Los
+    clientes quedan ligados al loop en el que se crean; cuando asyncio.run
+    termina se cierran con `close`, con el loop todavía corriendo.
+    """
+
+    def __init__(self, factory, close):
+        self.factory = factory
+        self.close = close
+        self.clients = weakref.WeakKeyDictionary()
+        self.closers = weakref.WeakKeyDictionary()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        if loop not in self.clients:
+            client = self.clients[loop] = self.factory()
+            # asyncio.run cierra los generadores async del loop antes de cerrarlo
+            closer = self.closers[loop] = self.close_on_shutdown(client)
+            loop.create_task(anext(closer))
+        return self.clients[loop]
+
+    async def close_on_shutdown(self, client):
+        try:
+            yield
+        finally:
+            await self.close(client)
+
+
+def warn_if_truncated(finish_reason: str | None, max_tokens: int | None):
+    """
+    Una respuesta cortada no se reintenta: el prompt ya se validó antes de
+    enviarlo, así que repetirlo solo volvería a pagar la misma generación.
+    """
+    if finish_reason == "length":
+        printer.error(
+            f"❌ La respuesta del modelo se cortó al llegar al límite de "
+            f"{max_tokens or 'tokens'} tokens de salida."
+        )
+
+
+class ProviderReply(NamedTuple):
+    """
+    Lo que devuelve un proveedor: el texto (o el mensaje, en las llamadas
+    estructuradas) y por qué terminó la generación ("stop", "length", ...).
+    """
+
+    content: Any
+    finish_reason: str | None = None
+
+
+# Respuestas del modelo indexadas por el hash de la petición completa
+llm_cache = ContentCache.from_env(
+    "LLM_CACHE", namespace="llm", max_bytes=256 * 1024 * 1024
+)
+
+
+class CachedMessage(BaseModel):
+    """Respuesta estructurada leída del cache, con el `content` del proveedor."""
+
+    role: str = "assistant"
+    content: str
+
+
+def llm_cache_key(provider: str, model: str | None, messages: list[dict], **params):
+    """
+    Hash estable de todo lo que determina la respuesta: proveedor, modelo,
+    mensajes (que incluyen la versión del prompt) y parámetros de generación.
+    """
+    payload = json.dumps(
+        {"provider": provider, "model": model, "messages": messages, **params},
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hash_bytes(payload.encode("utf-8"))
+
+
+class TokenSink(ABC):
+    """Recibe los tokens de una respuesta a medida que el modelo los genera."""
+
+    @abstractmethod
+    def write(self, token: str):
+        pass
+
+    def reset(self):
+        """La generación vuelve a empezar, lo recibido hasta ahora se descarta."""
+        pass
+
+
+def dump_debug_response(response, messages: list[dict]):
+    RESPONSES_DIR = os.getenv("RESPONSES_DIR", "server/ai/responses")
+    # Create the directory if it doesn't exist
+    os.makedirs(RESPONSES_DIR, exist_ok=True)
+
+    if DEBUG_MODE:
+        random_id = str(uuid.uuid4())
+        # Save the response to a file
+        with open(f"{RESPONSES_DIR}/{random_id}.json", "w") as f:
+            json.dump(response.model_dump(), f)
+
+        # Save the messages to a file
+        with open(f"{RESPONSES_DIR}/{random_id}_messages.json", "w") as f:
+            json.dump(messages, f)
+
 
 @lru_cache()
 def get_faq_questions() -> list[str]:
@@ -129,8 +334,15 @@ def check_ollama_installation() -> dict:
 
 
 class OllamaProvider:
-    def __init__(self):
-        self.client = Client()
+    def __init__(self, host: str | None = None):
+        # Los argumentos extra se pasan al httpx.Client interno
+        self.client = Client(host=host, timeout=http_timeout(), limits=http_limits())
+        self.async_client = LoopLocalClient(
+            lambda: AsyncClient(
+                host=host, timeout=http_timeout(), limits=http_limits()
+            ),
+            close=lambda client: client._client.aclose(),
+        )
 
     def check_model(self, model: str = "gemma3:1b"):
         """Verifica si el modelo está disponible; si no, lo descarga."""
@@ -145,51 +357,119 @@ class OllamaProvider:
     def embed(self, text: str, model: str = "nomic-embed-text"):
         return self.client.embed(model=model, input=text)
 
+    def options(self, max_tokens: int | None = None) -> dict:
+        options = {
+            "num_ctx": int(os.getenv("CONTEXT_WINDOW_SIZE", 20000))
+            # "num_keep": 15,
+            # "num_thread": 10,
+            # "temperature": 0.8,
+        }
+        if max_tokens:
+            options["num_predict"] = max_tokens
+        return options
+
     def chat(
         self,
         messages: list[dict],
         model: str = "gemma3:1b",
         stream: bool = False,
         tools: list[dict] | list[callable] = [],
+        token_sink: TokenSink | None = None,
+        max_tokens: int | None = None,
     ):
         # self.check_model(model)
         printer.blue(f"Generating completion using: {model}")
-        context_window_size = int(os.getenv("CONTEXT_WINDOW_SIZE", 20000))
-        printer.blue(f"Context window size: {context_window_size}")
+        printer.blue(f"Context window size: {self.options(max_tokens)['num_ctx']}")
         response = self.client.chat(
             model=model,
             messages=messages,
             tools=tools,
             stream=stream,
-            options={
-                "num_ctx": context_window_size
-                # "num_keep": 15,
-                # "num_thread": 10,
-                # "temperature": 0.8,
-            },
+            options=self.options(max_tokens),
         )
-        return response.message.content
+        if not stream:
+            warn_if_truncated(response.done_reason, max_tokens)
+            return ProviderReply(response.message.content, response.done_reason)
+
+        content = []
+        done_reason = None
+        for part in response:
+            token = part.message.content or ""
+            content.append(token)
+            if token_sink and token:
+                token_sink.write(token)
+            done_reason = part.done_reason or done_reason
+        warn_if_truncated(done_reason, max_tokens)
+        return ProviderReply("".join(content), done_reason)
+
+    async def achat(
+        self,
+        messages: list[dict],
+        model: str = "gemma3:1b",
+        tools: list[dict] | list[callable] = [],
+        max_tokens: int | None = None,
+    ):
+        printer.blue(f"Generating async completion using: {model}")
+        response = await self.async_client.get().chat(
+            model=model,
+            messages=messages,
+            tools=tools,
+            options=self.options(max_tokens),
+        )
+        warn_if_truncated(response.done_reason, max_tokens)
+        return ProviderReply(response.message.content, response.done_reason)
 
     def chat_structured(
         self,
         messages: list[dict],
         model: str = "gemma3:1b",
         response_format: dict | None = None,
+        max_tokens: int | None = None,
     ):
-        return self.client.chat(messages, model, response_format=response_format)
-
+        response = self.client.chat(
+            model=model,
+            messages=messages,
+            format=response_format,
+            options=self.options(max_tokens),
+        )
+        warn_if_truncated(response.done_reason, max_tokens)
+        return ProviderReply(response.message, response.done_reason)
 
-def cut_user_message(previous_messages: list[dict], n_characters_to_cut: int):
-    for message in previous_messages:
-        if message["role"] == "user":
-            message["content"] = message["content"][:-n_characters_to_cut]
-    return previous_messages
+    async def achat_structured(
+        self,
+        messages: list[dict],
+        model: str = "gemma3:1b",
+        response_format: dict | None = None,
+        max_tokens: int | None = None,
+    ):
+        response = await self.async_client.get().chat(
+            model=model,
+            messages=messages,
+            format=response_format,
+            options=self.options(max_tokens),
+        )
+        warn_if_truncated(response.done_reason, max_tokens)
+        return ProviderReply(response.message, response.done_reason)
 
 
 class OpenAIProvider:
     def __init__(self, api_key: str, base_url: str = None):
         printer.blue(f"Using OpenAI base URL: {base_url}")
-        self.client = OpenAI(api_key=api_key, base_url=base_url)
+        self.client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=http_timeout(),
+            http_client=DefaultHttpxClient(limits=http_limits()),
+        )
+        self.async_client = LoopLocalClient(
+            lambda: AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                timeout=http_timeout(),
+                http_client=DefaultAsyncHttpxClient(limits=http_limits()),
+            ),
+            close=lambda client: client.close(),
+        )
 
     def check_model(self, model: str):
         return True
@@ -200,6 +480,8 @@ class OpenAIProvider:
         model: str = "gpt-4o-mini",
         stream: bool = False,
         tools: list[dict] | list[callable] = [],
+        token_sink: TokenSink | None = None,
+        max_tokens: int | None = None,
     ):
         printer.blue(f"Generando respuesta con el modelo: {model}")
         response = self.client.chat.completions.create(
@@ -207,69 +489,96 @@ class OpenAIProvider:
             messages=messages,
             tools=tools,
             stream=stream,
+            max_tokens=max_tokens or NOT_GIVEN,
         )
-        RESPONSES_DIR = os.getenv("RESPONSES_DIR", "server/ai/responses")
-        # Create the directory if it doesn't exist
-        os.makedirs(RESPONSES_DIR, exist_ok=True)
-
-        if DEBUG_MODE:
-            random_id = str(uuid.uuid4())
-            # Save the response to a file
-            with open(f"{RESPONSES_DIR}/{random_id}.json", "w") as f:
-                json.dump(response.model_dump(), f)
-
-            # Save the messages to a file
-            with open(f"{RESPONSES_DIR}/{random_id}_messages.json", "w") as f:
-                json.dump(messages, f)
-
-        if response.choices[0].finish_reason == "length":
-            printer.error(
-                "El modelo dió una respuesta incompleta. Cortando el mensaje de la última conversación y reintentando."
-            )
-            messages = cut_user_message(messages, 5000)
-            return self.chat(messages, model, stream, tools)
-
-        return response.choices[0].message.content
+        if stream:
+            content, finish_reason = self.consume_stream(response, token_sink)
+        else:
+            dump_debug_response(response, messages)
+            content = response.choices[0].message.content
+            finish_reason = response.choices[0].finish_reason
+        warn_if_truncated(finish_reason, max_tokens)
+        return ProviderReply(content, finish_reason)
+
+    def consume_stream(
+        self, response, token_sink: TokenSink | None
+    ) -> tuple[str, str | None]:
+        """Lee una respuesta con stream=True reenviando cada token a `token_sink`."""
+        content = []
+        finish_reason = None
+        for chunk in response:
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            token = choice.delta.content or ""
+            if token:
+                content.append(token)
+                if token_sink:
+                    token_sink.write(token)
+            finish_reason = choice.finish_reason or finish_reason
+        return "".join(content), finish_reason
+
+    async def achat(
+        self,
+        messages: list[dict],
+        model: str = "gpt-4o-mini",
+        tools: list[dict] | list[callable] = [],
+        max_tokens: int | None = None,
+    ):
+        printer.blue(f"Generando respuesta async con el modelo: {model}")
+        response = await self.async_client.get().chat.completions.create(
+            model=model,
+            messages=messages,
+            tools=tools,
+            max_tokens=max_tokens or NOT_GIVEN,
+        )
+        dump_debug_response(response, messages)
+        choice = response.choices[0]
+        warn_if_truncated(choice.finish_reason, max_tokens)
+        return ProviderReply(choice.message.content, choice.finish_reason)
 
     def chat_structured(
         self,
         messages: list[dict],
         model: str = "gpt-4o-mini",
         response_format: dict | None = None,
+        max_tokens: int | None = None,
     ):
         printer.blue(f"Generando respuesta con el modelo: {model}")
         response = self.client.chat.completions.create(
             model=model,
             messages=messages,
             response_format=response_format,
+            max_tokens=max_tokens or NOT_GIVEN,
         )
         printer.blue(f"Response: {response}")
-        RESPONSES_DIR = os.getenv("RESPONSES_DIR", "server/ai/responses")
-        # Create the directory if it doesn't exist
-        os.makedirs(RESPONSES_DIR, exist_ok=True)
-
-        if DEBUG_MODE:
-            random_id = str(uuid.uuid4())
-            # Save the response to a file
-            with open(f"{RESPONSES_DIR}/{random_id}.json", "w") as f:
-                json.dump(response.model_dump(), f)
-
-            # Save the messages to a file
-            with open(f"{RESPONSES_DIR}/{random_id}_messages.json", "w") as f:
-                json.dump(messages, f)
-
-        if response.choices[0].finish_reason == "length":
-            printer.error(
-                "El modelo dió una respuesta incompleta. Cortando el mensaje de la última conversación y reintentando."
-            )
-            messages = cut_user_message(messages, 5000)
-            return self.chat_structured(messages, model, response_format)
+        dump_debug_response(response, messages)
+        choice = response.choices[0]
+        warn_if_truncated(choice.finish_reason, max_tokens)
+        return ProviderReply(choice.message, choice.finish_reason)
 
-        return response.choices[0].message
+    async def achat_structured(
+        self,
+        messages: list[dict],
+        model: str = "gpt-4o-mini",
+        response_format: dict | None = None,
+        max_tokens: int | None = None,
+    ):
+        printer.blue(f"Generando respuesta async con el modelo: {model}")
+        response = await self.async_client.get().chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format=response_format,
+            max_tokens=max_tokens or NOT_GIVEN,
+        )
+        dump_debug_response(response, messages)
+        choice = response.choices[0]
+        warn_if_truncated(choice.finish_reason, max_tokens)
+        return ProviderReply(choice.message, choice.finish_reason)
 
 
 class AIInterface:
-    client: OllamaProvider | OpenAIProvider | None = None
+    client: GuardedProvider | RouterProvider | None = None
 
     def __init__(
         self,
@@ -278,15 +587,34 @@ class AIInterface:
         base_url: str = None,
     ):
         self.provider = provider
-        if provider == "ollama":
-            self.client = OllamaProvider()
-        elif provider == "openai":
-            self.client = OpenAIProvider(api_key=api_key, base_url=base_url)
-        else:
+        if provider not in ("ollama", "openai"):
             raise ValueError(f"Provider {provider} not supported")
 
+        # Con varias URLs en base_url las llamadas se reparten entre los backends
+        backends = parse_backends(base_url)
+        if len(backends) > 1:
+            self.client = RouterProvider(
+                backends,
+                lambda url: self.create_provider(api_key, url),
+                health_path="/api/tags" if provider == "ollama" else "/models",
+                health_headers={"Authorization": f"Bearer {api_key}"},
+            )
+        else:
+            # Con un solo backend Ollama sigue usando OLLAMA_HOST
+            self.client = self.create_provider(
+                api_key, None if provider == "ollama" else base_url
+            )
+
         printer.blue("Using AI from", self.provider, "with base URL", base_url)
 
+    def create_provider(self, api_key: str, base_url: str | None) -> GuardedProvider:
+        """Cada backend con su propio límite de concurrencia y circuit breaker."""
+        if self.provider == "ollama":
+            provider = OllamaProvider(host=base_url)
+        else:
+            provider = OpenAIProvider(api_key=api_key, base_url=base_url)
+        return GuardedProvider(provider, name=base_url or self.provider)
+
     def embed(self, text: str, model: str = "nomic-embed-text"):
         return self.client.embed(text, model)
 
@@ -296,33 +624,195 @@ class AIInterface:
         model: str | None = None,
         stream: bool = False,
         tools: list[dict] | list[callable] = [],
+        token_sink: TokenSink | None = None,
+        max_tokens: int | None = None,
+        cache: bool = True,
     ):
-        return self.client.chat(
+        """
+        Con `stream=True` la respuesta se consume a medida que llega y cada token
+        se envía a `token_sink`; igual se devuelve el texto completo.
+        `max_tokens` es la respuesta reservada al validar el prompt.
+        Con `cache=False` no se lee ni se guarda la respuesta en el cache.
+        """
+        key = self.cache_key(cache, model, messages, tools, max_tokens=max_tokens)
+        cached = self.cached_response(key)
+        if cached is not None:
+            # Quien escucha el stream recibe la respuesta completa de una vez
+            if token_sink:
+                token_sink.write(cached)
+            return cached
+
+        started = time.monotonic()
+        reply = self.client.chat(
             model=model,
             messages=messages,
             tools=tools,
             stream=stream,
+            token_sink=token_sink,
+            max_tokens=max_tokens,
         )
+        self.cache_response(key, reply.content, reply.finish_reason, started)
+        return reply.content
 
     def chat_structured(
         self,
         messages: list[dict],
         model: str = "gpt-4o-mini",
         response_format: dict | None = None,
+        max_tokens: int | None = None,
+        cache: bool = True,
     ):
-        return self.client.chat_structured(messages, model, response_format)
+        key = self.cache_key(
+            cache,
+            model,
+            messages,
+            response_format=response_format,
+            max_tokens=max_tokens,
+        )
+        cached = self.cached_response(key)
+        if cached is not None:
+            return CachedMessage(content=cached)
+
+        started = time.monotonic()
+        reply = self.client.chat_structured(
+            messages, model, response_format, max_tokens=max_tokens
+        )
+        message = reply.content
+        self.cache_response(key, message.content, reply.finish_reason, started)
+        return message
+
+    async def achat(
+        self,
+        messages: list[dict],
+        model: str | None = None,
+        tools: list[dict] | list[callable] = [],
+        max_tokens: int | None = None,
+        cache: bool = True,
+    ):
+        """Versión async de `chat`, limitada por LLM_MAX_CONCURRENCY en el proceso."""
+        key = self.cache_key(cache, model, messages, tools, max_tokens=max_tokens)
+        cached = self.cached_response(key)
+        if cached is not None:
+            return cached
+
+        async with llm_semaphore():
+            started = time.monotonic()
+            reply = await self.client.achat(
+                model=model, messages=messages, tools=tools, max_tokens=max_tokens
+            )
+        self.cache_response(key, reply.content, reply.finish_reason, started)
+        return reply.content
+
+    async def achat_structured(
+        self,
+        messages: list[dict],
+        model: str = "gpt-4o-mini",
+        response_format: dict | None = None,
+        max_tokens: int | None = None,
+        cache: bool = True,
+    ):
+        key = self.cache_key(
+            cache,
+            model,
+            messages,
+            response_format=response_format,
+            max_tokens=max_tokens,
+        )
+        cached = self.cached_response(key)
+        if cached is not None:
+            return CachedMessage(content=cached)
+
+        async with llm_semaphore():
+            started = time.monotonic()
+            reply = await self.client.achat_structured(
+                messages, model, response_format, max_tokens=max_tokens
+            )
+        message = reply.content
+        self.cache_response(key, message.content, reply.finish_reason, started)
+        return message
+
+    def cache_key(
+        self,
+        cache: bool,
+        model: str | None,
+        messages: list[dict],
+        tools: list[dict] | list[callable] = [],
+        **params,
+    ) -> str | None:
+        # Las respuestas con herramientas no son solo texto, no se guardan
+        if not cache or tools or not llm_cache.enabled:
+            return None
+        return llm_cache_key(self.provider, model, messages, **params)
+
+    def cached_response(self, key: str | None) -> str | None:
+        if key is None:
+            return None
+        cached = llm_cache.get(key)
+        if cached is not None:
+            printer.green(f"⚡ Respuesta del modelo leída del cache: {key[:12]}")
+        return cached
+
+    def cache_response(
+        self,
+        key: str | None,
+        content: str | None,
+        finish_reason: str | None,
+        started: float,
+    ):
+        # Una respuesta cortada por max_tokens no se guarda: la próxima llamada
+        # idéntica la vuelve a generar en vez de repetir el corte desde el cache
+        if key is None or not content or finish_reason == "length":
+            return
+        llm_cache.set(key, content)
+        # Segundos de generación que los hits futuros se ahorran
+        llm_cache.count("miss_seconds", time.monotonic() - started)
 
     def check_model(self, model: str):
         return self.client.check_model(model)
 
 
+# Un AIInterface por configuración y por proceso; se reinicia después de un fork
+_ai_interfaces: dict[tuple, AIInterface] = {}
+_ai_interfaces_pid: int | None = None
+_ai_interfaces_lock = threading.Lock()
+
+
+def get_ai_interface(
+    provider: str | None = None,
+    api_key: str | None = None,
+    base_url: str | None = None,
+) -> AIInterface:
+    """
+    Devuelve el AIInterface compartido por el proceso, para reutilizar el pool de
+    conexiones HTTP con el backend en lugar de crear un cliente por llamada.
+    Sin argumentos se usa la configuración de PROVIDER, PROVIDER_API_KEY y
+    PROVIDER_BASE_URL.
+    """
+    global _ai_interfaces_pid
+    provider = provider or os.getenv("PROVIDER", "ollama")
+    api_key = api_key or os.getenv("PROVIDER_API_KEY", "asdasd")
+    base_url = base_url or os.getenv("PROVIDER_BASE_URL", None)
+    key = (provider, api_key, base_url)
+    with _ai_interfaces_lock:
+        # Los clientes heredados de otro proceso comparten sockets, no se reutilizan
+        if _ai_interfaces_pid != os.getpid():
+            _ai_interfaces.clear()
+            _ai_interfaces_pid = os.getpid()
+        if key not in _ai_interfaces:
+            _ai_interfaces[key] = AIInterface(
+                provider=provider, api_key=api_key, base_url=base_url
+            )
+        return _ai_interfaces[key]
+
+
 def tokenize_prompt(prompt: str):
     # Leer la URL base del .env o usar valor por defecto
-    # base_url = os.getenv("PROVIDER_BASE_URL", "http://localhost:8009")
-    base_url = "http://localhost:8009"
+    base_url = os.getenv("TOKENIZER_BASE_URL", "http://localhost:8009")
     url = f"{base_url.rstrip('/')}/tokenize"
 
     payload = {"prompt": prompt}
+    if os.getenv("MODEL"):
+        payload["model"] = os.getenv("MODEL")
     headers = {"accept": "application/json", "Content-Type": "application/json"}
 
     response = requests.post(url, json=payload, headers=headers)
@@ -0,0 +1,439 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from typing import Iterator
+import httpx
+from server.utils.printer import Printer
+from server.utils.redis_cache import RedisCache
+
+printer = Printer("LLM OVERLOAD")
+
+# Límite AIMD de peticiones en curso por backend, compartido por todos los procesos
+LLM_ADAPTIVE_LIMIT = os.getenv("LLM_ADAPTIVE_LIMIT", "true").lower() == "true"
+LLM_LIMIT_INITIAL = float(os.getenv("LLM_LIMIT_INITIAL", 8))
+LLM_LIMIT_MIN = float(os.getenv("LLM_LIMIT_MIN", 1))
+LLM_LIMIT_MAX = float(os.getenv("LLM_LIMIT_MAX", 64))
+# Una respuesta más lenta que esto cuenta como señal de saturación. En las llamadas
+# con stream se mide hasta el primer token, porque el resto depende del largo
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", 120))
+# Segundos que una llamada espera un lugar libre antes de diferir el task
+LLM_LIMIT_MAX_WAIT = float(os.getenv("LLM_LIMIT_MAX_WAIT", 30))
+# Errores seguidos que abren el circuito y segundos que queda abierto
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 30))
+# Una petición en curso de un proceso que murió deja de contar pasado este tiempo
+IN_FLIGHT_TTL = float(os.getenv("LLM_TIMEOUT", 600))
+# Factor del límite tras una señal de saturación
+DECREASE_FACTOR = 0.5
+# Espera inicial y máxima entre intentos de conseguir un lugar libre
+POLL_SECONDS = 0.1
+POLL_MAX_SECONDS = 2.0
+
+
+class BackendUnavailableError(RuntimeError):
+    """El backend no puede atender ahora; conviene reintentar en `retry_after` segundos."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class BackendOverloadedError(BackendUnavailableError):
+    pass
+
+
+class CircuitOpenError(BackendUnavailableError):
+    pass
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Errores que indican un backend caído o saturado, no una petición inválida."""
+    while error is not None:
+        if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+            return True
+        status_code = getattr(error, "status_code", None)
+        if isinstance(status_code, int) and status_code >= 500:
+            return True
+        error = error.__cause__
+    return False
+
+
+def backend_unavailable(error: BaseException) -> BackendUnavailableError | None:
+    """El BackendUnavailableError que causó `error`, si lo hay."""
+    while error is not None:
+        if isinstance(error, BackendUnavailableError):
+            return error
+        error = error.__cause__
+    return None
+
+
+def is_overload_signal(error: BaseException) -> bool:
+    """Además de las fallas del backend, un 429 pide bajar el ritmo."""
+    return is_backend_failure(error) or getattr(error, "status_code", None) == 429
+
+
+def poll_delays(deadline: float) -> Iterator[float]:
+    """
+    Esperas entre intentos hasta `deadline`: empiezan en POLL_SECONDS y se duplican
+    hasta POLL_MAX_SECONDS, con jitter para que los procesos no reintenten a la vez.
+    """
+    delay = POLL_SECONDS
+    while (remaining := deadline - time.monotonic()) > 0:
+        yield min(remaining, delay * random.uniform(0.5, 1.5))
+        delay = min(POLL_MAX_SECONDS, delay * 2)
+
+
+class FirstTokenTimer:
+    """
+    Token sink que reenvía los tokens de una respuesta con stream al sink original
+    y registra cuándo llegó el primero.
+    """
+
+    def __init__(self):
+        self.sink = None
+        self.first_token_at: float | None = None
+
+    def wrap(self, sink) -> "FirstTokenTimer":
+        self.sink = sink
+        return self
+
+    def write(self, token: str):
+        if self.first_token_at is None:
+            self.first_token_at = time.monotonic()
+        if self.sink:
+            self.sink.write(token)
+
+    def reset(self):
+        if self.sink:
+            self.sink.reset()
+
+
+class InFlightRequests:
+    """
+    Peticiones en curso hacia un backend, en un sorted set de Redis compartido
+    por la API y todos los workers. Si Redis no responde se usa la cuenta local.
+    """
+
+    def __init__(self, key: str):
+        self.redis = RedisCache()
+        self.key = key
+        self.local = 0
+        self.lock = threading.Lock()
+
+    def add(self) -> str:
+        with self.lock:
+            self.local += 1
+        request_id = uuid.uuid4().hex
+        try:
+            now = time.time()
+            self.redis.zremrangebyscore(self.key, "-inf", now - IN_FLIGHT_TTL)
+            self.redis.zadd(self.key, {request_id: now})
+            self.redis.expire(self.key, int(IN_FLIGHT_TTL))
+        except Exception:
+            pass
+        return request_id
+
+    def remove(self, request_id: str):
+        with self.lock:
+            self.local -= 1
+        try:
+            self.redis.zrem(self.key, request_id)
+        except Exception:
+            pass
+
+    def count(self) -> int:
+        try:
+            return self.redis.zcount(self.key, time.time() - IN_FLIGHT_TTL, "+inf")
+        except Exception:
+            return self.local
+
+
+class AdaptiveLimiter:
+    """
+    Límite de peticiones en curso con AIMD: cada respuesta a tiempo lo sube en
+    1/límite (uno por ronda completa) y cada error, 429 o respuesta (primer token
+    si hay stream) más lenta que LLM_LATENCY_TARGET lo multiplica por
+    DECREASE_FACTOR, como mucho una vez por ronda para que una ráfaga de errores
+    no lo lleve de golpe al mínimo.
+    """
+
+    def __init__(self, name: str):
+        self.redis = RedisCache()
+        self.name = name
+        self.key = f"llm_limit:{name}"
+        self.local_limit = LLM_LIMIT_INITIAL
+
+    def limit(self) -> float:
+        if not LLM_ADAPTIVE_LIMIT:
+            return float("inf")
+        try:
+            value = self.redis.hget(self.key, "limit")
+            if value is not None:
+                self.local_limit = float(value)
+        except Exception:
+            pass
+        return min(LLM_LIMIT_MAX, max(LLM_LIMIT_MIN, self.local_limit))
+
+    def on_success(self, latency: float):
+        if latency > LLM_LATENCY_TARGET:
+            self.decrease(f"respuesta en {latency:.0f} s", latency)
+            return
+        limit = self.limit()
+        if limit >= LLM_LIMIT_MAX:
+            return
+        self.local_limit = limit + 1 / limit
+        try:
+            if self.redis.hget(self.key, "limit") is None:
+                self.redis.hset(self.key, "limit", str(limit))
+            self.redis.hincrbyfloat(self.key, "limit", 1 / limit)
+        except Exception:
+            pass
+
+    def decrease(self, reason: str, window: float):
+        if not LLM_ADAPTIVE_LIMIT:
+            return
+        limit = max(LLM_LIMIT_MIN, self.limit() * DECREASE_FACTOR)
+        try:
+            # Solo la primera señal de la ronda baja el límite
+            if not self.redis.set(
+                f"{self.key}:decreased", "1", ex=max(1, round(window)), nx=True
+            ):
+                return
+            self.redis.hset(self.key, "limit", str(limit))
+        except Exception:
+            pass
+        self.local_limit = limit
+        printer.yellow(f"📉 Límite de {self.name} baja a {limit:.1f} ({reason})")
+
+
+class CircuitBreaker:
+    """
+    Tras LLM_BREAKER_FAILURES errores seguidos del backend el circuito se abre y
+    las llamadas fallan al instante durante LLM_BREAKER_COOLDOWN segundos. Luego
+    pasa una sola llamada de prueba: si responde se cierra, si no se vuelve a abrir.
+    """
+
+    def __init__(self, name: str):
+        self.redis = RedisCache()
+        self.name = name
+        self.key = f"llm_breaker:{name}"
+        self.probe_key = f"{self.key}:probe"
+
+    def state(self) -> dict:
+        try:
+            state = self.redis.hgetall(self.key)
+        except Exception:
+            return {"failures": 0, "open_until": 0.0}
+        return {
+            "failures": int(state.get("failures", 0)),
+            "open_until": float(state.get("open_until", 0)),
+        }
+
+    def check(self) -> bool:
+        """Devuelve True si esta llamada es la de prueba; debe soltarla al terminar."""
+        state = self.state()
+        if state["failures"] < LLM_BREAKER_FAILURES:
+            return False
+        remaining = state["open_until"] - time.time()
+        if remaining > 0:
+            raise CircuitOpenError(
+                f"Circuito abierto para {self.name}, reintentar en {remaining:.0f} s",
+                retry_after=remaining,
+            )
+        # La prueba puede tardar hasta LLM_TIMEOUT; el TTL solo libera la clave
+        # si el proceso que la tomó murió sin soltarla
+        try:
+            probe = self.redis.set(
+                self.probe_key, "1", ex=max(1, round(IN_FLIGHT_TTL)), nx=True
+            )
+        except Exception:
+            return False
+        if not probe:
+            raise CircuitOpenError(
+                f"Circuito de {self.name} a la espera de la llamada de prueba",
+                retry_after=LLM_BREAKER_COOLDOWN,
+            )
+        return True
+
+    def release_probe(self):
+        try:
+            self.redis.delete(self.probe_key)
+        except Exception:
+            pass
+
+    def on_success(self):
+        try:
+            if self.state()["failures"]:
+                self.redis.delete(self.key, self.probe_key)
+                printer.green(f"✅ Circuito de {self.name} cerrado")
+        except Exception:
+            pass
+
+    def on_failure(self, error: BaseException):
+        try:
+            failures = self.redis.hincrby(self.key, "failures", 1)
+            if failures < LLM_BREAKER_FAILURES:
+                return
+            self.redis.hset(
+                self.key, "open_until", str(time.time() + LLM_BREAKER_COOLDOWN)
+            )
+        except Exception:
+            return
+        printer.error(
+            f"❌ Circuito de {self.name} abierto por {LLM_BREAKER_COOLDOWN:.0f} s "
+            f"tras {failures} errores seguidos: {error}"
+        )
+
+
+class LLMGuard:
+    """Limitador adaptativo y circuit breaker de un backend."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.in_flight = InFlightRequests(f"llm_in_flight:{name}")
+        self.limiter = AdaptiveLimiter(name)
+        self.breaker = CircuitBreaker(name)
+
+    def try_acquire(self) -> str | None:
+        request_id = self.in_flight.add()
+        if self.in_flight.count() <= self.limiter.limit():
+            return request_id
+        self.in_flight.remove(request_id)
+        return None
+
+    def overloaded(self) -> BackendOverloadedError:
+        return BackendOverloadedError(
+            f"{self.name} no tuvo lugar libre en {LLM_LIMIT_MAX_WAIT:.0f} s "
+            f"(límite {self.limiter.limit():.1f})",
+            retry_after=LLM_LIMIT_MAX_WAIT,
+        )
+
+    def finish(
+        self,
+        request_id: str,
+        started: float,
+        error: BaseException | None,
+        timer: FirstTokenTimer,
+    ):
+        self.in_flight.remove(request_id)
+        if error is None:
+            self.breaker.on_success()
+            answered = timer.first_token_at
+            if answered is None:
+                answered = time.monotonic()
+            self.limiter.on_success(answered - started)
+            return
+        if is_backend_failure(error):
+            self.breaker.on_failure(error)
+        if is_overload_signal(error):
+            self.limiter.decrease(str(error), time.monotonic() - started)
+
+    @contextmanager
+    def track(self):
+        probe = self.breaker.check()
+        try:
+            delays = poll_delays(time.monotonic() + LLM_LIMIT_MAX_WAIT)
+            while (request_id := self.try_acquire()) is None:
+                delay = next(delays, None)
+                if delay is None:
+                    raise self.overloaded()
+                time.sleep(delay)
+
+            started = time.monotonic()
+            timer = FirstTokenTimer()
+            try:
+                yield timer
+            except BaseException as e:
+                self.finish(request_id, started, e, timer)
+                raise
+            self.finish(request_id, started, None, timer)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    @asynccontextmanager
+    async def atrack(self):
+        probe = self.breaker.check()
+        try:
+            delays = poll_delays(time.monotonic() + LLM_LIMIT_MAX_WAIT)
+            while (request_id := self.try_acquire()) is None:
+                delay = next(delays, None)
+                if delay is None:
+                    raise self.overloaded()
+                await asyncio.sleep(delay)
+
+            started = time.monotonic()
+            timer = FirstTokenTimer()
+            try:
+                yield timer
+            except BaseException as e:
+                self.finish(request_id, started, e, timer)
+                raise
+            self.finish(request_id, started, None, timer)
+        finally:
+            if probe:
+                self.breaker.release_probe()
+
+    def stats(self) -> dict:
+        breaker = self.breaker.state()
+        return {
+            "in_flight": self.in_flight.count(),
+            "limit": self.limiter.limit(),
+            "breaker_failures": breaker["failures"],
+            "breaker_open": breaker["failures"] >= LLM_BREAKER_FAILURES
+            and breaker["open_until"] > time.time(),
+        }
+
+
+# Un guard por backend en el proceso, para exponer sus estadísticas
+GUARDS: dict[str, LLMGuard] = {}
+
+
+def get_llm_guard(name: str) -> LLMGuard:
+    if name not in GUARDS:
+        GUARDS[name] = LLMGuard(name)
+    return GUARDS[name]
+
+
+def get_llm_guard_stats() -> dict:
+    return {name: guard.stats() for name, guard in GUARDS.items()}
+
+
+class GuardedProvider:
+    """Envuelve un proveedor para que cada llamada pase por el guard de su backend."""
+
+    def __init__(self, provider, name: str):
+        self.provider = provider
+        self.guard = get_llm_guard(name)
+
+    def __getattr__(self, name: str):
+        return getattr(self.provider, name)
+
+    def check_model(self, model: str):
+        return self.provider.check_model(model)
+
+    def embed(self, *args, **kwargs):
+        with self.guard.track():
+            return self.provider.embed(*args, **kwargs)
+
+    def chat(self, *args, **kwargs):
+        with self.guard.track() as timer:
+            if kwargs.get("stream"):
+                kwargs["token_sink"] = timer.wrap(kwargs.get("token_sink"))
+            return self.provider.chat(*args, **kwargs)
+
+    def chat_structured(self, *args, **kwargs):
+        with self.guard.track():
+            return self.provider.chat_structured(*args, **kwargs)
+
+    async def achat(self, *args, **kwargs):
+        async with self.guard.atrack():
+            return await self.provider.achat(*args, **kwargs)
+
+    async def achat_structured(self, *args, **kwargs):
+        async with self.guard.atrack():
+            return await self.provider.achat_structured(*args, **kwargs)
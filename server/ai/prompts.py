@@ -0,0 +1,128 @@
+import hashlib
+import os
+import random
+import re
+from functools import lru_cache
+from server.utils.chunker import get_token_counter, prompt_token_budget
+from server.utils.printer import Printer
+from server.utils.redis_cache import RedisCache
+
+printer = Printer("PROMPTS")
+
+PLACEHOLDER = re.compile(r"\{\{(\w+)\}\}")
+# Texto fijo que reemplaza a cada variable dentro del prompt del sistema
+PLACEHOLDER_REFERENCE = "(el contenido de `{name}` está en el mensaje del usuario)"
+# Hash de Redis compartido por todos los procesos
+PREFIX_STATS_KEY = "prompt_prefix_stats"
+# Fracción de los prompts cuyo prefijo se registra en PREFIX_STATS_KEY (0: ninguno,
+# 1: todos); cada registro suma varias idas y vueltas a Redis
+PROMPT_PREFIX_STATS = float(os.getenv("PROMPT_PREFIX_STATS", 0))
+
+redis_cache = RedisCache()
+
+
+class PromptBudgetExceeded(ValueError):
+    """El prompt no cabe en la ventana de contexto junto con la respuesta reservada."""
+
+    def __init__(self, stage: str, prompt_tokens: int, budget: int):
+        self.stage = stage
+        self.prompt_tokens = prompt_tokens
+        self.budget = budget
+        self.overflow = prompt_tokens - budget
+        super().__init__(
+            f"El prompt de {stage} tiene {prompt_tokens} tokens y solo caben "
+            f"{budget} ({self.overflow} de más)"
+        )
+
+
+@lru_cache(maxsize=64)
+def count_prefix_tokens(text: str) -> int:
+    return get_token_counter().count(text)
+
+
+def static_system_prompt(template: str) -> str:
+    """
+    Reemplaza las variables `{{nombre}}` por una referencia fija, de modo que el
+    prompt del sistema sea idéntico byte a byte en todas las peticiones y el
+    backend (vLLM, Ollama) pueda reutilizar su prefijo en cache.
+    """
+    return PLACEHOLDER.sub(
+        lambda match: PLACEHOLDER_REFERENCE.format(name=match.group(1)), template
+    )
+
+
+def format_block(name: str, content: str) -> str:
+    return f"```{name}\n{content}\n```"
+
+
+def build_messages(
+    stage: str,
+    template: str,
+    variables: dict[str, str] | None = None,
+    user_content: str | None = None,
+    max_output_tokens: int | None = None,
+) -> list[dict]:
+    """
+    Arma los mensajes de una etapa con las instrucciones estáticas primero y el
+    contenido variable después. `variables` va en el mensaje del usuario en el
+    orden recibido, por lo que conviene pasar primero lo que cambia menos
+    (feedback) y al final lo que cambia en cada petición (documento, historial).
+
+    Con `max_output_tokens` se verifica antes de enviar que el prompt quepa en
+    la ventana de contexto junto con la respuesta; si no, lanza
+    PromptBudgetExceeded para que la etapa divida o comprima su contenido.
+    """
+    system_prompt = static_system_prompt(template)
+    blocks = [format_block(name, value) for name, value in (variables or {}).items()]
+    if user_content:
+        blocks.append(user_content)
+
+    if random.random() < PROMPT_PREFIX_STATS:
+        record_prefix(stage, system_prompt)
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": "\n\n".join(blocks)},
+    ]
+    if max_output_tokens is not None:
+        preflight(stage, messages, max_output_tokens)
+    return messages
+
+
+def preflight(stage: str, messages: list[dict], max_output_tokens: int) -> int:
+    """Cuenta los tokens del prompt y verifica que quepan. Devuelve la cuenta."""
+    system, user = messages
+    prompt_tokens = count_prefix_tokens(system["content"])
+    prompt_tokens += get_token_counter().count(user["content"])
+    budget = prompt_token_budget(max_output_tokens)
+    if prompt_tokens > budget:
+        raise PromptBudgetExceeded(stage, prompt_tokens, budget)
+    return prompt_tokens
+
+
+def record_prefix(stage: str, prefix: str):
+    """
+    Registra cuántos tokens tiene el prefijo estable de cada etapa y cuántas
+    peticiones lo repitieron sin cambios respecto a la anterior. Con muestreo
+    (PROMPT_PREFIX_STATS < 1) solo cuentan las peticiones registradas.
+    """
+    tokens = count_prefix_tokens(prefix)
+    sha = hashlib.sha256(prefix.encode("utf-8")).hexdigest()[:12]
+    printer.blue(f"Prefijo estable de {stage}: {tokens} tokens ({sha})")
+    try:
+        previous_sha = redis_cache.hget(PREFIX_STATS_KEY, f"{stage}:sha")
+        redis_cache.hset(PREFIX_STATS_KEY, f"{stage}:sha", sha)
+        redis_cache.hset(PREFIX_STATS_KEY, f"{stage}:tokens", str(tokens))
+        redis_cache.hincrby(PREFIX_STATS_KEY, f"{stage}:requests", 1)
+        if previous_sha == sha:
+            redis_cache.hincrby(PREFIX_STATS_KEY, f"{stage}:reused", 1)
+    except Exception as e:
+        printer.error(f"❌ Error guardando las estadísticas del prompt {stage}: {e}")
+
+
+def get_prompt_prefix_stats() -> dict:
+    """Estadísticas de todos los procesos, agrupadas por etapa."""
+    stats: dict[str, dict] = {}
+    for field, value in redis_cache.hgetall(PREFIX_STATS_KEY).items():
+        stage, name = field.rsplit(":", 1)
+        stats.setdefault(stage, {})[name] = value if name == "sha" else int(value)
+    return stats
@@ -0,0 +1,252 @@
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+import httpx
+from server.ai.overload import backend_unavailable, is_backend_failure
+from server.utils.printer import Printer
+
+printer = Printer("LLM ROUTER")
+
+# least_requests: menos peticiones en curso por unidad de peso
+# latency: además pondera por la latencia reciente de cada backend
+LLM_ROUTING_STRATEGY = os.getenv("LLM_ROUTING_STRATEGY", "least_requests").lower()
+# Segundos entre health checks y errores seguidos que sacan a un backend de la rotación
+LLM_HEALTH_CHECK_INTERVAL = float(os.getenv("LLM_HEALTH_CHECK_INTERVAL", 10))
+LLM_BACKEND_MAX_FAILURES = int(os.getenv("LLM_BACKEND_MAX_FAILURES", 3))
+# Peso de la última petición en el promedio móvil de latencia
+LATENCY_EWMA_ALPHA = 0.3
+
+
+def parse_backends(base_url: str | None) -> list[tuple[str, float]]:
+    """
+    Lee una lista `url|peso,url|peso` (el peso es opcional y vale 1 por defecto),
+    como la que admite PROVIDER_BASE_URL para repartir la carga entre backends.
+    """
+    backends = []
+    for entry in map(str.strip, (base_url or "").split(",")):
+        if not entry:
+            continue
+        url, _, weight = entry.partition("|")
+        backends.append((url.strip(), float(weight) if weight.strip() else 1.0))
+    return backends
+
+
+def with_scheme(url: str) -> str:
+    return url if "://" in url else f"http://{url}"
+
+
+def should_fail_over(error: BaseException) -> bool:
+    # Un backend saturado o con el circuito abierto no sale de la rotación,
+    # pero la llamada igual puede ir al siguiente
+    return is_backend_failure(error) or backend_unavailable(error) is not None
+
+
+class Backend:
+    """
+    Un backend de la rotación. Las peticiones en curso son las que cuenta el
+    guard del proveedor (server/ai/overload.py), compartidas por la API y todos
+    los workers, de modo que cada proceso ve la carga total.
+    """
+
+    def __init__(self, url: str, weight: float, provider, health_url: str):
+        self.url = url
+        self.weight = max(weight, 0.01)
+        self.provider = provider
+        self.health_url = health_url
+        self.latency: float | None = None
+        self.failures = 0
+        self.healthy = True
+        self.lock = threading.Lock()
+
+    def outstanding(self) -> int:
+        guard = getattr(self.provider, "guard", None)
+        return guard.in_flight.count() if guard else 0
+
+    def score(self) -> float:
+        score = (self.outstanding() + 1) / self.weight
+        if LLM_ROUTING_STRATEGY == "latency" and self.latency is not None:
+            score *= self.latency
+        return score
+
+    def end(self, started: float, error: BaseException | None):
+        with self.lock:
+            if error is not None and is_backend_failure(error):
+                self.failures += 1
+                if self.healthy and self.failures >= LLM_BACKEND_MAX_FAILURES:
+                    self.eject(f"{self.failures} errores seguidos: {error}")
+                return
+            # Los rechazos del guard (circuito abierto, saturado) y los errores de
+            # la petición no dicen si el backend se recuperó: no cortan la racha
+            if error is not None:
+                return
+            self.failures = 0
+            elapsed = time.monotonic() - started
+            self.latency = (
+                elapsed
+                if self.latency is None
+                else LATENCY_EWMA_ALPHA * elapsed
+                + (1 - LATENCY_EWMA_ALPHA) * self.latency
+            )
+
+    def eject(self, reason: str):
+        self.healthy = False
+        printer.error(f"❌ Backend {self.url} fuera de la rotación: {reason}")
+
+    def readmit(self):
+        self.healthy = True
+        self.failures = 0
+        printer.green(f"✅ Backend {self.url} de vuelta en la rotación")
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "in_flight": self.outstanding(),
+            "latency": self.latency,
+            "failures": self.failures,
+        }
+
+
+class RouterProvider:
+    """
+    Reparte las llamadas entre varios backends del mismo tipo (vLLM u Ollama).
+    Cada llamada va al backend sano con menos peticiones en curso según su peso;
+    si falla por un error del backend se reintenta una vez en el siguiente.
+    Los backends salen de la rotación tras LLM_BACKEND_MAX_FAILURES errores
+    seguidos o un health check fallido, y vuelven con el siguiente que pase.
+    """
+
+    def __init__(
+        self,
+        backends: list[tuple[str, float]],
+        provider_factory: Callable[[str], object],
+        health_path: str,
+        health_headers: dict | None = None,
+    ):
+        self.backends = [
+            Backend(
+                url,
+                weight,
+                provider_factory(url),
+                with_scheme(url).rstrip("/") + health_path,
+            )
+            for url, weight in backends
+        ]
+        self.health_headers = health_headers or {}
+        self.lock = threading.Lock()
+        self.health_pid: int | None = None
+        printer.blue(
+            "Repartiendo las llamadas entre: "
+            + ", ".join(f"{b.url} (peso {b.weight:g})" for b in self.backends)
+        )
+
+    # =========================
+    # Selección
+    # =========================
+
+    def candidates(self) -> list[Backend]:
+        self.start_health_checks()
+        healthy = [b for b in self.backends if b.healthy]
+        if not healthy:
+            # Sin backends sanos se intenta igual antes que fallar sin probar
+            printer.yellow("⚠️ Ningún backend sano, se prueba con todos")
+            healthy = self.backends
+        # Los empates se reparten al azar para que los procesos no elijan todos igual
+        return sorted(healthy, key=lambda b: (b.score(), random.random()))
+
+    @contextmanager
+    def track(self, backend: Backend):
+        started = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            backend.end(started, e)
+            raise
+        backend.end(started, None)
+
+    def call(self, method: str, *args, **kwargs):
+        attempts = self.candidates()[:2]
+        for attempt, backend in enumerate(attempts, start=1):
+            try:
+                with self.track(backend):
+                    return getattr(backend.provider, method)(*args, **kwargs)
+            except Exception as e:
+                if attempt == len(attempts) or not should_fail_over(e):
+                    raise
+                printer.yellow(f"🔁 {backend.url} falló ({e}), probando otro backend")
+                # Lo que se alcanzó a transmitir del intento fallido se descarta
+                if kwargs.get("token_sink"):
+                    kwargs["token_sink"].reset()
+
+    async def acall(self, method: str, *args, **kwargs):
+        attempts = self.candidates()[:2]
+        for attempt, backend in enumerate(attempts, start=1):
+            try:
+                with self.track(backend):
+                    return await getattr(backend.provider, method)(*args, **kwargs)
+            except Exception as e:
+                if attempt == len(attempts) or not should_fail_over(e):
+                    raise
+                printer.yellow(f"🔁 {backend.url} falló ({e}), probando otro backend")
+
+    # =========================
+    # Interfaz del proveedor
+    # =========================
+
+    def check_model(self, model: str):
+        return self.call("check_model", model)
+
+    def embed(self, text: str, model: str = "nomic-embed-text"):
+        return self.call("embed", text, model)
+
+    def chat(self, *args, **kwargs):
+        return self.call("chat", *args, **kwargs)
+
+    def chat_structured(self, *args, **kwargs):
+        return self.call("chat_structured", *args, **kwargs)
+
+    async def achat(self, *args, **kwargs):
+        return await self.acall("achat", *args, **kwargs)
+
+    async def achat_structured(self, *args, **kwargs):
+        return await self.acall("achat_structured", *args, **kwargs)
+
+    # =========================
+    # Health checks
+    # =========================
+
+    def start_health_checks(self):
+        if LLM_HEALTH_CHECK_INTERVAL <= 0:
+            return
+        with self.lock:
+            # Después de un fork el hilo del proceso padre no existe en el hijo
+            if self.health_pid == os.getpid():
+                return
+            self.health_pid = os.getpid()
+            threading.Thread(
+                target=self.health_loop, name="llm-health-checks", daemon=True
+            ).start()
+
+    def health_loop(self):
+        with httpx.Client(timeout=5, headers=self.health_headers) as client:
+            while True:
+                time.sleep(LLM_HEALTH_CHECK_INTERVAL)
+                self.check_health(client)
+
+    def check_health(self, client: httpx.Client):
+        for backend in self.backends:
+            try:
+                client.get(backend.health_url).raise_for_status()
+            except Exception as e:
+                if backend.healthy:
+                    backend.eject(f"health check fallido: {e}")
+                continue
+            if not backend.healthy:
+                backend.readmit()
+
+    def stats(self) -> list[dict]:
+        return [backend.stats() for backend in self.backends]
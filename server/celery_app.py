@@ -26,6 +26,8 @@ celery.conf.update(
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
+    # La ingesta (lectura y OCR) puede ir a una cola propia atendida por workers dedicados
+    task_routes={"ingest": {"queue": os.getenv("INGESTION_QUEUE", "celery")}},
 )
 
 # Ajuste dinámico del pool según el sistema operativo
@@ -1,364 +1,501 @@
-import json
-
-import traceback
-from fastapi import APIRouter, UploadFile, File, Request
-from fastapi.responses import JSONResponse
-
-import shutil
-import os
-
-from pydantic import BaseModel
-
-from typing import List
-from fastapi import HTTPException
-from server.utils.printer import Printer
-from server.utils.redis_cache import RedisCache
-from server.utils.processor import (
-    read_sources,
-    upsert_feedback_in_redis,
-    hasher,
-    EXPIRATION_TIME,
-    validate_attachments,
-)
-from server.ai.ai_interface import get_warning_text
-from server.utils.csv_logger import CSVLogger
-from server.utils.interaction_logger import InteractionLogger
-from server.tasks import update_brief_task, extractor_task, generate_feedback_task
-
-
-csv_logger = CSVLogger()
-interaction_logger = InteractionLogger()
-
-DEFAULT_CACHE_BEHAVIOR = os.environ.get("DEFAULT_CACHE_BEHAVIOR", "false")
-if DEFAULT_CACHE_BEHAVIOR.lower().strip() == "true":
-    DEFAULT_CACHE_BEHAVIOR = True
-else:
-    DEFAULT_CACHE_BEHAVIOR = False
-
-
-UPLOADS_PATH = "uploads"
-os.makedirs(f"{UPLOADS_PATH}/images", exist_ok=True)
-os.makedirs(f"{UPLOADS_PATH}/documents", exist_ok=True)
-
-router = APIRouter(prefix="/api")
-printer = Printer("ROUTES")
-redis_cache = RedisCache()
-
-
-@router.get("/sentencia/{hash}")
-async def get_sentence_brief_route(hash: str):
-
-    printer.yellow(f"🔄 Buscando sentencia ciudadana en cache: {hash}")
-    sentencia = redis_cache.get(f"sentence_brief:{hash}")
-
-    if not sentencia:
-        csv_logger.log(
-            "GET /sentencia/{hash}",
-            404,
-            hash,
-            "No se encontró la sentencia ciudadana.",
-            exit_status=1,
-        )
-        raise HTTPException(
-            status_code=404,
-            detail={
-                "status": "ERROR",
-                "message": "No se encontró la sentencia ciudadana.",
-            },
-        )
-
-    csv_logger.log(
-        "GET /sentencia/{hash}",
-        200,
-        hash,
-        "Sentencia ciudadana encontrada en caché.",
-        exit_status=0,
-    )
-
-    redis_cache.delete(f"sentence_brief:{hash}")
-    sentece_json = json.loads(sentencia)
-
-    return JSONResponse(
-        content={
-            "status": "SUCCESS",
-            "message": sentece_json.get(
-                "message", "Sentencia ciudadana encontrada en caché."
-            ),
-            "workflow": sentece_json.get("workflow", "update"),
-            "brief": sentece_json.get("sentence", ""),
-            "hash": hash,
-            "warning": get_warning_text(),
-            "storage_status": "DELETED",
-            "rejected": sentece_json.get("rejected", False),
-        },
-        status_code=200,
-    )
-
-
-class SentenceRequestChangesPayload(BaseModel):
-    sentence: str
-    changes: str
-    prev_messages: str
-
-
-@router.post("/sentencia/{hash}/request-changes")
-async def request_changes_route(
-    hash: str, payload: SentenceRequestChangesPayload, request: Request
-):
-    try:
-        username = request.headers.get("username")
-        if not username:
-            raise HTTPException(
-                status_code=400,
-                detail={"status": "ERROR", "message": "Falta el header 'username'."},
-            )
-        sentence = payload.sentence
-        if not sentence:
-            raise HTTPException(
-                status_code=404,
-                detail={
-                    "status": "ERROR",
-                    "message": "No se encontró la sentencia ciudadana.",
-                },
-            )
-
-        printer.yellow("🔄 Actualizando sentencia ciudadana en otro hilo...")
-
-        update_brief_task.delay(hash, sentence, payload.changes, payload.prev_messages)
-
-        interaction_logger.log(
-            username=username,
-            hash_=hash,
-            message=payload.changes,
-        )
-
-        csv_logger.log(
-            "POST /sentencia/{hash}/request-changes",
-            201,
-            hash,
-            "Solicitud de cambios enviada con éxito.",
-            exit_status=0,
-        )
-        return JSONResponse(
-            content={
-                "status": "QUEUED",
-                "message": "Los cambios se aplicarán en unos minutos.",
-                "changes": payload.changes,
-                "hash": hash,
-            },
-            status_code=201,
-        )
-    except Exception as e:
-        printer.error(f"❌ Error al solicitar cambios de una sentencia: {e}")
-        csv_logger.log(
-            "POST /sentencia/{hash}/request-changes",
-            500,
-            hash,
-            f"Error al solicitar cambios de una sentencia: {e}",
-            exit_status=1,
-        )
-        raise HTTPException(
-            status_code=500,
-            detail={"status": "ERROR", "message": str(e)},
-        )
-
-
-class FeedbackRequest(BaseModel):
-    hash: str
-    feedback: str
-
-
-@router.post("/feedback")
-async def feedback_route(payload: FeedbackRequest):
-    try:
-        upsert_feedback_in_redis(payload.feedback)
-        return JSONResponse(
-            content={
-                "status": "SUCCESS",
-                "message": "Feedback procesado con éxito.",
-                "hash": payload.hash,
-            },
-            status_code=200,
-        )
-    except Exception as e:
-        printer.error(f"❌ Error al procesar el feedback: {e}")
-        raise HTTPException(
-            status_code=500, detail={"status": "ERROR", "message": str(e)}
-        )
-
-
-@router.post("/generate-sentence-brief")
-async def generate_sentence_brief_route(
-    images: List[UploadFile] = File([]),
-    documents: List[UploadFile] = File([]),
-):
-    tb = ""
-    try:
-        if not images and not documents:
-            printer.error(
-                "Debes enviar al menos un documento o una imagen para generar la sentencia ciudadana."
-            )
-            csv_logger.log(
-                "POST /generate-sentence-brief",
-                400,
-                None,
-                "Debes enviar al menos un documento o una imagen para generar la sentencia ciudadana.",
-                exit_status=1,
-            )
-            raise HTTPException(
-                status_code=400,
-                detail={
-                    "status": "ERROR",
-                    "message": "Debes enviar al menos un documento o una imagen para generar la sentencia ciudadana.",
-                },
-            )
-
-        images, documents = validate_attachments(images, documents)
-
-        printer.yellow(f"🔍 Imágenes validas: {len(images)}")
-        printer.yellow(f"🔍 Documentos validos: {len(documents)}")
-
-        document_paths: list[str] = []
-        images_paths: list[str] = []
-
-        for image in images:
-            image_path = f"{UPLOADS_PATH}/images/{image.filename}"
-            images_paths.append(image_path)
-            with open(image_path, "wb") as buffer:
-                shutil.copyfileobj(image.file, buffer)
-
-        for document in documents:
-            document_path = f"{UPLOADS_PATH}/documents/{document.filename}"
-            document_paths.append(document_path)
-            with open(document_path, "wb") as buffer:
-                shutil.copyfileobj(document.file, buffer)
-
-        complete_text = read_sources(document_paths, images_paths)
-        source_hash = hasher(complete_text)
-
-        redis_cache.set(f"source_text:{source_hash}", complete_text, ex=EXPIRATION_TIME)
-
-        for image_path in images_paths:
-            try:
-                os.remove(image_path)
-            except Exception as e:
-                tb += f"❌ Error al eliminar la imagen: {e}\n"
-                printer.error(f"❌ Error al eliminar la imagen: {e}")
-        for document_path in document_paths:
-            try:
-                os.remove(document_path)
-            except Exception as e:
-                tb += f"❌ Error al eliminar el documento: {e}\n"
-                printer.error(f"❌ Error al eliminar el documento: {e}")
-
-        printer.yellow(
-            f"🔄 Enviando tarea de generación de sentencia ciudadana a cola de tareas, HASH: {source_hash}"
-        )
-        extractor_task.delay(source_hash)
-
-        printer.green(
-            f"Sentencia ciudadana en proceso de generación en segundo plano, HASH: {source_hash}"
-        )
-        message_to_log = (
-            "Sentencia ciudadana en cola..." + "\nTRACEBACK: " + tb
-            if tb
-            else "Sentencia ciudadana en cola..."
-        )
-
-        csv_logger.log(
-            "POST /generate-sentence-brief",
-            201,
-            source_hash,
-            message_to_log,
-            exit_status=0,
-        )
-
-        return JSONResponse(
-            content={
-                "status": "QUEUED",
-                "message": "Sentencia ciudadana en cola...",
-                "hash": source_hash,
-                "text_from_all_documents": complete_text,
-            },
-            status_code=201,
-        )
-    except Exception as e:
-        tb = traceback.format_exc()
-        printer.error(f"❌ Error al generar la sentencia ciudadana: {e}")
-        printer.error(tb)
-        printer.error("🔍 Eliminando archivos temporales...")
-
-        for image_path in images_paths:
-            try:
-                os.remove(image_path)
-            except Exception as e:
-                tb += f"❌ Error al eliminar la imagen: {e}\n"
-                tb += "Borrar manualmente si es necesario\n"
-                printer.error(f"❌ Error al eliminar la imagen: {e}")
-        for document_path in document_paths:
-            try:
-                os.remove(document_path)
-            except Exception as e:
-                tb += f"❌ Error al eliminar el documento: {e}\n"
-                tb += "Borrar manualmente si es necesario\n"
-                printer.error(
-                    f"❌ Error al eliminar el documento: {e} Borrar manualmente si es necesario"
-                )
-
-        raise HTTPException(
-            status_code=500,
-            detail={"status": "ERROR", "message": str(e)},
-        )
-
-
-class FeedbackGenerateRequest(BaseModel):
-    hash: str
-    messages: str
-
-
-@router.post("/generate-feedback")
-async def generate_feedback_route(payload: FeedbackGenerateRequest):
-    try:
-        printer.yellow(
-            f"🔄 Enviando tarea de generación de feedback a cola de tareas, HASH: {payload.hash}"
-        )
-        generate_feedback_task.delay(payload.hash, payload.messages)
-        return JSONResponse(
-            content={
-                "status": "QUEUED",
-                "message": "Feedback en cola...",
-                "hash": payload.hash,
-            },
-        )
-    except Exception as e:
-        printer.error(f"❌ Error al generar el feedback: {e}")
-        raise HTTPException(
-            status_code=500, detail={"status": "ERROR", "message": str(e)}
-        )
-
-
-@router.get("/feedback/{hash}")
-async def get_feedback_route(hash: str):
-    try:
-        feedback = redis_cache.get(f"feedback:{hash}")
-        if not feedback:
-            raise HTTPException(
-                status_code=404,
-                detail={"status": "ERROR", "message": "No se encontró el feedback."},
-            )
-        redis_cache.delete(f"feedback:{hash}")
-        return JSONResponse(
-            content={
-                "status": "SUCCESS",
-                "message": "Feedback obtenido con éxito.",
-                "feedback": feedback,
-            },
-            status_code=200,
-        )
-    except HTTPException as e:
-        raise e
-    except Exception as e:
-        printer.error(f"❌ Error al obtener el feedback: {e}")
-        raise HTTPException(
-            status_code=500, detail={"status": "ERROR", "message": str(e)}
-        )
+import json
+import time
+
+import traceback
+from fastapi import APIRouter, UploadFile, File, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+import os
+
+from pydantic import BaseModel
+
+from typing import List
+from fastapi import HTTPException
+from server.utils.printer import Printer
+from server.utils.redis_cache import AsyncRedisCache, RedisCache
+from server.utils.token_stream import sentence_stream_key
+from server.utils.notifications import wait_for_result
+from server.utils.processor import (
+    upsert_feedback_in_redis,
+    hash_sources,
+    claim_ingest_job,
+    release_ingest_job,
+    store_uploaded_sources,
+    validate_attachments,
+)
+from server.ai.ai_interface import get_warning_text
+from server.utils.uploads import read_upload
+from server.utils.content_cache import get_cache_stats
+from server.ai.prompts import get_prompt_prefix_stats
+from server.ai.overload import get_llm_guard_stats
+from server.utils.csv_logger import CSVLogger
+from server.utils.interaction_logger import InteractionLogger
+from server.tasks import update_brief_task, ingest_task, generate_feedback_task
+
+
+csv_logger = CSVLogger()
+interaction_logger = InteractionLogger()
+
+DEFAULT_CACHE_BEHAVIOR = os.environ.get("DEFAULT_CACHE_BEHAVIOR", "false")
+if DEFAULT_CACHE_BEHAVIOR.lower().strip() == "true":
+    DEFAULT_CACHE_BEHAVIOR = True
+else:
+    DEFAULT_CACHE_BEHAVIOR = False
+
+# Segundos máximos que una conexión SSE espera la sentencia
+SENTENCE_STREAM_TIMEOUT = int(os.getenv("SENTENCE_STREAM_TIMEOUT", 900))
+# Segundos que esperan por defecto (y como máximo) las rutas de long-poll
+LONG_POLL_TIMEOUT = float(os.getenv("LONG_POLL_TIMEOUT", 30))
+LONG_POLL_MAX_TIMEOUT = float(os.getenv("LONG_POLL_MAX_TIMEOUT", 120))
+
+router = APIRouter(prefix="/api")
+printer = Printer("ROUTES")
+redis_cache = RedisCache()
+async_redis_cache = AsyncRedisCache()
+
+
+@router.get("/sentencia/{hash}")
+async def get_sentence_brief_route(hash: str):
+
+    printer.yellow(f"🔄 Buscando sentencia ciudadana en cache: {hash}")
+    sentencia = redis_cache.get(f"sentence_brief:{hash}")
+
+    if not sentencia:
+        csv_logger.log(
+            "GET /sentencia/{hash}",
+            404,
+            hash,
+            "No se encontró la sentencia ciudadana.",
+            exit_status=1,
+        )
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "status": "ERROR",
+                "message": "No se encontró la sentencia ciudadana.",
+            },
+        )
+
+    return sentence_brief_response(hash, sentencia, "GET /sentencia/{hash}")
+
+
+def sentence_brief_content(hash: str, sentece_json: dict) -> dict:
+    return {
+        "status": "SUCCESS",
+        "message": sentece_json.get(
+            "message", "Sentencia ciudadana encontrada en caché."
+        ),
+        "workflow": sentece_json.get("workflow", "update"),
+        "brief": sentece_json.get("sentence", ""),
+        "hash": hash,
+        "warning": get_warning_text(),
+        "storage_status": "DELETED",
+        "rejected": sentece_json.get("rejected", False),
+    }
+
+
+def sentence_brief_response(
+    hash: str, sentencia: str, endpoint: str
+) -> JSONResponse:
+    csv_logger.log(
+        endpoint,
+        200,
+        hash,
+        "Sentencia ciudadana encontrada en caché.",
+        exit_status=0,
+    )
+
+    redis_cache.delete(f"sentence_brief:{hash}")
+    sentece_json = json.loads(sentencia)
+
+    return JSONResponse(
+        content=sentence_brief_content(hash, sentece_json),
+        status_code=200,
+    )
+
+
+def pending_response(hash: str, message: str) -> JSONResponse:
+    # Sin log en CSV: es el caso normal mientras el task sigue trabajando
+    return JSONResponse(
+        content={"status": "PENDING", "message": message, "hash": hash},
+        status_code=202,
+    )
+
+
+@router.get("/sentencia/{hash}/wait")
+async def wait_sentence_brief_route(
+    hash: str,
+    timeout: float = Query(LONG_POLL_TIMEOUT, ge=0, le=LONG_POLL_MAX_TIMEOUT),
+):
+    """
+    Long-poll: responde en cuanto la sentencia está lista (igual que
+    GET /sentencia/{hash}) o con 202 si se agota `timeout` antes.
+    """
+    key = f"sentence_brief:{hash}"
+    event = await wait_for_result("sentence_brief", hash, key, timeout)
+    if event is None:
+        return pending_response(hash, "La sentencia ciudadana sigue en proceso.")
+    if event == "error":
+        csv_logger.log(
+            "GET /sentencia/{hash}/wait",
+            500,
+            hash,
+            "No se pudo generar la sentencia ciudadana.",
+            exit_status=1,
+        )
+        raise HTTPException(
+            status_code=500,
+            detail={
+                "status": "ERROR",
+                "message": "No se pudo generar la sentencia ciudadana.",
+            },
+        )
+
+    sentencia = redis_cache.get(key)
+    if not sentencia:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "status": "ERROR",
+                "message": "No se encontró la sentencia ciudadana.",
+            },
+        )
+    return sentence_brief_response(hash, sentencia, "GET /sentencia/{hash}/wait")
+
+
+@router.get("/sentencia/{hash}/stream")
+async def stream_sentence_brief_route(hash: str):
+    """
+    Server-Sent Events con la sentencia a medida que se genera. Eventos:
+    `token` (texto parcial), `reset` (descartar lo recibido), `done` (misma
+    respuesta que GET /sentencia/{hash}) y `error`.
+    """
+    key = sentence_stream_key(hash)
+
+    async def events():
+        # Se lee desde el inicio del stream para no perder tokens ya publicados
+        last_id = "0"
+        deadline = time.monotonic() + SENTENCE_STREAM_TIMEOUT
+        while time.monotonic() < deadline:
+            entries = await async_redis_cache.xread(
+                {key: last_id}, count=100, block=15000
+            )
+            if not entries:
+                yield ": keep-alive\n\n"
+                continue
+            for _, messages in entries:
+                for entry_id, fields in messages:
+                    last_id = entry_id
+                    event_type = fields.get("type", "token")
+                    data = fields.get("data", "")
+                    if event_type == "done":
+                        data = json.dumps(
+                            sentence_brief_content(hash, json.loads(data))
+                        )
+                    else:
+                        data = json.dumps(data)
+                    yield f"event: {event_type}\ndata: {data}\n\n"
+
+                    if event_type == "done":
+                        # Igual que en GET /sentencia/{hash}, se elimina al entregarla
+                        await async_redis_cache.delete(f"sentence_brief:{hash}", key)
+                        csv_logger.log(
+                            "GET /sentencia/{hash}/stream",
+                            200,
+                            hash,
+                            "Sentencia ciudadana entregada por stream.",
+                            exit_status=0,
+                        )
+                        return
+                    if event_type == "error":
+                        return
+
+        yield f"event: error\ndata: {json.dumps('Tiempo de espera agotado.')}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class SentenceRequestChangesPayload(BaseModel):
+    sentence: str
+    changes: str
+    prev_messages: str
+
+
+@router.post("/sentencia/{hash}/request-changes")
+async def request_changes_route(
+    hash: str, payload: SentenceRequestChangesPayload, request: Request
+):
+    try:
+        username = request.headers.get("username")
+        if not username:
+            raise HTTPException(
+                status_code=400,
+                detail={"status": "ERROR", "message": "Falta el header 'username'."},
+            )
+        sentence = payload.sentence
+        if not sentence:
+            raise HTTPException(
+                status_code=404,
+                detail={
+                    "status": "ERROR",
+                    "message": "No se encontró la sentencia ciudadana.",
+                },
+            )
+
+        printer.yellow("🔄 Actualizando sentencia ciudadana en otro hilo...")
+
+        update_brief_task.delay(hash, sentence, payload.changes, payload.prev_messages)
+
+        interaction_logger.log(
+            username=username,
+            hash_=hash,
+            message=payload.changes,
+        )
+
+        csv_logger.log(
+            "POST /sentencia/{hash}/request-changes",
+            201,
+            hash,
+            "Solicitud de cambios enviada con éxito.",
+            exit_status=0,
+        )
+        return JSONResponse(
+            content={
+                "status": "QUEUED",
+                "message": "Los cambios se aplicarán en unos minutos.",
+                "changes": payload.changes,
+                "hash": hash,
+            },
+            status_code=201,
+        )
+    except Exception as e:
+        printer.error(f"❌ Error al solicitar cambios de una sentencia: {e}")
+        csv_logger.log(
+            "POST /sentencia/{hash}/request-changes",
+            500,
+            hash,
+            f"Error al solicitar cambios de una sentencia: {e}",
+            exit_status=1,
+        )
+        raise HTTPException(
+            status_code=500,
+            detail={"status": "ERROR", "message": str(e)},
+        )
+
+
+class FeedbackRequest(BaseModel):
+    hash: str
+    feedback: str
+
+
+@router.post("/feedback")
+async def feedback_route(payload: FeedbackRequest):
+    try:
+        upsert_feedback_in_redis(payload.feedback)
+        return JSONResponse(
+            content={
+                "status": "SUCCESS",
+                "message": "Feedback procesado con éxito.",
+                "hash": payload.hash,
+            },
+            status_code=200,
+        )
+    except Exception as e:
+        printer.error(f"❌ Error al procesar el feedback: {e}")
+        raise HTTPException(
+            status_code=500, detail={"status": "ERROR", "message": str(e)}
+        )
+
+
+@router.post("/generate-sentence-brief")
+async def generate_sentence_brief_route(
+    images: List[UploadFile] = File([]),
+    documents: List[UploadFile] = File([]),
+):
+    try:
+        if not images and not documents:
+            printer.error(
+                "Debes enviar al menos un documento o una imagen para generar la sentencia ciudadana."
+            )
+            csv_logger.log(
+                "POST /generate-sentence-brief",
+                400,
+                None,
+                "Debes enviar al menos un documento o una imagen para generar la sentencia ciudadana.",
+                exit_status=1,
+            )
+            raise HTTPException(
+                status_code=400,
+                detail={
+                    "status": "ERROR",
+                    "message": "Debes enviar al menos un documento o una imagen para generar la sentencia ciudadana.",
+                },
+            )
+
+        images, documents = validate_attachments(images, documents)
+
+        printer.yellow(f"🔍 Imágenes validas: {len(images)}")
+        printer.yellow(f"🔍 Documentos validos: {len(documents)}")
+
+        image_sources = [await read_upload(image) for image in images]
+        document_sources = [await read_upload(document) for document in documents]
+
+        # La lectura y el OCR se hacen en el worker, aquí solo se guardan los archivos
+        source_hash = hash_sources(document_sources + image_sources)
+        if claim_ingest_job(source_hash):
+            try:
+                await run_in_threadpool(
+                    store_uploaded_sources, source_hash, document_sources, image_sources
+                )
+                printer.yellow(
+                    f"🔄 Enviando tarea de generación de sentencia ciudadana a cola de tareas, HASH: {source_hash}"
+                )
+                # Un trabajo nuevo no debe reproducir el stream de uno anterior
+                redis_cache.delete(sentence_stream_key(source_hash))
+                ingest_task.delay(source_hash)
+            except Exception:
+                release_ingest_job(source_hash)
+                raise
+        else:
+            # Los mismos archivos ya se están procesando: se sigue ese trabajo
+            printer.yellow(
+                f"🔄 La sentencia ciudadana ya está en proceso, HASH: {source_hash}"
+            )
+
+        printer.green(
+            f"Sentencia ciudadana en proceso de generación en segundo plano, HASH: {source_hash}"
+        )
+        csv_logger.log(
+            "POST /generate-sentence-brief",
+            201,
+            source_hash,
+            "Sentencia ciudadana en cola...",
+            exit_status=0,
+        )
+
+        return JSONResponse(
+            content={
+                "status": "QUEUED",
+                "message": "Sentencia ciudadana en cola...",
+                "hash": source_hash,
+            },
+            status_code=201,
+        )
+    except Exception as e:
+        tb = traceback.format_exc()
+        printer.error(f"❌ Error al generar la sentencia ciudadana: {e}")
+        printer.error(tb)
+
+        raise HTTPException(
+            status_code=500,
+            detail={"status": "ERROR", "message": str(e)},
+        )
+
+
+class FeedbackGenerateRequest(BaseModel):
+    hash: str
+    messages: str
+
+
+@router.post("/generate-feedback")
+async def generate_feedback_route(payload: FeedbackGenerateRequest):
+    try:
+        printer.yellow(
+            f"🔄 Enviando tarea de generación de feedback a cola de tareas, HASH: {payload.hash}"
+        )
+        generate_feedback_task.delay(payload.hash, payload.messages)
+        return JSONResponse(
+            content={
+                "status": "QUEUED",
+                "message": "Feedback en cola...",
+                "hash": payload.hash,
+            },
+        )
+    except Exception as e:
+        printer.error(f"❌ Error al generar el feedback: {e}")
+        raise HTTPException(
+            status_code=500, detail={"status": "ERROR", "message": str(e)}
+        )
+
+
+def feedback_response(feedback: str) -> JSONResponse:
+    return JSONResponse(
+        content={
+            "status": "SUCCESS",
+            "message": "Feedback obtenido con éxito.",
+            "feedback": feedback,
+        },
+        status_code=200,
+    )
+
+
+@router.get("/feedback/{hash}/wait")
+async def wait_feedback_route(
+    hash: str,
+    timeout: float = Query(LONG_POLL_TIMEOUT, ge=0, le=LONG_POLL_MAX_TIMEOUT),
+):
+    """Long-poll: responde en cuanto el feedback está listo o con 202 si no."""
+    key = f"feedback:{hash}"
+    event = await wait_for_result("feedback", hash, key, timeout)
+    if event is None:
+        return pending_response(hash, "El feedback sigue en proceso.")
+    if event == "error":
+        raise HTTPException(
+            status_code=500,
+            detail={"status": "ERROR", "message": "No se pudo generar el feedback."},
+        )
+
+    feedback = redis_cache.get(key)
+    if not feedback:
+        raise HTTPException(
+            status_code=404,
+            detail={"status": "ERROR", "message": "No se encontró el feedback."},
+        )
+    redis_cache.delete(key)
+    return feedback_response(feedback)
+
+
+@router.get("/feedback/{hash}")
+async def get_feedback_route(hash: str):
+    try:
+        feedback = redis_cache.get(f"feedback:{hash}")
+        if not feedback:
+            raise HTTPException(
+                status_code=404,
+                detail={"status": "ERROR", "message": "No se encontró el feedback."},
+            )
+        redis_cache.delete(f"feedback:{hash}")
+        return feedback_response(feedback)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        printer.error(f"❌ Error al obtener el feedback: {e}")
+        raise HTTPException(
+            status_code=500, detail={"status": "ERROR", "message": str(e)}
+        )
+
+
+@router.get("/cache/stats")
+async def get_cache_stats_route():
+    return JSONResponse(
+        content={
+            "status": "SUCCESS",
+            "caches": get_cache_stats(),
+            "prompt_prefixes": get_prompt_prefix_stats(),
+        },
+        status_code=200,
+    )
+
+
+@router.get("/llm/status")
+async def get_llm_status_route():
+    # Límite adaptativo, peticiones en curso y circuit breaker de cada backend
+    return JSONResponse(
+        content={"status": "SUCCESS", "backends": get_llm_guard_stats()},
+        status_code=200,
+    )
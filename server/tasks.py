@@ -1,20 +1,90 @@
+import os
+import random
 import traceback
 
+from celery import chord
+from celery.exceptions import Retry
+from server.ai.overload import backend_unavailable
+from server.ai.prompts import PromptBudgetExceeded
 from server.celery_app import celery
 from server.utils.printer import Printer
 from server.utils.processor import (
+    EmptyDocumentError,
+    ingest_sources,
     generate_sentence_brief,
     update_sentence_brief,
-    sequencial_extraction,
+    plan_extraction_chunks,
+    missing_extraction_chunks,
+    extract_chunk,
+    assemble_extracted_data,
+    concurrent_extraction,
     generate_feedback_from_messages,
+    release_ingest_job,
 )
 from server.utils.csv_logger import CSVLogger
+from server.utils.token_stream import RedisTokenStream
+from server.utils.notifications import publish_result
+from server.utils.redis_cache import RedisCache
 
 # from server.ai.ai_interface import tokenize_prompt
 
 
 printer = Printer(name="tasks")
+
+# chord: un task por chunk repartido entre los workers
+# local: el task extractor procesa todos los chunks con peticiones async simultáneas
+EXTRACTION_FANOUT = os.getenv("EXTRACTION_FANOUT", "chord").lower()
+# Veces que un task se reprograma mientras el modelo está saturado o con el
+# circuito abierto, sin gastar sus reintentos; después cuenta como un error más
+LLM_DEFER_MAX = int(os.getenv("LLM_DEFER_MAX", 20))
+# Errores deterministas: reintentar el task solo repetiría el mismo fallo
+NON_RETRYABLE_ERRORS = (PromptBudgetExceeded, EmptyDocumentError)
 csv_logger = CSVLogger("tasks_log.csv")
+redis_cache = RedisCache()
+
+
+def is_final_attempt(task, error: Exception) -> bool:
+    return (
+        isinstance(error, NON_RETRYABLE_ERRORS)
+        or task.request.retries >= task.max_retries
+    )
+
+
+def publish_failure_if_final(task, source_hash: str, error: Exception):
+    """Si el task ya no se va a reintentar, avisa a quienes esperan la sentencia."""
+    if is_final_attempt(task, error):
+        message = "No se pudo generar la sentencia ciudadana."
+        RedisTokenStream(source_hash).error(message)
+        publish_result("sentence_brief", source_hash, "error")
+        release_ingest_job(source_hash)
+
+
+def defer_if_backend_unavailable(task, error: Exception):
+    """
+    Si el backend del modelo no puede atender, vuelve a encolar el task para
+    cuando se espera que tenga lugar. Un reintento de autoretry_for en ese caso
+    gastaría el presupuesto de reintentos y sumaría más carga al backend.
+    """
+    unavailable = backend_unavailable(error)
+    if unavailable is None or task.request.called_directly:
+        return
+    key = f"llm_deferrals:{task.request.id}"
+    try:
+        deferrals = redis_cache.incrby(key, 1)
+        redis_cache.expire(key, 24 * 60 * 60)
+    except Exception:
+        return
+    if deferrals > LLM_DEFER_MAX:
+        return
+    # Con jitter para que los tasks diferidos no vuelvan todos a la vez
+    countdown = unavailable.retry_after * random.uniform(1, 1.5)
+    printer.yellow(
+        f"⏳ Task {task.name} diferido {countdown:.0f} s "
+        f"({deferrals}/{LLM_DEFER_MAX}): {unavailable}"
+    )
+    # Mismo id, chord y número de reintentos que el task actual
+    task.signature_from_request(countdown=countdown).apply_async()
+    raise Retry(exc=error, when=countdown)
 
 
 def cut_user_message(previous_messages: list[dict], n_characters_to_cut: int):
@@ -24,9 +94,49 @@ def cut_user_message(previous_messages: list[dict], n_characters_to_cut: int):
     return previous_messages
 
 
+@celery.task(
+    name="ingest",
+    autoretry_for=(Exception,),
+    dont_autoretry_for=NON_RETRYABLE_ERRORS,
+    retry_kwargs={"countdown": 10},
+    retry_backoff=True,
+    bind=True,
+    max_retries=3,
+)
+def ingest_task(self, job_hash: str):
+    task_name = "ingest"
+    try:
+        printer.info(f"Leyendo los archivos subidos, HASH: {job_hash}")
+        ingest_sources(job_hash)
+        csv_logger.log(
+            endpoint=task_name,
+            http_status=200,
+            hash_=job_hash,
+            message="Lectura de archivos completada, empezando la extracción de datos",
+            exit_status=0,
+        )
+        extractor_task.delay(job_hash)
+        return "Lectura de archivos completada, empezando la extracción de datos"
+    except Exception as e:
+        defer_if_backend_unavailable(self, e)
+        printer.error("Error leyendo los archivos subidos:", e)
+        tb = traceback.format_exc()
+        printer.error(tb)
+        publish_failure_if_final(self, job_hash, e)
+        csv_logger.log(
+            endpoint=task_name,
+            http_status=500,
+            hash_=job_hash,
+            message=str(tb),
+            exit_status=1,
+        )
+        raise
+
+
 @celery.task(
     name="extractor",
     autoretry_for=(Exception,),
+    dont_autoretry_for=NON_RETRYABLE_ERRORS,
     retry_kwargs={"countdown": 10},
     retry_backoff=True,
     bind=True,
@@ -35,7 +145,90 @@ def extractor_task(self, source_hash: str):
     task_name = "extractor"
     try:
         printer.info(f"Empezando a extraer datos del documento, HASH: {source_hash}")
-        sequencial_extraction(source_hash)
+        if EXTRACTION_FANOUT == "local":
+            concurrent_extraction(source_hash)
+            csv_logger.log(
+                endpoint=task_name,
+                http_status=200,
+                hash_=source_hash,
+                message="Extracción de datos completada, empezando a generar la interpretación de la sentencia ciudadana",
+                exit_status=0,
+            )
+            generate_brief_task.delay(source_hash)
+            return "Extracción de datos completada, empezando a generar la interpretación de la sentencia ciudadana"
+
+        digests = plan_extraction_chunks(source_hash)
+        # Solo se procesan los chunks sin checkpoint, un task por chunk para que
+        # el backend los atienda en paralelo; el callback los une en orden
+        missing = missing_extraction_chunks(source_hash, digests)
+        chord(extract_chunk_task.s(source_hash, index) for index in missing)(
+            assemble_extraction_task.s(source_hash, digests)
+        )
+        message = (
+            f"Extracción de datos repartida en {len(missing)} de "
+            f"{len(digests)} chunks"
+        )
+        csv_logger.log(
+            endpoint=task_name,
+            http_status=200,
+            hash_=source_hash,
+            message=message,
+            exit_status=0,
+        )
+        return message
+    except Exception as e:
+        defer_if_backend_unavailable(self, e)
+        printer.error("Error extrayendo el texto de origen:", e)
+        tb = traceback.format_exc()
+        printer.error(tb)
+        publish_failure_if_final(self, source_hash, e)
+        csv_logger.log(
+            endpoint=task_name,
+            http_status=500,
+            hash_=source_hash,
+            message=str(tb),
+            exit_status=1,
+        )
+        raise
+
+
+@celery.task(
+    name="extract_chunk",
+    autoretry_for=(Exception,),
+    dont_autoretry_for=NON_RETRYABLE_ERRORS,
+    retry_kwargs={"countdown": 10},
+    retry_backoff=True,
+    bind=True,
+    max_retries=5,
+)
+def extract_chunk_task(self, source_hash: str, index: int) -> int:
+    try:
+        # La respuesta queda como checkpoint en Redis, no viaja por el backend
+        extract_chunk(source_hash, index)
+        return index
+    except Exception as e:
+        defer_if_backend_unavailable(self, e)
+        printer.error(f"Error extrayendo datos del chunk {index}:", e)
+        printer.error(traceback.format_exc())
+        publish_failure_if_final(self, source_hash, e)
+        raise
+
+
+@celery.task(
+    name="assemble_extraction",
+    autoretry_for=(Exception,),
+    dont_autoretry_for=NON_RETRYABLE_ERRORS,
+    retry_kwargs={"countdown": 10},
+    retry_backoff=True,
+    bind=True,
+    max_retries=3,
+)
+def assemble_extraction_task(
+    self, extracted_chunks: list[int], source_hash: str, digests: list[str]
+):
+    task_name = "assemble_extraction"
+    try:
+        assemble_extracted_data(source_hash, digests)
         printer.info(
             f"Extracción de datos completada, empezando a generar la interpretación de la sentencia ciudadana, HASH: {source_hash}"
         )
@@ -49,9 +242,11 @@ def extractor_task(self, source_hash: str):
         generate_brief_task.delay(source_hash)
         return "Extracción de datos completada, empezando a generar la interpretación de la sentencia ciudadana"
     except Exception as e:
-        printer.error("Error extrayendo el texto de origen:", e)
+        defer_if_backend_unavailable(self, e)
+        printer.error("Error uniendo los datos extraídos:", e)
         tb = traceback.format_exc()
         printer.error(tb)
+        publish_failure_if_final(self, source_hash, e)
         csv_logger.log(
             endpoint=task_name,
             http_status=500,
@@ -65,6 +260,7 @@ def extractor_task(self, source_hash: str):
 @celery.task(
     name="generate_sentence_brief",
     autoretry_for=(Exception,),
+    dont_autoretry_for=NON_RETRYABLE_ERRORS,
     retry_kwargs={"countdown": 10},
     retry_backoff=True,
     bind=True,
@@ -80,6 +276,8 @@ def generate_brief_task(
     task_traceback = ""
     try:
         generate_sentence_brief(source_hash)
+        publish_result("sentence_brief", source_hash)
+        release_ingest_job(source_hash)
         csv_logger.log(
             endpoint=task_name,
             http_status=200,
@@ -89,11 +287,13 @@ def generate_brief_task(
         )
         return "Resumen generado correctamente"
     except Exception as e:
+        defer_if_backend_unavailable(self, e)
         printer.error("Error generando una sentencia ciudadana:", e)
         tb = traceback.format_exc()
         task_traceback += f"Error generando una sentencia ciudadana: {e}\n"
         task_traceback += f"Traceback: {tb}\n"
         printer.error(tb)
+        publish_failure_if_final(self, source_hash, e)
         csv_logger.log(
             endpoint=task_name,
             http_status=500,
@@ -107,6 +307,7 @@ def generate_brief_task(
 @celery.task(
     name="update_sentence_brief",
     autoretry_for=(Exception,),
+    dont_autoretry_for=NON_RETRYABLE_ERRORS,
     retry_kwargs={"countdown": 10},
     retry_backoff=True,
     bind=True,
@@ -122,6 +323,7 @@ def update_brief_task(
         )
         result = update_sentence_brief(sources_hash, sentence, changes, prev_messages)
         printer.debug("Resumen actualizado: ", result)
+        publish_result("sentence_brief", sources_hash)
         csv_logger.log(
             endpoint=task_name,
             http_status=200,
@@ -131,9 +333,12 @@ def update_brief_task(
         )
         return "Resumen actualizado correctamente"
     except Exception as e:
+        defer_if_backend_unavailable(self, e)
         tb = traceback.format_exc()
         printer.error("Error actualizando una sentencia ciudadana:", e)
         printer.error(tb)
+        if is_final_attempt(self, e):
+            publish_result("sentence_brief", sources_hash, "error")
         csv_logger.log(
             endpoint=task_name,
             http_status=500,
@@ -147,6 +352,7 @@ def update_brief_task(
 @celery.task(
     name="generate_feedback",
     autoretry_for=(Exception,),
+    dont_autoretry_for=NON_RETRYABLE_ERRORS,
     retry_kwargs={"countdown": 10},
     retry_backoff=True,
     bind=True,
@@ -157,6 +363,7 @@ def generate_feedback_task(self, sources_hash: str, messages: str):
     try:
         result = generate_feedback_from_messages(sources_hash, messages)
         printer.debug("Feedback generado: ", result)
+        publish_result("feedback", sources_hash)
         csv_logger.log(
             endpoint=task_name,
             http_status=200,
@@ -166,6 +373,8 @@ def generate_feedback_task(self, sources_hash: str, messages: str):
         )
         return "Feedback generado correctamente"
     except Exception as e:
+        defer_if_backend_unavailable(self, e)
         tb = traceback.format_exc()
         printer.error("Error generando feedback:", e)
         printer.error(tb)
+        publish_result("feedback", sources_hash, "error")
@@ -1,7 +1,190 @@
+import asyncio
 import sys
+from collections import deque
 from unittest.mock import MagicMock
 
+import pytest
+
 # Mockea celery y ollama
 sys.modules["celery"] = MagicMock()
 sys.modules["ollama"] = MagicMock()
 sys.modules["openai"] = MagicMock()
+
+from server.utils.printer import Printer  # noqa: E402
+
+
+class FakeRedis:
+    """Subconjunto en memoria de RedisCache para los tests."""
+
+    def __init__(self):
+        self.strings = {}
+        self.lists = {}
+        self.hashes = {}
+        self.sorted_sets = {}
+        self.streams = {}
+        self.subscribers = {}
+        self.ttls = {}
+
+    def get(self, key):
+        return self.strings.get(key)
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.strings:
+            return False
+        self.strings[key] = value
+        if ex is not None:
+            self.ttls[key] = ex
+        return True
+
+    def incrby(self, key, amount=1):
+        self.strings[key] = str(int(self.strings.get(key, 0)) + amount)
+        return int(self.strings[key])
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    def lrange(self, key, start, end):
+        values = self.lists.get(key, [])
+        return values[start:] if end == -1 else values[start : end + 1]
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hget(self, name, key):
+        return self.hashes.get(name, {}).get(key)
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def hincrby(self, name, key, amount=1):
+        value = int(self.hashes.get(name, {}).get(key, 0)) + amount
+        self.hset(name, key, str(value))
+        return value
+
+    def hincrbyfloat(self, name, key, amount):
+        value = float(self.hashes.get(name, {}).get(key, 0)) + amount
+        self.hset(name, key, str(value))
+        return value
+
+    def hincrby_many(self, name, amounts):
+        for key, amount in amounts.items():
+            if isinstance(amount, float):
+                self.hincrbyfloat(name, key, amount)
+            else:
+                self.hincrby(name, key, amount)
+
+    def delete(self, *keys):
+        for key in keys:
+            self.strings.pop(key, None)
+            self.lists.pop(key, None)
+            self.hashes.pop(key, None)
+            self.sorted_sets.pop(key, None)
+            self.streams.pop(key, None)
+
+    def expire(self, key, seconds):
+        pass
+
+    def zadd(self, name, mapping):
+        self.sorted_sets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, *values):
+        for value in values:
+            self.sorted_sets.get(name, {}).pop(value, None)
+
+    def zcount(self, name, min, max):
+        min, max = float(min), float(max)
+        return sum(min <= s <= max for s in self.sorted_sets.get(name, {}).values())
+
+    def zremrangebyscore(self, name, min, max):
+        min, max = float(min), float(max)
+        members = self.sorted_sets.get(name, {})
+        for value, score in list(members.items()):
+            if min <= score <= max:
+                del members[value]
+
+    def xadd(self, name, fields, maxlen=None):
+        entries = self.streams.setdefault(name, [])
+        entry_id = f"{len(entries) + 1}-0"
+        entries.append((entry_id, dict(fields)))
+        return entry_id
+
+    def publish(self, channel, message):
+        queues = self.subscribers.get(channel, [])
+        for queue in queues:
+            queue.append(message)
+        return len(queues)
+
+
+class FakePubSub:
+    def __init__(self, redis):
+        self.redis = redis
+        self.messages = deque()
+        self.channels = []
+
+    async def subscribe(self, channel):
+        self.redis.subscribers.setdefault(channel, []).append(self.messages)
+        self.channels.append(channel)
+
+    async def unsubscribe(self, channel):
+        self.redis.subscribers[channel].remove(self.messages)
+        self.channels.remove(channel)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        if not self.messages:
+            await asyncio.sleep(min(timeout, 0.01))
+        if self.messages:
+            return {"type": "message", "data": self.messages.popleft()}
+        return None
+
+    async def aclose(self):
+        pass
+
+
+class FakeAsyncRedis:
+    """AsyncRedisCache sobre el mismo estado que un FakeRedis."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def get(self, key):
+        return self.redis.get(key)
+
+    async def exists(self, key):
+        return key in self.redis.strings
+
+    async def delete(self, *keys):
+        self.redis.delete(*keys)
+
+    async def xread(self, streams, count=None, block=None):
+        result = []
+        for name, last_id in streams.items():
+            last = int(str(last_id).split("-")[0])
+            entries = [
+                entry
+                for entry in self.redis.streams.get(name, [])
+                if int(entry[0].split("-")[0]) > last
+            ]
+            if entries:
+                result.append((name, entries[:count]))
+        if not result:
+            await asyncio.sleep(0)
+        return result
+
+    def pubsub(self):
+        return FakePubSub(self.redis)
+
+
+@pytest.fixture(autouse=True)
+def error_log(monkeypatch, tmp_path):
+    # Printer.error escribe en error.log; los tests no deben tocar el del repo
+    monkeypatch.setattr(Printer, "error_file_path", str(tmp_path / "error.log"))
+
+
+@pytest.fixture
+def fake_redis():
+    return FakeRedis()
+
+
+@pytest.fixture
+def fake_async_redis(fake_redis):
+    return FakeAsyncRedis(fake_redis)
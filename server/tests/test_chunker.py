@@ -0,0 +1,50 @@
+from server.utils.chunker import (
+    ApproximateTokenCounter,
+    TokenChunker,
+    split_stream,
+)
+from server.utils.pdf_reader import PAGE_CONNECTOR
+
+
+class WordCounter(ApproximateTokenCounter):
+    def count(self, text: str) -> int:
+        return len(text.split())
+
+
+def chunk(text: str, budget: int, segment_size: int = 7) -> list[str]:
+    segments = [text[i : i + segment_size] for i in range(0, len(text), segment_size)]
+    return [c.text for c in TokenChunker(budget, WordCounter()).chunks(segments)]
+
+
+def test_split_stream_handles_separators_across_segments():
+    text = PAGE_CONNECTOR.join(["uno", "dos", "tres"])
+    segments = [text[i : i + 3] for i in range(0, len(text), 3)]
+    assert list(split_stream(segments, PAGE_CONNECTOR)) == ["uno", "dos", "tres"]
+
+
+def test_split_stream_finds_separators_split_at_any_offset():
+    # Un texto largo sin separadores y luego un separador partido en cada posición
+    for cut in range(1, len(PAGE_CONNECTOR)):
+        segments = ["x" * 100] * 50 + [
+            PAGE_CONNECTOR[:cut],
+            PAGE_CONNECTOR[cut:] + "fin",
+        ]
+        assert list(split_stream(segments, PAGE_CONNECTOR)) == ["x" * 5000, "fin"]
+
+
+def test_chunker_packs_whole_pages_within_budget():
+    pages = ["a b c", "d e", "f g h i", "j"]
+    chunks = chunk(PAGE_CONNECTOR.join(pages), budget=8)
+    assert chunks == [
+        PAGE_CONNECTOR.join(pages[:2]),
+        PAGE_CONNECTOR.join(pages[2:]),
+    ]
+
+
+def test_chunker_splits_long_pages_by_paragraphs_then_words():
+    page = "uno dos tres\n\ncuatro cinco\n\n" + " ".join(str(i) for i in range(10))
+    chunks = chunk(PAGE_CONNECTOR.join(["corta", page]), budget=6)
+    assert chunks[0] == "corta"
+    assert chunks[1] == "uno dos tres\n\ncuatro cinco"
+    assert chunks[2:] == ["0 1 2 3 4 5", "6 7 8 9"]
+    assert all(WordCounter().count(c) <= 6 for c in chunks)
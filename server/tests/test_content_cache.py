@@ -0,0 +1,55 @@
+import os
+import time
+
+import pytest
+
+from server.utils import content_cache
+from server.utils.content_cache import ContentCache
+
+
+@pytest.fixture
+def disk_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(content_cache, "CACHE_DIR", str(tmp_path))
+    return ContentCache("test", backend="disk", max_bytes=10, ttl=None)
+
+
+def test_disk_cache_roundtrip(disk_cache):
+    assert disk_cache.get("a") is None
+    disk_cache.set("a", "hola")
+    assert disk_cache.get("a") == "hola"
+    assert disk_cache.hits == 1
+    assert disk_cache.misses == 1
+
+
+def test_disk_cache_evicts_least_recently_used(disk_cache):
+    disk_cache.set("a", "12345")
+    disk_cache.set("b", "12345")
+    # Marca "a" como usada más recientemente que "b"
+    past = time.time() - 60
+    os.utime(disk_cache.store._path("b"), (past, past))
+    disk_cache.set("c", "12345")
+
+    assert disk_cache.get("a") == "12345"
+    assert disk_cache.get("b") is None
+    assert disk_cache.get("c") == "12345"
+
+
+def test_disabled_cache_never_hits():
+    cache = ContentCache("disabled", backend="none")
+    cache.set("a", "hola")
+    assert cache.get("a") is None
+
+
+def test_shared_stats_are_flushed_in_batches(disk_cache, fake_redis, monkeypatch):
+    monkeypatch.setattr(content_cache, "CACHE_STATS_FLUSH_SECONDS", 60)
+    disk_cache.stats_redis = fake_redis
+    disk_cache.flushed_at = time.monotonic()
+
+    disk_cache.set("a", "hola")
+    for _ in range(3):
+        disk_cache.get("a")
+    disk_cache.get("b")
+    assert fake_redis.hgetall(disk_cache.stats_key) == {}
+
+    assert disk_cache.stats()["shared"] == {"hits": 3.0, "misses": 1.0}
+    assert disk_cache.pending == {}
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from server.ai import prompts
+from server.utils import chunker, processor, text_buffer
+from server.utils.pdf_reader import PAGE_CONNECTOR
+
+
+@pytest.fixture
+def source(monkeypatch, fake_redis):
+    monkeypatch.setattr(processor, "redis_cache", fake_redis)
+    monkeypatch.setattr(text_buffer, "RedisCache", lambda: fake_redis)
+    monkeypatch.setattr(chunker, "extraction_token_budget", lambda counter: 25)
+    with processor.source_text_buffer("doc").writer() as spooler:
+        spooler.write(PAGE_CONNECTOR.join(f"pagina {i} " * 8 for i in range(3)))
+    return "doc"
+
+
+def extract_missing_chunks(source_hash: str) -> str:
+    """Mismo recorrido que el chord de `extractor_task`, en el proceso actual."""
+    digests = processor.plan_extraction_chunks(source_hash)
+    for index in processor.missing_extraction_chunks(source_hash, digests):
+        processor.extract_chunk(source_hash, index)
+    return processor.assemble_extracted_data(source_hash, digests)
+
+
+def test_extraction_resumes_from_checkpoints(source, monkeypatch):
+    calls = []
+
+    def flaky_extractor(chunk):
+        calls.append(chunk)
+        if len(calls) == 2:
+            raise TimeoutError("el backend no respondió")
+        return f"datos {len(calls)}"
+
+    monkeypatch.setattr(processor, "extract_data_from_chunk", flaky_extractor)
+
+    with pytest.raises(TimeoutError):
+        extract_missing_chunks(source)
+    assert len(calls) == 2
+
+    result = extract_missing_chunks(source)
+
+    # Solo se vuelven a procesar el chunk que falló y los que faltaban
+    assert len(calls) == 4
+    assert calls[2] == calls[1]
+    assert result == "datos 1\ndatos 3\ndatos 4\n"
+    assert processor.get_extracted_data(source) == result
+
+
+def test_document_without_text_fails_before_extracting(monkeypatch, fake_redis):
+    monkeypatch.setattr(processor, "redis_cache", fake_redis)
+    monkeypatch.setattr(text_buffer, "RedisCache", lambda: fake_redis)
+    with processor.source_text_buffer("vacio").writer() as spooler:
+        spooler.write(PAGE_CONNECTOR.join(["", " \n"]))
+
+    with pytest.raises(processor.EmptyDocumentError):
+        processor.plan_extraction_chunks("vacio")
+
+
+def test_checkpoints_depend_on_model(source, monkeypatch):
+    monkeypatch.setattr(processor, "extract_data_from_chunk", lambda chunk: "x")
+    extract_missing_chunks(source)
+    key = processor.extraction_checkpoint_key(source)
+
+    monkeypatch.setenv("MODEL", "otro-modelo")
+    assert processor.extraction_checkpoint_key(source) != key
+
+
+def test_concurrent_extraction_keeps_chunk_order(source, monkeypatch):
+    running = []
+    peak = []
+
+    async def slow_extractor(chunk):
+        running.append(chunk)
+        peak.append(len(running))
+        await asyncio.sleep(0.01 * (3 - len(peak)))
+        running.remove(chunk)
+        return chunk.split()[1]
+
+    monkeypatch.setattr(processor, "aextract_data_from_chunk", slow_extractor)
+
+    result = processor.concurrent_extraction(source)
+
+    assert result == "0\n1\n2\n"
+    assert max(peak) == 3
+
+
+def test_oversized_chunk_is_split_before_sending(monkeypatch, fake_redis):
+    monkeypatch.setattr(prompts, "redis_cache", fake_redis)
+    prefix = prompts.static_system_prompt(processor.get_prompt_from_file("EXTRACTOR"))
+    prefix_tokens = prompts.count_prefix_tokens(prefix)
+    monkeypatch.setattr(processor, "EXTRACTION_MAX_OUTPUT_TOKENS", 10)
+    monkeypatch.setattr(chunker, "CONTEXT_WINDOW_SIZE", prefix_tokens + 10 + 64 + 30)
+    sent = []
+
+    class FakeAI:
+        def chat(self, messages, model, max_tokens):
+            sent.append(messages[1]["content"])
+            return str(len(sent))
+
+    monkeypatch.setattr(processor, "get_ai_interface", FakeAI)
+    chunk = "\n\n".join(f"parrafo numero {i} del documento" for i in range(6))
+
+    result = processor.extract_data_from_chunk(chunk)
+
+    assert result == "\n".join(str(i + 1) for i in range(len(sent)))
+    assert len(sent) > 1
+    assert all(prompts.get_token_counter().count(part) <= 30 for part in sent)
+    assert "\n\n".join(sent) == chunk
+
+
+def test_long_conversation_keeps_its_end_for_feedback(monkeypatch, fake_redis):
+    monkeypatch.setattr(prompts, "redis_cache", fake_redis)
+    monkeypatch.setattr(processor, "redis_cache", fake_redis)
+    prefix = prompts.static_system_prompt(
+        processor.get_prompt_from_file("FEEDBACK_GENERATOR")
+    )
+    prefix_tokens = prompts.count_prefix_tokens(prefix)
+    monkeypatch.setattr(processor, "RESPONSE_MAX_OUTPUT_TOKENS", 10)
+    monkeypatch.setattr(chunker, "CONTEXT_WINDOW_SIZE", prefix_tokens + 10 + 64 + 30)
+    sent = []
+
+    class FakeAI:
+        def chat(self, messages, model, max_tokens):
+            sent.append(messages[1]["content"])
+            return "Buen resumen."
+
+    monkeypatch.setattr(processor, "get_ai_interface", FakeAI)
+    conversation = "\n\n".join(f"usuario: mensaje numero {i}" for i in range(8))
+
+    assert processor.generate_feedback_from_messages("abc", conversation) == (
+        "Buen resumen."
+    )
+    assert len(sent) == 1
+    assert prompts.get_token_counter().count(sent[0]) <= 30
+    assert sent[0] != conversation and conversation.endswith(sent[0])
+    assert fake_redis.get("feedback:abc") == "Buen resumen."
@@ -0,0 +1,71 @@
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server import routes
+from server.utils import processor, text_buffer
+from server.utils.token_stream import sentence_stream_key
+from server.utils.uploads import UploadedSource
+
+
+@pytest.fixture
+def uploads(monkeypatch, fake_redis):
+    monkeypatch.setattr(processor, "redis_cache", fake_redis)
+    monkeypatch.setattr(processor, "binary_redis_cache", fake_redis)
+    monkeypatch.setattr(text_buffer, "RedisCache", lambda: fake_redis)
+    return fake_redis
+
+
+@pytest.fixture
+def client(monkeypatch, uploads):
+    monkeypatch.setattr(routes, "redis_cache", uploads)
+    monkeypatch.setattr(routes, "ingest_task", MagicMock())
+    monkeypatch.setattr(routes, "csv_logger", MagicMock())
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def post_brief(client):
+    files = [("documents", ("sentencia.pdf", b"%PDF-1.4 contenido", "application/pdf"))]
+    response = client.post("/api/generate-sentence-brief", files=files)
+    assert response.status_code == 201
+    return response.json()["hash"]
+
+
+def test_identical_uploads_share_the_job_in_progress(client, uploads):
+    source_hash = post_brief(client)
+    uploads.strings[sentence_stream_key(source_hash)] = "tokens del primer trabajo"
+
+    # El segundo POST no pisa los archivos ni el stream del trabajo en curso
+    assert post_brief(client) == source_hash
+    routes.ingest_task.delay.assert_called_once_with(source_hash)
+    assert uploads.get(sentence_stream_key(source_hash)) is not None
+
+    processor.release_ingest_job(source_hash)
+    post_brief(client)
+    assert routes.ingest_task.delay.call_count == 2
+    assert uploads.get(sentence_stream_key(source_hash)) is None
+
+
+def test_ingest_reads_uploads_and_deletes_them(uploads, monkeypatch):
+    document = UploadedSource(name="a.pdf", data=b"%PDF", sha256="a" * 64)
+    image = UploadedSource(name="b.png", data=b"\x89PNG", sha256="b" * 64)
+    job_hash = processor.hash_sources([document, image])
+    processor.store_uploaded_sources(job_hash, [document], [image])
+
+    read = []
+
+    def fake_source_text(documents, images):
+        read.append(([d.name for d in documents], [i.name for i in images]))
+        yield "texto de la sentencia"
+
+    monkeypatch.setattr(processor, "iter_source_text", fake_source_text)
+
+    assert processor.ingest_sources(job_hash) == len("texto de la sentencia")
+    assert read == [(["a.pdf"], ["b.png"])]
+    assert processor.source_text_buffer(job_hash).read() == "texto de la sentencia"
+    with pytest.raises(Exception, match="No se encontraron los archivos subidos"):
+        processor.load_uploaded_sources(job_hash)
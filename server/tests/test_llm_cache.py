@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from server.ai import ai_interface
+from server.ai.ai_interface import AIInterface, ProviderReply, TokenSink
+from server.utils import content_cache
+from server.utils.content_cache import ContentCache
+
+
+class FakeProvider:
+    def __init__(self):
+        self.calls = 0
+        self.finish_reason = "stop"
+
+    def chat(self, messages, model, tools, stream, token_sink, max_tokens):
+        self.calls += 1
+        return ProviderReply(f"respuesta {self.calls}", self.finish_reason)
+
+    async def achat(self, messages, model, tools, max_tokens):
+        return self.chat(messages, model, tools, False, None, max_tokens)
+
+
+class ListSink(TokenSink):
+    def __init__(self):
+        self.tokens = []
+
+    def write(self, token: str):
+        self.tokens.append(token)
+
+
+@pytest.fixture
+def ai(tmp_path, monkeypatch):
+    monkeypatch.setattr(content_cache, "CACHE_DIR", str(tmp_path))
+    cache = ContentCache("llm-test", backend="disk", max_bytes=1024, ttl=None)
+    monkeypatch.setattr(ai_interface, "llm_cache", cache)
+    ai = AIInterface(provider="openai", api_key="test")
+    ai.client = FakeProvider()
+    return ai
+
+
+MESSAGES = [{"role": "user", "content": "hola"}]
+
+
+def test_identical_calls_hit_the_cache(ai):
+    first = ai.chat(MESSAGES, model="m", max_tokens=10)
+    sink = ListSink()
+    second = ai.chat(MESSAGES, model="m", max_tokens=10, stream=True, token_sink=sink)
+    third = asyncio.run(ai.achat(MESSAGES, model="m", max_tokens=10))
+
+    assert first == second == third == "respuesta 1"
+    assert sink.tokens == ["respuesta 1"]
+    assert ai.client.calls == 1
+    assert ai_interface.llm_cache.hits == 2
+    assert ai_interface.llm_cache.misses == 1
+
+
+def test_cache_key_covers_model_params_and_opt_out(ai):
+    ai.chat(MESSAGES, model="m")
+    ai.chat(MESSAGES, model="otro")
+    ai.chat(MESSAGES, model="m", max_tokens=10)
+    ai.chat(MESSAGES, model="m", cache=False)
+
+    assert ai.client.calls == 4
+    assert ai.chat(MESSAGES, model="m") == "respuesta 1"
+
+
+def test_truncated_reply_is_not_cached(ai):
+    ai.client.finish_reason = "length"
+    assert ai.chat(MESSAGES, model="m", max_tokens=10) == "respuesta 1"
+    assert asyncio.run(ai.achat(MESSAGES, model="m", max_tokens=10)) == "respuesta 2"
+
+    ai.client.finish_reason = "stop"
+    ai.chat(MESSAGES, model="m", max_tokens=10)
+    assert ai.chat(MESSAGES, model="m", max_tokens=10) == "respuesta 3"
+    assert ai.client.calls == 3
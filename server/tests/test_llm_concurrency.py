@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import pytest
+
+from server.ai.ai_interface import LoopLocalClient, ProcessSemaphore
+
+
+def test_limit_is_shared_by_every_event_loop_in_the_process():
+    semaphore = ProcessSemaphore(1)
+    active = []
+    peak = []
+
+    async def call():
+        async with semaphore:
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.pop()
+
+    async def main():
+        await asyncio.gather(call(), call())
+
+    # Un asyncio.run por hilo, como las tareas de un worker con hilos
+    threads = [threading.Thread(target=asyncio.run, args=(main(),)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(peak) == 6
+    assert max(peak) == 1
+    assert semaphore.value == 1
+
+
+def test_cancelled_waiter_gives_its_slot_back():
+    semaphore = ProcessSemaphore(1)
+
+    async def main():
+        await semaphore.acquire()
+        waiting = asyncio.create_task(semaphore.acquire())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        semaphore.release()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    asyncio.run(main())
+    assert semaphore.value == 1
+
+
+def test_loop_client_is_closed_when_the_loop_finishes():
+    closed = []
+
+    async def close(client):
+        closed.append(client)
+
+    clients = LoopLocalClient(object, close=close)
+
+    async def main():
+        assert clients.get() is clients.get()
+        await asyncio.sleep(0)
+        return clients.get()
+
+    first = asyncio.run(main())
+    second = asyncio.run(main())
+
+    assert first is not second
+    assert closed == [first, second]
@@ -0,0 +1,118 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server import routes
+from server.utils import notifications
+from server.utils.notifications import publish_result, wait_for_result
+
+BRIEF = json.dumps({"sentence": "Hola."})
+
+
+@pytest.fixture
+def events(monkeypatch, fake_redis, fake_async_redis):
+    monkeypatch.setattr(notifications, "redis_cache", fake_redis)
+    monkeypatch.setattr(notifications, "async_redis_cache", fake_async_redis)
+    return fake_redis
+
+
+@pytest.fixture
+def client(monkeypatch, events):
+    monkeypatch.setattr(routes, "redis_cache", events)
+    monkeypatch.setattr(routes, "csv_logger", MagicMock())
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def finish_brief(redis, event="ready"):
+    """Lo que hace el task al terminar: guarda la sentencia y avisa."""
+    if event == "ready":
+        redis.set("sentence_brief:abc", BRIEF)
+    publish_result("sentence_brief", "abc", event)
+
+
+def test_event_published_while_waiting_is_received(events):
+    async def task():
+        await asyncio.sleep(0.02)
+        finish_brief(events)
+
+    async def main():
+        waiting = wait_for_result("sentence_brief", "abc", "sentence_brief:abc", 5)
+        return (await asyncio.gather(waiting, task()))[0]
+
+    assert asyncio.run(main()) == "ready"
+    # Se desuscribe al terminar
+    channel = notifications.result_channel("sentence_brief", "abc")
+    assert events.subscribers[channel] == []
+
+
+def test_result_finished_during_the_check_is_not_missed(
+    events, fake_async_redis, monkeypatch
+):
+    check = fake_async_redis.exists
+
+    async def exists_then_finish(key):
+        # El task termina justo después de revisar la clave: solo se entera
+        # quien ya estaba suscrito al canal
+        found = await check(key)
+        finish_brief(events)
+        return found
+
+    monkeypatch.setattr(fake_async_redis, "exists", exists_then_finish)
+
+    result = asyncio.run(
+        wait_for_result("sentence_brief", "abc", "sentence_brief:abc", 0.05)
+    )
+    assert result == "ready"
+
+
+def test_wait_returns_the_brief_and_deletes_it(client, events):
+    finish_brief(events)
+
+    response = client.get("/api/sentencia/abc/wait", params={"timeout": 0})
+
+    assert response.status_code == 200
+    assert response.json()["brief"] == "Hola."
+    assert events.get("sentence_brief:abc") is None
+
+
+def test_wait_times_out_as_pending(client):
+    response = client.get("/api/sentencia/abc/wait", params={"timeout": 0.05})
+
+    assert response.status_code == 202
+    assert response.json()["status"] == "PENDING"
+
+
+def test_wait_reports_a_failed_task(client, fake_async_redis, monkeypatch):
+    check = fake_async_redis.exists
+
+    async def exists_then_fail(key):
+        found = await check(key)
+        publish_result("sentence_brief", "abc", "error")
+        return found
+
+    monkeypatch.setattr(fake_async_redis, "exists", exists_then_fail)
+
+    response = client.get("/api/sentencia/abc/wait", params={"timeout": 1})
+    assert response.status_code == 500
+
+
+def test_timeout_above_the_maximum_is_rejected(client):
+    timeout = routes.LONG_POLL_MAX_TIMEOUT + 1
+    response = client.get("/api/sentencia/abc/wait", params={"timeout": timeout})
+    assert response.status_code == 422
+
+
+def test_feedback_wait_returns_it_once(client, events):
+    events.set("feedback:abc", "Buen resumen.")
+
+    response = client.get("/api/feedback/abc/wait", params={"timeout": 0})
+    assert response.json()["feedback"] == "Buen resumen."
+
+    response = client.get("/api/feedback/abc/wait", params={"timeout": 0})
+    assert response.status_code == 202
@@ -0,0 +1,103 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from server.utils import ocr_engine
+from server.utils.ocr_engine import PytesseractEngine
+
+
+@pytest.fixture
+def engines(monkeypatch):
+    created = []
+
+    def create_engine():
+        engine = SimpleNamespace(name="fake")
+        created.append(engine)
+        return engine
+
+    monkeypatch.setattr(ocr_engine, "create_ocr_engine", create_engine)
+    monkeypatch.setattr(ocr_engine, "_local", threading.local())
+    return created
+
+
+def test_engine_is_reused_within_a_thread(engines):
+    assert ocr_engine.get_ocr_engine() is ocr_engine.get_ocr_engine()
+    assert len(engines) == 1
+
+
+def test_each_thread_gets_its_own_engine(engines):
+    other = []
+    thread = threading.Thread(target=lambda: other.append(ocr_engine.get_ocr_engine()))
+    thread.start()
+    thread.join()
+
+    assert ocr_engine.get_ocr_engine() is not other[0]
+    assert len(engines) == 2
+
+
+def test_forked_process_does_not_reuse_the_parent_engine(engines, monkeypatch):
+    parent = ocr_engine.get_ocr_engine()
+    monkeypatch.setattr(ocr_engine.os, "getpid", lambda: -1)
+
+    assert ocr_engine.get_ocr_engine() is not parent
+
+
+def test_auto_falls_back_to_pytesseract(monkeypatch):
+    monkeypatch.setattr(ocr_engine, "tesserocr", None)
+
+    assert isinstance(ocr_engine.create_ocr_engine("auto"), PytesseractEngine)
+    with pytest.raises(ValueError):
+        ocr_engine.create_ocr_engine("tesserocr")
+
+
+def test_tesserocr_that_cannot_start_falls_back_to_pytesseract(monkeypatch):
+    def missing_language(lang):
+        raise RuntimeError("Failed to init API, possibly an invalid tessdata path")
+
+    monkeypatch.setattr(
+        ocr_engine, "tesserocr", SimpleNamespace(PyTessBaseAPI=missing_language)
+    )
+
+    assert isinstance(ocr_engine.create_ocr_engine("tesserocr"), PytesseractEngine)
+
+
+def test_image_to_data_rebuilds_lines_and_paragraphs(monkeypatch):
+    words = [
+        # (bloque, párrafo, línea, palabra, confianza)
+        (1, 1, 1, "", -1),
+        (1, 1, 1, "Primera", 90),
+        (1, 1, 1, "línea", 80),
+        (1, 1, 2, "Segunda", 70),
+        (1, 1, 2, " ", 95),
+        (1, 2, 1, "Otro", 60),
+        (2, 1, 1, "Bloque", 100),
+    ]
+    data = {
+        "block_num": [w[0] for w in words],
+        "par_num": [w[1] for w in words],
+        "line_num": [w[2] for w in words],
+        "text": [w[3] for w in words],
+        "conf": [w[4] for w in words],
+    }
+    monkeypatch.setattr(
+        ocr_engine.pytesseract, "image_to_data", lambda img, lang, output_type: data
+    )
+
+    result = PytesseractEngine("spa").image_to_data(None)
+
+    assert result.text == "Primera línea\nSegunda\n\nOtro\n\nBloque"
+    # Las palabras vacías y las entradas sin confianza no cuentan
+    assert result.confidence == pytest.approx(80)
+
+
+def test_image_to_data_without_words_has_no_confidence(monkeypatch):
+    data = {key: [] for key in ("block_num", "par_num", "line_num", "text", "conf")}
+    monkeypatch.setattr(
+        ocr_engine.pytesseract, "image_to_data", lambda img, lang, output_type: data
+    )
+
+    result = PytesseractEngine("spa").image_to_data(None)
+
+    assert result.text == ""
+    assert result.confidence is None
@@ -0,0 +1,156 @@
+from unittest.mock import MagicMock
+
+import httpx
+import pytest
+
+from server.ai import overload
+from server.ai.overload import (
+    BackendOverloadedError,
+    CircuitOpenError,
+    GuardedProvider,
+    LLMGuard,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return 1_000_000 + self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeProvider:
+    def __init__(self, clock=None):
+        self.down = False
+        self.clock = clock
+
+    def chat(self, messages, model, stream=False, token_sink=None):
+        if self.down:
+            raise httpx.ConnectError("conexión rechazada")
+        if stream:
+            token_sink.write("o")
+        if self.clock:
+            # La respuesta completa tarda más que LLM_LATENCY_TARGET
+            self.clock.sleep(overload.LLM_LATENCY_TARGET + 1)
+        return "ok"
+
+
+@pytest.fixture
+def guard(monkeypatch, fake_redis):
+    monkeypatch.setattr(overload, "RedisCache", lambda: fake_redis)
+    monkeypatch.setattr(overload, "GUARDS", {})
+    monkeypatch.setattr(overload, "LLM_LIMIT_INITIAL", 4)
+    monkeypatch.setattr(overload, "LLM_LIMIT_MAX_WAIT", 0)
+    monkeypatch.setattr(overload, "LLM_BREAKER_FAILURES", 2)
+    return LLMGuard("http://a:8009/v1")
+
+
+def test_limit_grows_additively_and_halves_once_per_round(guard):
+    limiter = guard.limiter
+    for _ in range(4):
+        limiter.on_success(latency=1)
+    # Cuatro respuestas a tiempo con límite ~4 suben el límite en ~1
+    assert limiter.limit() == pytest.approx(4.95, abs=0.05)
+
+    limiter.on_success(latency=overload.LLM_LATENCY_TARGET + 1)
+    limiter.decrease("timeout", window=10)
+    assert limiter.limit() == pytest.approx(2.48, abs=0.05)
+
+
+def test_calls_beyond_the_limit_are_rejected(guard):
+    for _ in range(4):
+        guard.in_flight.add()
+
+    with pytest.raises(BackendOverloadedError):
+        with guard.track():
+            pass
+    assert guard.in_flight.count() == 4
+
+
+def test_breaker_opens_and_closes_after_a_probe(guard, monkeypatch):
+    provider = GuardedProvider(FakeProvider(), "http://a:8009/v1")
+    provider.provider.down = True
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            provider.chat([], "m")
+
+    # Abierto: falla al instante sin llegar al backend
+    with pytest.raises(CircuitOpenError):
+        provider.chat([], "m")
+    assert provider.guard.stats()["breaker_open"]
+
+    # Pasado el cooldown entra una sola llamada de prueba
+    monkeypatch.setattr(overload, "LLM_BREAKER_COOLDOWN", 0)
+    provider.guard.breaker.on_failure(httpx.ConnectError("conexión rechazada"))
+    provider.provider.down = False
+    with provider.guard.track():
+        with pytest.raises(CircuitOpenError):
+            provider.chat([], "m")
+
+    assert provider.guard.stats()["breaker_failures"] == 0
+    assert provider.chat([], "m") == "ok"
+    assert provider.guard.in_flight.count() == 0
+
+
+def test_slow_probe_keeps_other_calls_out_until_it_ends(
+    guard, monkeypatch, fake_redis
+):
+    monkeypatch.setattr(overload, "LLM_BREAKER_COOLDOWN", 0)
+    breaker = guard.breaker
+    for _ in range(2):
+        breaker.on_failure(httpx.ConnectError("conexión rechazada"))
+
+    with pytest.raises(ValueError):
+        with guard.track():
+            # La clave de la prueba dura lo que una llamada, no lo que el cooldown
+            assert fake_redis.ttls[breaker.probe_key] >= overload.IN_FLIGHT_TTL
+            with pytest.raises(CircuitOpenError):
+                with guard.track():
+                    pass
+            raise ValueError("400")
+
+    # Una prueba que termina sin decidir nada suelta la clave al instante
+    assert fake_redis.get(breaker.probe_key) is None
+    with guard.track():
+        pass
+    assert guard.stats()["breaker_failures"] == 0
+
+
+def test_waiting_for_a_free_slot_backs_off(guard, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(overload, "time", clock)
+    monkeypatch.setattr(overload, "LLM_LIMIT_MAX_WAIT", 30)
+    for _ in range(4):
+        guard.in_flight.add()
+
+    with pytest.raises(BackendOverloadedError):
+        with guard.track():
+            pass
+
+    # Con esperas de 0.1 s serían ~300 intentos contra Redis
+    assert len(clock.sleeps) < 25
+    assert max(clock.sleeps) <= overload.POLL_MAX_SECONDS * 1.5
+    assert clock.now == pytest.approx(30)
+
+
+def test_long_streamed_answers_do_not_lower_the_limit(guard, monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(overload, "time", clock)
+    provider = GuardedProvider(FakeProvider(clock), "http://a:8009/v1")
+    sink = MagicMock()
+
+    assert provider.chat([], "m", stream=True, token_sink=sink) == "ok"
+    sink.write.assert_called_once_with("o")
+    assert guard.limiter.limit() > 4
+
+    provider.chat([], "m")
+    assert guard.limiter.limit() < 4
@@ -0,0 +1,307 @@
+import io
+import multiprocessing
+import os
+import threading
+
+import fitz
+import pytest
+import pytesseract
+from PIL import Image
+
+from server.utils import content_cache, ocr_engine, pdf_reader
+from server.utils.content_cache import ContentCache
+from server.utils.ocr_engine import OCREngine, OCRResult
+from server.utils.pdf_reader import OCRPageError, PyMuPDFWithOCRStrategy
+
+
+class FakeEngine(OCREngine):
+    """Devuelve el proceso que reconoció la imagen en lugar de texto real."""
+
+    name = "fake"
+
+    def image_to_string(self, img):
+        return f"ocr {os.getpid()}"
+
+    def image_to_data(self, img):
+        return OCRResult(text=self.image_to_string(img), confidence=90)
+
+
+class MissingTesseract(FakeEngine):
+    calls = []
+
+    def image_to_string(self, img):
+        MissingTesseract.calls.append(os.getpid())
+        raise pytesseract.TesseractNotFoundError()
+
+
+class ThreadEngine(FakeEngine):
+    """Exige que dos páginas se reconozcan al mismo tiempo."""
+
+    barrier = threading.Barrier(2, timeout=5)
+
+    def image_to_string(self, img):
+        ThreadEngine.barrier.wait()
+        return f"ocr {threading.get_ident()}"
+
+
+class CountingEngine(FakeEngine):
+    calls = 0
+
+    def image_to_string(self, img):
+        CountingEngine.calls += 1
+        return "texto reconocido por ocr"
+
+
+class ResolutionEngine(FakeEngine):
+    """La confianza solo es alta si la imagen tiene al menos `sharp_width` px."""
+
+    sharp_width = 500
+    widths = []
+
+    def image_to_data(self, img):
+        ResolutionEngine.widths.append(img.width)
+        confidence = 95 if img.width >= self.sharp_width else 40
+        return OCRResult(text=f"{img.width}px", confidence=confidence)
+
+
+class StampEngine(FakeEngine):
+    def image_to_string(self, img):
+        return "sello"
+
+
+def png(size: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("L", (size, size), 255).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def mixed_pdf() -> bytes:
+    """
+    Página con texto digital, un membrete (imagen con texto encima), un ícono
+    demasiado chico y un sello escaneado sin texto encima.
+    """
+    with fitz.open() as pdf:
+        page = pdf.new_page(width=200, height=200)
+        page.insert_image(fitz.Rect(10, 20, 190, 60), stream=png(50))
+        page.insert_text((20, 40), "encabezado")
+        page.insert_image(fitz.Rect(180, 180, 190, 190), stream=png(10))
+        for line in range(4):
+            page.insert_text((20, 75 + 12 * line), "cuerpo del texto")
+        page.insert_image(fitz.Rect(20, 130, 180, 190), stream=png(50))
+        return pdf.tobytes()
+
+
+def blank_pdf(pages: int) -> bytes:
+    with fitz.open() as pdf:
+        for _ in range(pages):
+            pdf.new_page(width=200, height=200)
+        return pdf.tobytes()
+
+
+def text_pdf(*lines_per_page: int) -> bytes:
+    """Una página de 200x200 pt por cada número de líneas de texto."""
+    with fitz.open() as pdf:
+        for lines in lines_per_page:
+            page = pdf.new_page(width=200, height=200)
+            for line in range(lines):
+                page.insert_text((20, 30 + 15 * line), "hola mundo")
+        return pdf.tobytes()
+
+
+@pytest.fixture
+def ocr(monkeypatch):
+    monkeypatch.setattr(pdf_reader, "page_ocr_cache", ContentCache("t", "none"))
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", FakeEngine)
+    monkeypatch.setattr(pdf_reader, "MIN_PAGES_FOR_PARALLEL_OCR", 2)
+    return PyMuPDFWithOCRStrategy(workers=2, adaptive=False, hybrid=False)
+
+
+def test_pages_are_recognized_in_the_pool(ocr):
+    records = list(ocr.iter_pages(blank_pdf(4)))
+
+    assert [r.page_number for r in records] == [0, 1, 2, 3]
+    assert all(r.method == "ocr" for r in records)
+    assert f"ocr {os.getpid()}" not in {r.text for r in records}
+
+
+def test_daemon_process_recognizes_pages_in_threads(ocr, monkeypatch):
+    # Como un worker prefork de Celery: un proceso daemon no puede tener hijos
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", ThreadEngine)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+
+    def read():
+        records = ocr.iter_pages(blank_pdf(4))
+        results.put([(r.method, r.text) for r in records])
+
+    worker = context.Process(target=read, daemon=True)
+    worker.start()
+    records = results.get(timeout=10)
+    worker.join()
+
+    assert [method for method, _ in records] == ["ocr"] * 4
+    # Dos páginas se reconocieron a la vez en hilos distintos
+    assert len({text for _, text in records}) == 2
+
+
+def test_pool_that_cannot_start_falls_back_to_serial(ocr, monkeypatch, capsys):
+    class NoForkPool:
+        def __init__(self, **kwargs):
+            pass
+
+        def submit(self, *args):
+            raise OSError("[Errno 11] Resource temporarily unavailable")
+
+        def shutdown(self, **kwargs):
+            pass
+
+    monkeypatch.setattr(pdf_reader, "ProcessPoolExecutor", NoForkPool)
+
+    records = list(ocr.iter_pages(blank_pdf(4)))
+    assert {r.text for r in records} == {f"ocr {os.getpid()}"}
+    assert "WARNING" in capsys.readouterr().out.split("OSError")[0]
+
+
+def test_ocr_errors_in_the_pool_are_not_retried_serially(ocr, monkeypatch):
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", MissingTesseract)
+    MissingTesseract.calls.clear()
+
+    with pytest.raises(OCRPageError, match="TesseractNotFoundError"):
+        list(ocr.iter_pages(blank_pdf(4)))
+    # El proceso padre no repitió el OCR de ninguna página
+    assert os.getpid() not in MissingTesseract.calls
+
+
+@pytest.mark.parametrize(
+    "profile, decision",
+    [
+        ({"density": 0, "fonts": 0, "image_coverage": 1.0}, "OCR"),
+        ({"density": 5, "fonts": 0, "image_coverage": 0.0}, "OCR"),
+        ({"density": 1.0, "fonts": 1, "image_coverage": 0.5}, "TEXT"),
+        ({"density": 0.5, "fonts": 1, "image_coverage": 0.95}, "OCR"),
+        # Poco texto sin imágenes o mucho texto sobre un escaneo: no concluyente
+        ({"density": 0.5, "fonts": 1, "image_coverage": 0.0}, None),
+        ({"density": 3, "fonts": 2, "image_coverage": 0.9}, None),
+    ],
+)
+def test_classify_text_layer_thresholds(profile, decision):
+    assert pdf_reader.classify_text_layer(profile) == decision
+
+
+def test_sampled_pages_are_not_recognized_twice(ocr, monkeypatch):
+    # En serie, para que el contador vea todas las llamadas al motor
+    monkeypatch.setattr(pdf_reader, "MIN_PAGES_FOR_PARALLEL_OCR", 100)
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", CountingEngine)
+    CountingEngine.calls = 0
+
+    # Una línea: la capa de texto no alcanza para decidir y se compara con el OCR
+    records = list(ocr.iter_pages(text_pdf(1, 1)))
+
+    assert CountingEngine.calls == 2
+    assert [r.method for r in records] == ["ocr", "ocr"]
+    assert {r.text for r in records} == {"texto reconocido por ocr"}
+
+
+def test_dense_text_layer_skips_ocr(ocr, monkeypatch):
+    monkeypatch.setattr(pdf_reader, "MIN_PAGES_FOR_PARALLEL_OCR", 100)
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", CountingEngine)
+    CountingEngine.calls = 0
+
+    records = list(ocr.iter_pages(text_pdf(10, 10)))
+
+    assert CountingEngine.calls == 0
+    assert [r.method for r in records] == ["text", "text"]
+    assert records[0].text.count("hola mundo") == 10
+
+
+@pytest.fixture
+def adaptive(ocr, monkeypatch):
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", ResolutionEngine)
+    monkeypatch.setattr(pdf_reader, "OCR_LOW_DPI", 100)
+    monkeypatch.setattr(pdf_reader, "OCR_HIGH_DPI", 300)
+    monkeypatch.setattr(ocr_engine, "OCR_MIN_CONFIDENCE", 70)
+    ResolutionEngine.widths = []
+    with fitz.open(stream=blank_pdf(1), filetype="pdf") as pdf:
+        yield pdf[0]
+
+
+def test_low_confidence_is_retried_at_high_resolution(adaptive):
+    result = pdf_reader.ocr_page(adaptive, adaptive=True)
+
+    # 200 pt a 100 y a 300 dpi
+    assert ResolutionEngine.widths == [278, 834]
+    assert result.dpi == 300
+    assert result.text == "834px"
+    assert result.confidence == 95
+
+
+def test_confident_low_resolution_is_kept(adaptive, monkeypatch):
+    monkeypatch.setattr(ResolutionEngine, "sharp_width", 200)
+
+    result = pdf_reader.ocr_page(adaptive, adaptive=True)
+
+    assert ResolutionEngine.widths == [278]
+    assert result.dpi == 100
+
+
+def test_hybrid_ocr_only_reads_uncovered_images(ocr, monkeypatch):
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", StampEngine)
+    with fitz.open(stream=mixed_pdf(), filetype="pdf") as pdf:
+        page = pdf[0]
+        assert pdf_reader.image_regions_to_ocr(page) == [fitz.Rect(20, 130, 180, 190)]
+
+        result = pdf_reader.ocr_page_hybrid(page)
+
+    # El texto del sello queda después del cuerpo, en orden de lectura
+    body = ["cuerpo del texto"] * 4
+    assert result.text.split("\n") == ["encabezado", *body, "sello"]
+
+
+def test_hybrid_pages_are_marked_in_the_records(ocr, monkeypatch):
+    monkeypatch.setattr(pdf_reader, "get_ocr_engine", StampEngine)
+    ocr.hybrid = True
+
+    [record] = ocr.iter_pages(mixed_pdf())
+
+    assert record.method == "hybrid"
+    assert record.text.endswith("sello")
+
+    ocr.hybrid = False
+    [record] = ocr.iter_pages(mixed_pdf())
+    assert record.method == "text"
+    assert "sello" not in record.text
+
+
+@pytest.fixture
+def reader(ocr, monkeypatch, tmp_path):
+    monkeypatch.setattr(content_cache, "CACHE_DIR", str(tmp_path))
+    cache = ContentCache("extraction-test", backend="disk", max_bytes=1 << 20)
+    monkeypatch.setattr(pdf_reader, "extraction_cache", cache)
+    monkeypatch.setattr(pdf_reader, "MIN_PAGES_FOR_PARALLEL_OCR", 100)
+    return pdf_reader.DocumentReader()
+
+
+def test_pages_are_streamed_and_cached_once_complete(reader):
+    data = text_pdf(10, 10, 10)
+    pages = reader.iter_pages_bytes(data, "sentencia.pdf")
+
+    first = next(pages)
+    key = reader.strategy.cache_key(content_cache.hash_bytes(data))
+    assert first.page_number == 0
+    # Hasta leer la última página no hay nada en el cache
+    assert pdf_reader.extraction_cache.get(key) is None
+
+    records = [first, *pages]
+    cached = list(reader.iter_pages_bytes(data, "sentencia.pdf"))
+
+    assert [r.method for r in cached] == ["cache"] * 3
+    assert [r.text for r in cached] == [r.text for r in records]
+
+
+def test_documents_larger_than_the_buffer_are_not_cached(reader, monkeypatch):
+    monkeypatch.setattr(pdf_reader, "INGEST_BUFFER_MAX_CHARS", 150)
+    data = text_pdf(10, 10, 10)
+
+    assert len(list(reader.iter_pages_bytes(data, "sentencia.pdf"))) == 3
+    records = list(reader.iter_pages_bytes(data, "sentencia.pdf"))
+    assert [r.method for r in records] == ["text"] * 3
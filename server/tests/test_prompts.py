@@ -0,0 +1,62 @@
+import hashlib
+
+import pytest
+
+from server.ai import prompts
+from server.utils import chunker
+
+
+def test_system_prompt_is_identical_across_requests(monkeypatch, fake_redis):
+    monkeypatch.setattr(prompts, "redis_cache", fake_redis)
+    template = "Instrucciones\n```feedback.txt\n{{feedback}}\n```\nFin"
+
+    first = prompts.build_messages(
+        "brief", template, {"feedback": "uno"}, user_content="documento A"
+    )
+    second = prompts.build_messages(
+        "brief", template, {"feedback": "uno\ndos"}, user_content="documento B"
+    )
+
+    assert first[0] == second[0]
+    assert "{{feedback}}" not in first[0]["content"]
+    assert first[1]["content"] == "```feedback\nuno\n```\n\ndocumento A"
+
+
+def test_prefix_stats_count_reuse(monkeypatch, fake_redis):
+    monkeypatch.setattr(prompts, "redis_cache", fake_redis)
+    monkeypatch.setattr(prompts, "PROMPT_PREFIX_STATS", 1)
+
+    for content in ("a", "b", "c"):
+        prompts.build_messages("extractor", "EXTRACTOR", user_content=content)
+    prompts.build_messages("extractor", "EXTRACTOR v2", user_content="d")
+
+    sha = hashlib.sha256(b"EXTRACTOR v2").hexdigest()[:12]
+    assert fake_redis.hgetall(prompts.PREFIX_STATS_KEY) == {
+        "extractor:sha": sha,
+        "extractor:tokens": str(prompts.count_prefix_tokens("EXTRACTOR v2")),
+        "extractor:requests": "4",
+        "extractor:reused": "2",
+    }
+    assert prompts.get_prompt_prefix_stats()["extractor"]["reused"] == 2
+
+
+def test_disabled_prefix_stats_skip_redis(monkeypatch, fake_redis):
+    monkeypatch.setattr(prompts, "redis_cache", fake_redis)
+    monkeypatch.setattr(prompts, "PROMPT_PREFIX_STATS", 0)
+
+    prompts.build_messages("extractor", "EXTRACTOR", user_content="a")
+
+    assert fake_redis.hgetall(prompts.PREFIX_STATS_KEY) == {}
+
+
+def test_preflight_reserves_output_tokens(monkeypatch, fake_redis):
+    monkeypatch.setattr(prompts, "redis_cache", fake_redis)
+    monkeypatch.setattr(chunker, "CONTEXT_WINDOW_SIZE", 200)
+
+    prompts.build_messages("brief", "x", user_content="a" * 70, max_output_tokens=100)
+
+    with pytest.raises(prompts.PromptBudgetExceeded) as exceeded:
+        prompts.build_messages(
+            "brief", "x", user_content="a" * 70, max_output_tokens=116
+        )
+    assert exceeded.value.overflow == 1
@@ -0,0 +1,96 @@
+import httpx
+import pytest
+
+from server.ai import overload, router
+from server.ai.overload import GuardedProvider
+from server.ai.router import RouterProvider, parse_backends
+
+
+class FakeProvider:
+    def __init__(self, url):
+        self.url = url
+        self.down = False
+
+    def chat(self, messages, model, token_sink=None):
+        if self.down:
+            raise httpx.ConnectError("conexión rechazada")
+        return self.url
+
+
+class FakeHealthClient:
+    def __init__(self, down):
+        self.down = down
+
+    def get(self, url):
+        status = 503 if any(url.startswith(d) for d in self.down) else 200
+        return httpx.Response(status, request=httpx.Request("GET", url))
+
+
+@pytest.fixture
+def llm_router(monkeypatch, fake_redis):
+    monkeypatch.setattr(overload, "RedisCache", lambda: fake_redis)
+    monkeypatch.setattr(overload, "GUARDS", {})
+    monkeypatch.setattr(router, "LLM_HEALTH_CHECK_INTERVAL", 0)
+    monkeypatch.setattr(router, "LLM_BACKEND_MAX_FAILURES", 2)
+    backends = parse_backends("http://a:8009/v1|2.5, http://b:8009/v1")
+    return RouterProvider(
+        backends,
+        lambda url: GuardedProvider(FakeProvider(url), url),
+        health_path="/models",
+    )
+
+
+def test_parse_backends_reads_weights():
+    assert parse_backends("a|2,b, ") == [("a", 2.0), ("b", 1.0)]
+
+
+def test_calls_go_to_the_backend_with_fewest_requests_per_weight(llm_router):
+    a, b = llm_router.backends
+    picks = []
+    for _ in range(3):
+        backend = llm_router.candidates()[0]
+        backend.provider.guard.in_flight.add()
+        picks.append(backend)
+
+    # Con peso 2.5, "a" recibe dos llamadas en curso antes que "b" reciba una
+    assert picks == [a, a, b]
+    assert [a.outstanding(), b.outstanding()] == [2, 1]
+
+
+def test_failing_backend_is_ejected_and_readmitted(llm_router):
+    a, b = llm_router.backends
+    a.provider.provider.down = True
+
+    assert llm_router.chat([], "m") == b.url
+    assert llm_router.chat([], "m") == b.url
+    assert not a.healthy
+    assert llm_router.candidates() == [b]
+
+    llm_router.check_health(FakeHealthClient(down=[]))
+    assert a.healthy
+
+    llm_router.check_health(FakeHealthClient(down=[b.url]))
+    assert not b.healthy
+    assert llm_router.candidates() == [a]
+
+
+def test_request_errors_are_not_retried(llm_router):
+    a = llm_router.backends[0]
+    a.provider.provider.chat = lambda *args, **kwargs: (_ for _ in ()).throw(
+        ValueError("400")
+    )
+
+    with pytest.raises(ValueError):
+        llm_router.chat([], "m")
+    assert a.healthy and a.failures == 0
+
+
+def test_guard_rejections_do_not_reset_the_failure_streak(llm_router):
+    a = llm_router.backends[0]
+    a.end(0, httpx.ConnectError("conexión rechazada"))
+    a.end(0, overload.CircuitOpenError("circuito abierto", retry_after=1))
+    a.end(0, overload.BackendOverloadedError("saturado", retry_after=1))
+    assert a.failures == 1
+
+    a.end(0, httpx.ConnectError("conexión rechazada"))
+    assert not a.healthy
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+
+import pytest
+
+from server import tasks
+from server.ai.prompts import PromptBudgetExceeded
+
+
+def fake_task(retries: int, max_retries: int = 5):
+    return SimpleNamespace(
+        request=SimpleNamespace(retries=retries), max_retries=max_retries
+    )
+
+
+@pytest.mark.parametrize(
+    "task",
+    [
+        tasks.ingest_task,
+        tasks.extractor_task,
+        tasks.extract_chunk_task,
+        tasks.assemble_extraction_task,
+        tasks.generate_brief_task,
+        tasks.update_brief_task,
+        tasks.generate_feedback_task,
+    ],
+)
+def test_prompt_budget_errors_are_not_retried(task):
+    assert PromptBudgetExceeded in task.dont_autoretry_for
+
+
+def test_prompt_budget_error_is_final_on_the_first_attempt():
+    error = PromptBudgetExceeded("sentence_brief", prompt_tokens=120, budget=100)
+
+    assert tasks.is_final_attempt(fake_task(retries=0), error)
+    assert not tasks.is_final_attempt(fake_task(retries=0), TimeoutError())
+    assert tasks.is_final_attempt(fake_task(retries=5), TimeoutError())
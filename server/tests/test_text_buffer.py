@@ -0,0 +1,36 @@
+import pytest
+
+from server.utils.text_buffer import SegmentedText
+
+
+@pytest.fixture
+def text(fake_redis):
+    segmented = SegmentedText("source_text:test", segment_chars=4)
+    segmented.redis = fake_redis
+    return segmented
+
+
+def test_spooler_writes_fixed_size_segments(text):
+    with text.writer() as spooler:
+        spooler.write_all(["hola ", "", "mundo", " largo"])
+
+    assert text.redis.lists[text.segments_key] == ["hola", " mun", "do l", "argo"]
+    assert len(text) == 16
+    assert spooler.pending_chars == 0
+
+
+def test_segmented_text_reads_by_offset_and_segments(text):
+    content = "abcdefghijklmnopqrstuvw"
+    with text.writer() as spooler:
+        spooler.write(content)
+
+    assert text.read() == content
+    assert text.read(5, 7) == content[5:12]
+    assert text.read(20, 100) == content[20:]
+    assert "".join(text.iter_segments()) == content
+
+
+def test_missing_text_raises(text):
+    assert not text.exists()
+    with pytest.raises(KeyError):
+        text.read()
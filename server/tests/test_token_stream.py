@@ -0,0 +1,108 @@
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from server import routes
+from server.utils import token_stream
+from server.utils.token_stream import RedisTokenStream, sentence_stream_key
+
+
+@pytest.fixture
+def stream(monkeypatch, fake_redis):
+    monkeypatch.setattr(token_stream, "RedisCache", lambda: fake_redis)
+    monkeypatch.setattr(token_stream, "TOKEN_STREAM_FLUSH_SECONDS", 3600)
+    return RedisTokenStream("abc")
+
+
+@pytest.fixture
+def client(monkeypatch, fake_redis, fake_async_redis):
+    monkeypatch.setattr(routes, "redis_cache", fake_redis)
+    monkeypatch.setattr(routes, "async_redis_cache", fake_async_redis)
+    monkeypatch.setattr(routes, "csv_logger", MagicMock())
+    app = FastAPI()
+    app.include_router(routes.router)
+    return TestClient(app)
+
+
+def published(fake_redis, source_hash="abc"):
+    entries = fake_redis.streams.get(sentence_stream_key(source_hash), [])
+    return [(fields["type"], fields["data"]) for _, fields in entries]
+
+
+def read_events(client, source_hash="abc"):
+    response = client.get(f"/api/sentencia/{source_hash}/stream")
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data[6:])))
+    return events
+
+
+def test_tokens_are_grouped_until_flush(stream, fake_redis):
+    stream.start()
+    stream.write("Hola")
+    stream.write(" mundo")
+    assert published(fake_redis) == [("reset", "")]
+
+    stream.done({"sentence": "Hola mundo."})
+    assert published(fake_redis) == [
+        ("reset", ""),
+        ("token", "Hola mundo"),
+        ("done", json.dumps({"sentence": "Hola mundo."})),
+    ]
+
+
+def test_reset_discards_pending_tokens(stream, fake_redis):
+    stream.write("borrador")
+    stream.reset()
+    stream.error("falló")
+
+    assert published(fake_redis) == [("reset", ""), ("error", "falló")]
+
+
+def test_stream_replays_events_published_before_connecting(stream, client):
+    stream.start()
+    stream.write("Hola")
+    stream.flush()
+    stream.write(" mundo")
+    stream.done({"sentence": "Hola mundo."})
+
+    events = read_events(client)
+
+    assert events[:3] == [("reset", ""), ("token", "Hola"), ("token", " mundo")]
+    event, brief = events[3]
+    assert event == "done"
+    assert brief["brief"] == "Hola mundo."
+    assert brief["hash"] == "abc"
+
+
+def test_stream_and_brief_are_deleted_once_delivered(stream, client, fake_redis):
+    fake_redis.set("sentence_brief:abc", json.dumps({"sentence": "Hola."}))
+    stream.done({"sentence": "Hola."})
+
+    read_events(client)
+
+    assert fake_redis.get("sentence_brief:abc") is None
+    assert sentence_stream_key("abc") not in fake_redis.streams
+    routes.csv_logger.log.assert_called_once()
+
+
+def test_stream_ends_on_error_and_keeps_it_for_other_clients(stream, client):
+    stream.start()
+    stream.error("No se pudo generar la sentencia ciudadana.")
+
+    for _ in range(2):
+        assert read_events(client)[-1] == (
+            "error",
+            "No se pudo generar la sentencia ciudadana.",
+        )
+
+
+def test_stream_times_out(client, monkeypatch):
+    monkeypatch.setattr(routes, "SENTENCE_STREAM_TIMEOUT", 0)
+
+    assert read_events(client) == [("error", "Tiempo de espera agotado.")]
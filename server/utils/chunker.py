@@ -0,0 +1,205 @@
+import math
+import os
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Iterable, Iterator
+from pydantic import BaseModel
+from server.ai.ai_interface import get_prompt_from_file, tokenize_prompt
+from server.utils.pdf_reader import PAGE_CONNECTOR
+from server.utils.printer import Printer
+
+printer = Printer("CHUNKER")
+
+# approx (caracteres / CHARS_PER_TOKEN), hf (tokenizer local de Hugging Face) o vllm
+TOKENIZER_BACKEND = os.getenv("TOKENIZER_BACKEND", "approx").lower()
+# Nombre del tokenizer en Hugging Face o ruta a un tokenizer.json local
+TOKENIZER_NAME = os.getenv("TOKENIZER_NAME", "")
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", 3.5))
+# Tokens de la ventana de contexto del modelo (--max-model-len en vLLM)
+CONTEXT_WINDOW_SIZE = int(os.getenv("CONTEXT_WINDOW_SIZE", 20000))
+# Tokens reservados para la respuesta del extractor
+EXTRACTION_MAX_OUTPUT_TOKENS = int(os.getenv("EXTRACTION_MAX_OUTPUT_TOKENS", 4096))
+# Tokens que agrega la plantilla de chat del modelo alrededor de los mensajes
+CHAT_TEMPLATE_OVERHEAD = 64
+
+# Del límite más fuerte al más débil: páginas, párrafos, líneas, oraciones y palabras
+SEPARATORS = [PAGE_CONNECTOR, "\n\n", "\n", ". ", " "]
+
+
+class TextChunk(BaseModel):
+    text: str
+    tokens: int
+
+
+# =========================
+# Tokenizers
+# =========================
+
+
+class TokenCounter(ABC):
+    @abstractmethod
+    def count(self, text: str) -> int:
+        pass
+
+
+class ApproximateTokenCounter(TokenCounter):
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+class HuggingFaceTokenCounter(TokenCounter):
+    def __init__(self, name: str):
+        from tokenizers import Tokenizer
+
+        if os.path.isfile(name):
+            self.tokenizer = Tokenizer.from_file(name)
+        else:
+            self.tokenizer = Tokenizer.from_pretrained(name)
+
+    def count(self, text: str) -> int:
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class VLLMTokenCounter(TokenCounter):
+    """Cuenta con el endpoint /tokenize del servidor vLLM (una petición por texto)."""
+
+    def count(self, text: str) -> int:
+        count, _, _ = tokenize_prompt(text)
+        return count
+
+
+@lru_cache()
+def get_token_counter() -> TokenCounter:
+    if TOKENIZER_BACKEND == "hf":
+        if not TOKENIZER_NAME:
+            raise ValueError("TOKENIZER_NAME es obligatorio con TOKENIZER_BACKEND=hf")
+        printer.blue(f"Contando tokens con el tokenizer {TOKENIZER_NAME}")
+        return HuggingFaceTokenCounter(TOKENIZER_NAME)
+    if TOKENIZER_BACKEND == "vllm":
+        printer.blue("Contando tokens con el servidor vLLM")
+        return VLLMTokenCounter()
+    if TOKENIZER_BACKEND == "approx":
+        return ApproximateTokenCounter()
+    raise ValueError(f"TOKENIZER_BACKEND {TOKENIZER_BACKEND} no soportado")
+
+
+def prompt_token_budget(max_output_tokens: int) -> int:
+    """Tokens de la ventana de contexto que quedan para los mensajes del prompt."""
+    return CONTEXT_WINDOW_SIZE - max_output_tokens - CHAT_TEMPLATE_OVERHEAD
+
+
+def extraction_token_budget(counter: TokenCounter | None = None) -> int:
+    """
+    Tokens disponibles para el texto de cada chunk: la ventana de contexto menos
+    el prompt del extractor y la respuesta reservada.
+    """
+    counter = counter or get_token_counter()
+    prompt_tokens = counter.count(get_prompt_from_file("EXTRACTOR"))
+    budget = prompt_token_budget(EXTRACTION_MAX_OUTPUT_TOKENS) - prompt_tokens
+    if budget <= 0:
+        raise ValueError(
+            f"CONTEXT_WINDOW_SIZE={CONTEXT_WINDOW_SIZE} no alcanza para el prompt "
+            f"del extractor ({prompt_tokens} tokens) y la respuesta "
+            f"({EXTRACTION_MAX_OUTPUT_TOKENS} tokens)"
+        )
+    return budget
+
+
+# =========================
+# Chunker
+# =========================
+
+
+def split_stream(segments: Iterable[str], separator: str) -> Iterator[str]:
+    """
+    Separa un texto que llega por segmentos, aunque el separador quede partido.
+    El separador solo se busca en el segmento nuevo más los últimos
+    len(separator) - 1 caracteres de lo pendiente, así un texto largo sin
+    separadores no se vuelve a recorrer con cada segmento.
+    """
+    overlap = len(separator) - 1
+    pending: list[str] = []
+    tail = ""
+    for segment in segments:
+        window = tail + segment
+        if separator not in window:
+            pending.append(segment)
+            tail = window[-overlap:] if overlap else ""
+            continue
+        text = "".join(pending)
+        *complete, rest = (text[: len(text) - len(tail)] + window).split(separator)
+        yield from complete
+        pending = [rest]
+        tail = rest[-overlap:] if overlap else ""
+    yield "".join(pending)
+
+
+class TokenChunker:
+    """
+    Agrupa el texto en chunks de hasta `budget` tokens. Corta preferentemente
+    entre páginas y, si una página no cabe, entre párrafos, líneas, oraciones
+    o palabras, en ese orden.
+    """
+
+    def __init__(self, budget: int, counter: TokenCounter | None = None):
+        self.budget = budget
+        self.counter = counter or get_token_counter()
+
+    def chunks(self, segments: Iterable[str]) -> Iterator[TextChunk]:
+        pages = split_stream(segments, SEPARATORS[0])
+        yield from self.pack(pages, 0)
+
+    def pack(self, parts: Iterable[str], level: int) -> Iterator[TextChunk]:
+        separator = SEPARATORS[level]
+        separator_tokens = self.counter.count(separator)
+        current: list[str] = []
+        current_tokens = 0
+        for part in parts:
+            if not part.strip():
+                continue
+            tokens = self.counter.count(part)
+            if tokens > self.budget:
+                # La parte se divide por un límite más débil y sus trozos no se
+                # mezclan con las partes vecinas
+                if current:
+                    yield TextChunk(text=separator.join(current), tokens=current_tokens)
+                    current, current_tokens = [], 0
+                yield from self.split(part, level + 1, tokens)
+                continue
+
+            extra = tokens + (separator_tokens if current else 0)
+            if current and current_tokens + extra > self.budget:
+                yield TextChunk(text=separator.join(current), tokens=current_tokens)
+                current, current_tokens, extra = [], 0, tokens
+            current.append(part)
+            current_tokens += extra
+
+        if current:
+            yield TextChunk(text=separator.join(current), tokens=current_tokens)
+
+    def split(self, text: str, level: int, tokens: int) -> Iterator[TextChunk]:
+        if level < len(SEPARATORS):
+            parts = text.split(SEPARATORS[level])
+            if len(parts) > 1:
+                yield from self.pack(parts, level)
+            else:
+                yield from self.split(text, level + 1, tokens)
+            return
+
+        # Sin separadores disponibles se corta por caracteres
+        size = max(1, len(text) * self.budget // tokens)
+        for start in range(0, len(text), size):
+            piece = text[start : start + size]
+            piece_tokens = self.counter.count(piece)
+            if piece_tokens > self.budget and len(piece) > 1:
+                yield from self.split(piece, level, piece_tokens)
+            else:
+                yield TextChunk(text=piece, tokens=piece_tokens)
+
+
+def iter_extraction_chunks(segments: Iterable[str]) -> Iterator[TextChunk]:
+    """Chunks del texto de origen ajustados al presupuesto del extractor."""
+    counter = get_token_counter()
+    budget = extraction_token_budget(counter)
+    printer.blue(f"Presupuesto por chunk: {budget} tokens ({TOKENIZER_BACKEND})")
+    yield from TokenChunker(budget, counter).chunks(segments)
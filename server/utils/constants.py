@@ -1,3 +1,3 @@
-CLIENTS_KEY = "clients"
-
+CLIENTS_KEY = "clients"
+
 UPLOADS_PATH = "uploads"
\ No newline at end of file
@@ -0,0 +1,318 @@
+import os
+import time
+import atexit
+import hashlib
+from server.utils.printer import Printer
+from server.utils.redis_cache import RedisCache
+
+printer = Printer("CONTENT_CACHE")
+
+CACHE_DIR = os.getenv("CACHE_DIR", "cache")
+# Cada cuántos segundos se suman a Redis los aciertos y fallos acumulados en el
+# proceso (0: en cada acceso al cache)
+CACHE_STATS_FLUSH_SECONDS = float(os.getenv("CACHE_STATS_FLUSH_SECONDS", 5))
+
+# Registro de caches creados en el proceso, para exponer sus estadísticas
+CACHES: dict[str, "ContentCache"] = {}
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+# =========================
+# Backends
+# =========================
+
+
+class RedisContentStore:
+    """
+    Guarda los valores en Redis con TTL desde el último uso. Un sorted set con la
+    hora del último acceso permite expulsar las entradas menos usadas cuando se
+    supera max_bytes. Cada lectura y escritura es un script de Lua, así que el
+    valor, el sorted set y el contador de bytes cambian juntos aunque varios
+    procesos usen el mismo cache.
+    """
+
+    # KEYS: valor, lru | ARGV: entrada, ahora, ttl
+    GET_SCRIPT = """
+    local value = redis.call('GET', KEYS[1])
+    if value then
+        redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+        if tonumber(ARGV[3]) > 0 then
+            redis.call('EXPIRE', KEYS[1], ARGV[3])
+        end
+    end
+    return value
+    """
+
+    # KEYS: valor, lru, tamaños, bytes
+    # ARGV: entrada, ahora, ttl, valor, tamaño, prefijo, max_bytes, máximo de vencidas
+    SET_SCRIPT = """
+    local function drop(entry)
+        local size = tonumber(redis.call('HGET', KEYS[3], entry) or 0)
+        redis.call('DEL', ARGV[6] .. entry)
+        redis.call('HDEL', KEYS[3], entry)
+        redis.call('ZREM', KEYS[2], entry)
+        return redis.call('DECRBY', KEYS[4], size)
+    end
+
+    local ttl = tonumber(ARGV[3])
+    local previous = tonumber(redis.call('HGET', KEYS[3], ARGV[1]) or 0)
+    if ttl > 0 then
+        redis.call('SET', KEYS[1], ARGV[4], 'EX', ttl)
+    else
+        redis.call('SET', KEYS[1], ARGV[4])
+    end
+    redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+    redis.call('HSET', KEYS[3], ARGV[1], ARGV[5])
+    local total = redis.call('INCRBY', KEYS[4], tonumber(ARGV[5]) - previous)
+
+    -- Las entradas que vencieron por TTL ya no están en Redis pero siguen en el
+    -- contador; como cada uso renueva el TTL y la hora del sorted set a la vez,
+    -- son las que no se usan desde hace más de ttl segundos
+    if ttl > 0 then
+        local expired = redis.call(
+            'ZRANGEBYSCORE', KEYS[2], '-inf', tonumber(ARGV[2]) - ttl,
+            'LIMIT', 0, ARGV[8]
+        )
+        for _, entry in ipairs(expired) do
+            total = drop(entry)
+        end
+    end
+
+    while total > tonumber(ARGV[7]) do
+        local oldest = redis.call('ZRANGE', KEYS[2], 0, 0)
+        if #oldest == 0 then
+            break
+        end
+        total = drop(oldest[1])
+    end
+    return total
+    """
+
+    # Entradas vencidas que se descuentan como máximo en cada escritura
+    EXPIRED_PER_SET = 100
+
+    def __init__(self, namespace: str, max_bytes: int, ttl: int | None):
+        self.redis = RedisCache()
+        self.namespace = namespace
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.lru_key = f"{namespace}:lru"
+        self.sizes_key = f"{namespace}:sizes"
+        self.bytes_key = f"{namespace}:bytes"
+        self.get_script = self.redis.register_script(self.GET_SCRIPT)
+        self.set_script = self.redis.register_script(self.SET_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    def get(self, key: str) -> str | None:
+        return self.get_script(
+            keys=[self._key(key), self.lru_key],
+            args=[key, time.time(), self.ttl or 0],
+        )
+
+    def set(self, key: str, value: str) -> None:
+        self.set_script(
+            keys=[self._key(key), self.lru_key, self.sizes_key, self.bytes_key],
+            args=[
+                key,
+                time.time(),
+                self.ttl or 0,
+                value,
+                len(value.encode("utf-8")),
+                self._key(""),
+                self.max_bytes,
+                self.EXPIRED_PER_SET,
+            ],
+        )
+
+
+class DiskContentStore:
+    """
+    Guarda cada valor en un archivo; la fecha de modificación hace de marca
+    de último acceso para la expulsión LRU cuando se supera max_bytes.
+    """
+
+    def __init__(self, namespace: str, max_bytes: int, ttl: int | None):
+        self.directory = os.path.join(CACHE_DIR, namespace)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace(":", "_") + ".txt")
+
+    def get(self, key: str) -> str | None:
+        path = self._path(key)
+        try:
+            if self.ttl and time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+            os.utime(path)
+            return value
+        except FileNotFoundError:
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".txt"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+BACKENDS = {
+    "redis": RedisContentStore,
+    "disk": DiskContentStore,
+}
+
+
+# =========================
+# Cache
+# =========================
+
+
+class ContentCache:
+    """
+    Cache de texto indexado por el hash del contenido de origen. Los errores
+    del backend nunca interrumpen la lectura: se registran y se tratan como miss.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        backend: str = "redis",
+        max_bytes: int = 512 * 1024 * 1024,
+        ttl: int | None = 60 * 60 * 24,
+    ):
+        self.namespace = namespace
+        self.enabled = backend != "none"
+        self.store = (
+            BACKENDS[backend](namespace, max_bytes, ttl) if self.enabled else None
+        )
+        # Los contadores se comparten entre procesos en Redis sea cual sea el backend
+        self.stats_redis = RedisCache()
+        self.stats_key = f"cache_stats:{namespace}"
+        self.counters: dict[str, float] = {"hits": 0, "misses": 0}
+        self.pending: dict[str, float] = {}
+        self.flushed_at = time.monotonic()
+        CACHES[namespace] = self
+
+    @property
+    def hits(self) -> int:
+        return self.counters["hits"]
+
+    @property
+    def misses(self) -> int:
+        return self.counters["misses"]
+
+    @classmethod
+    def from_env(cls, prefix: str, namespace: str, **defaults) -> "ContentCache":
+        """
+        Construye el cache leyendo `{prefix}_BACKEND`, `{prefix}_MAX_BYTES`
+        y `{prefix}_TTL` del entorno.
+        """
+        backend = os.getenv(f"{prefix}_BACKEND", defaults.get("backend", "redis"))
+        max_bytes = int(
+            os.getenv(
+                f"{prefix}_MAX_BYTES", defaults.get("max_bytes", 512 * 1024 * 1024)
+            )
+        )
+        ttl = int(os.getenv(f"{prefix}_TTL", defaults.get("ttl", 60 * 60 * 24))) or None
+        return cls(
+            namespace, backend=backend.lower().strip(), max_bytes=max_bytes, ttl=ttl
+        )
+
+    def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        try:
+            value = self.store.get(key)
+        except Exception as e:
+            printer.error(f"❌ Error al leer del cache '{self.namespace}': {e}")
+            value = None
+
+        self.count("hits" if value is not None else "misses")
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        if not self.enabled:
+            return
+        try:
+            self.store.set(key, value)
+        except Exception as e:
+            printer.error(f"❌ Error al guardar en el cache '{self.namespace}': {e}")
+
+    def count(self, field: str, amount: int | float = 1) -> None:
+        self.counters[field] = self.counters.get(field, 0) + amount
+        self.pending[field] = self.pending.get(field, 0) + amount
+        if time.monotonic() - self.flushed_at >= CACHE_STATS_FLUSH_SECONDS:
+            self.flush_stats()
+
+    def flush_stats(self) -> None:
+        """Suma en Redis, en una sola ida y vuelta, los contadores pendientes."""
+        pending, self.pending = self.pending, {}
+        self.flushed_at = time.monotonic()
+        if not pending:
+            return
+        try:
+            self.stats_redis.hincrby_many(self.stats_key, pending)
+        except Exception:
+            pass
+
+    def stats(self) -> dict:
+        self.flush_stats()
+        stats = {
+            "enabled": self.enabled,
+            "process": dict(self.counters),
+        }
+        try:
+            shared = self.stats_redis.hgetall(self.stats_key)
+            stats["shared"] = {field: float(value) for field, value in shared.items()}
+        except Exception as e:
+            stats["shared"] = {"error": str(e)}
+        return stats
+
+
+def get_cache_stats() -> dict:
+    return {namespace: cache.stats() for namespace, cache in CACHES.items()}
+
+
+@atexit.register
+def flush_cache_stats() -> None:
+    for cache in CACHES.values():
+        cache.flush_stats()
+
+
+extraction_cache = ContentCache.from_env("EXTRACTION_CACHE", namespace="extraction")
+page_ocr_cache = ContentCache.from_env(
+    "PAGE_OCR_CACHE", namespace="page_ocr", max_bytes=256 * 1024 * 1024
+)
@@ -1,78 +1,144 @@
-import os
-import hashlib
-from abc import ABC, abstractmethod
-from PIL import Image
-import pytesseract
-from dotenv import load_dotenv
-
-# =========================
-# Configuración flexible
-# =========================
-
-load_dotenv()
-
-
-tesseract_cmd = os.getenv("TESSERACT_CMD")
-if tesseract_cmd:
-    print("🔍 Usando tesseract_cmd:", tesseract_cmd)
-
-    # Si es Windows, aseguramos que termina en tesseract.exe
-    if os.name == "nt":
-        if os.path.isdir(tesseract_cmd):
-            tesseract_cmd = os.path.join(tesseract_cmd, "tesseract.exe")
-        
-        if not os.path.isfile(tesseract_cmd):
-            raise FileNotFoundError(
-                f"El ejecutable de tesseract no se encontró en: {tesseract_cmd}"
-            )
-
-    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-
-# =========================
-# Estrategia base
-# =========================
-
-
-class ImageStrategy(ABC):
-    @abstractmethod
-    def read(self, path: str) -> str:
-        pass
-
-    def hash_text(self, text: str) -> str:
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
-
-
-# =========================
-# Estrategias específicas
-# =========================
-
-
-class OCRImageStrategy(ImageStrategy):
-    def read(self, path: str) -> str:
-        img = Image.open(path)
-        text = pytesseract.image_to_string(img)
-        return text.strip()
-
-
-# =========================
-# Lector de imágenes
-# =========================
-
-
-class ImageReader:
-    text: str | None = None
-
-    def __init__(self):
-        self.strategy: ImageStrategy = OCRImageStrategy()
-
-    def read(self, path: str) -> str:
-        if not os.path.isfile(path):
-            raise FileNotFoundError(f"Archivo no encontrado: {path}")
-
-        self.text = self.strategy.read(path)
-        return self.text
-
-    def get_hash(self) -> str:
-        if self.text is None:
-            raise ValueError("No se ha leído ninguna imagen todavía")
-        return self.strategy.hash_text(self.text)
+import io
+import os
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator
+from PIL import Image
+from server.utils.printer import Printer
+from server.utils.content_cache import extraction_cache, hash_bytes, hash_file
+from server.utils.pdf_reader import PageRecord
+from server.utils.ocr_engine import (
+    OCR_ADAPTIVE,
+    OCR_HIGH_DPI,
+    OCR_LOW_DPI,
+    adaptive_cache_tag,
+    get_ocr_engine,
+    needs_higher_resolution,
+)
+
+printer = Printer("IMAGE_READER")
+
+# =========================
+# Estrategia base
+# =========================
+
+
+class ImageStrategy(ABC):
+    # Incrementar cuando cambie el texto que produce la estrategia para invalidar el cache
+    VERSION = "1"
+
+    @abstractmethod
+    def read(self, source: str | bytes) -> str:
+        """`source` es la ruta de la imagen o su contenido en bytes."""
+        pass
+
+    def hash_text(self, text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def cache_key(self, content_hash: str) -> str:
+        return f"{self.__class__.__name__}:v{self.VERSION}:{content_hash}"
+
+
+# =========================
+# Estrategias específicas
+# =========================
+
+
+class OCRImageStrategy(ImageStrategy):
+    def read(self, source: str | bytes) -> str:
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        img = Image.open(source)
+        engine = get_ocr_engine()
+        if not OCR_ADAPTIVE:
+            return engine.image_to_string(img).strip()
+
+        # Sin metadatos se asume que la imagen ya viene a alta resolución
+        native_dpi = int(img.info.get("dpi", (OCR_HIGH_DPI,))[0] or OCR_HIGH_DPI)
+        result = None
+        if native_dpi > OCR_LOW_DPI:
+            scale = OCR_LOW_DPI / native_dpi
+            size = (
+                max(1, round(img.width * scale)),
+                max(1, round(img.height * scale)),
+            )
+            result = engine.image_to_data(img.resize(size))
+            result.dpi = OCR_LOW_DPI
+
+        if result is None or needs_higher_resolution(result):
+            result = engine.image_to_data(img)
+            result.dpi = native_dpi
+
+        confidence = (
+            f"{result.confidence:.1f}" if result.confidence is not None else "-"
+        )
+        printer.blue(f"OCR de imagen: dpi={result.dpi}, confianza={confidence}")
+        return result.text.strip()
+
+    def cache_key(self, content_hash: str) -> str:
+        return (
+            f"{super().cache_key(content_hash)}:{adaptive_cache_tag()}:"
+            f"{get_ocr_engine().cache_tag}"
+        )
+
+
+# =========================
+# Lector de imágenes
+# =========================
+
+
+class ImageReader:
+    text: str | None = None
+
+    def __init__(self):
+        self.strategy: ImageStrategy = OCRImageStrategy()
+
+    def read(self, path: str) -> str:
+        return self._join(self.iter_pages(path))
+
+    def read_bytes(
+        self, data: bytes, filename: str, content_hash: str | None = None
+    ) -> str:
+        return self._join(self.iter_pages_bytes(data, filename, content_hash))
+
+    def iter_pages(self, path: str) -> Iterator[PageRecord]:
+        """Una imagen es un documento de una sola página."""
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Archivo no encontrado: {path}")
+
+        yield from self._iter_pages(path, path, hash_file(path))
+
+    def iter_pages_bytes(
+        self, data: bytes, filename: str, content_hash: str | None = None
+    ) -> Iterator[PageRecord]:
+        yield from self._iter_pages(data, filename, content_hash or hash_bytes(data))
+
+    def _iter_pages(
+        self, source: str | bytes, filename: str, content_hash: str
+    ) -> Iterator[PageRecord]:
+        cache_key = self.strategy.cache_key(content_hash)
+        cached_text = extraction_cache.get(cache_key)
+        if cached_text is not None:
+            printer.green(f"Texto extraído encontrado en cache: {filename}")
+            yield PageRecord(text=cached_text, page_number=0, method="cache")
+            return
+
+        start = time.perf_counter()
+        text = self.strategy.read(source)
+        extraction_cache.set(cache_key, text)
+        yield PageRecord(
+            text=text,
+            page_number=0,
+            method="ocr",
+            seconds=time.perf_counter() - start,
+        )
+
+    def _join(self, records: Iterator[PageRecord]) -> str:
+        self.text = "".join(record.text for record in records)
+        return self.text
+
+    def get_hash(self) -> str:
+        if self.text is None:
+            raise ValueError("No se ha leído ninguna imagen todavía")
+        return self.strategy.hash_text(self.text)
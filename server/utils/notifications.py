@@ -0,0 +1,54 @@
+import asyncio
+from typing import Literal
+from server.utils.printer import Printer
+from server.utils.redis_cache import AsyncRedisCache, RedisCache
+
+printer = Printer("NOTIFICATIONS")
+
+ResultKind = Literal["sentence_brief", "feedback"]
+ResultEvent = Literal["ready", "error"]
+
+redis_cache = RedisCache()
+async_redis_cache = AsyncRedisCache()
+
+
+def result_channel(kind: ResultKind, source_hash: str) -> str:
+    return f"events:{kind}:{source_hash}"
+
+
+def publish_result(kind: ResultKind, source_hash: str, event: ResultEvent = "ready"):
+    """Avisa a quienes esperan el resultado de un task que ya terminó."""
+    try:
+        redis_cache.publish(result_channel(kind, source_hash), event)
+    except Exception as e:
+        # Los clientes que esperan igual revisan la clave al agotar el tiempo
+        printer.error(f"❌ Error publicando el evento {kind}:{source_hash}: {e}")
+
+
+async def wait_for_result(
+    kind: ResultKind, source_hash: str, key: str, timeout: float
+) -> ResultEvent | None:
+    """
+    Espera hasta `timeout` segundos a que `key` exista o a que llegue un evento
+    del task. Se suscribe antes de revisar la clave para no perder un evento
+    publicado entre ambas cosas. Devuelve None si se agota el tiempo.
+    """
+    pubsub = async_redis_cache.pubsub()
+    channel = result_channel(kind, source_hash)
+    try:
+        await pubsub.subscribe(channel)
+        if await async_redis_cache.exists(key):
+            return "ready"
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True, timeout=remaining
+            )
+            if message is not None:
+                return message["data"]
+        return None
+    finally:
+        await pubsub.unsubscribe(channel)
+        await pubsub.aclose()
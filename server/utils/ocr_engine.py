@@ -0,0 +1,188 @@
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import pytesseract
+from PIL import Image
+from dotenv import load_dotenv
+from pydantic import BaseModel
+from server.utils.printer import Printer
+
+try:
+    import tesserocr
+except ImportError:
+    tesserocr = None
+
+# =========================
+# Configuración flexible
+# =========================
+
+load_dotenv()
+
+printer = Printer("OCR_ENGINE")
+
+# auto usa tesserocr si está instalado y si no, pytesseract
+OCR_ENGINE = os.getenv("OCR_ENGINE", "auto").lower().strip()
+OCR_LANG = os.getenv("OCR_LANG", "eng")
+
+# Modo adaptativo: OCR a baja resolución y solo si la confianza media de las
+# palabras queda por debajo del umbral se repite a alta resolución
+OCR_ADAPTIVE = os.getenv("OCR_ADAPTIVE", "false").lower() == "true"
+OCR_LOW_DPI = int(os.getenv("OCR_LOW_DPI", 100))
+OCR_HIGH_DPI = int(os.getenv("OCR_HIGH_DPI", 300))
+OCR_MIN_CONFIDENCE = float(os.getenv("OCR_MIN_CONFIDENCE", 70))
+
+tesseract_cmd = os.getenv("TESSERACT_CMD")
+if tesseract_cmd:
+    print("🔍 Usando tesseract_cmd:", tesseract_cmd)
+
+    # Si es Windows, aseguramos que termina en tesseract.exe
+    if os.name == "nt":
+        if os.path.isdir(tesseract_cmd):
+            tesseract_cmd = os.path.join(tesseract_cmd, "tesseract.exe")
+
+        if not os.path.isfile(tesseract_cmd):
+            raise FileNotFoundError(
+                f"El ejecutable de tesseract no se encontró en: {tesseract_cmd}"
+            )
+
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+# =========================
+# Motores de OCR
+# =========================
+
+
+class OCRResult(BaseModel):
+    text: str
+    # Confianza media (0-100) de las palabras reconocidas, None si no hubo palabras
+    confidence: float | None = None
+    dpi: int | None = None
+    seconds: float = 0.0
+
+
+def needs_higher_resolution(result: OCRResult) -> bool:
+    return result.confidence is None or result.confidence < OCR_MIN_CONFIDENCE
+
+
+def adaptive_cache_tag(adaptive: bool = OCR_ADAPTIVE) -> str:
+    if not adaptive:
+        return "fixed"
+    return f"adaptive-{OCR_LOW_DPI}-{OCR_HIGH_DPI}-{OCR_MIN_CONFIDENCE:g}"
+
+
+class OCREngine(ABC):
+    name: str = ""
+
+    def __init__(self, lang: str = OCR_LANG):
+        self.lang = lang
+
+    @abstractmethod
+    def image_to_string(self, img: Image.Image) -> str:
+        pass
+
+    @abstractmethod
+    def image_to_data(self, img: Image.Image) -> OCRResult:
+        """Reconoce el texto y devuelve también la confianza media de las palabras."""
+        pass
+
+    @property
+    def cache_tag(self) -> str:
+        """Identifica el motor y el idioma en las claves de cache del OCR."""
+        return f"{self.name}-{self.lang}"
+
+
+class PytesseractEngine(OCREngine):
+    """Lanza un proceso de tesseract por imagen; no requiere dependencias nativas."""
+
+    name = "pytesseract"
+
+    def image_to_string(self, img: Image.Image) -> str:
+        return pytesseract.image_to_string(img, lang=self.lang)
+
+    def image_to_data(self, img: Image.Image) -> OCRResult:
+        data = pytesseract.image_to_data(
+            img, lang=self.lang, output_type=pytesseract.Output.DICT
+        )
+
+        # Reconstruye el texto agrupando las palabras por bloque, párrafo y línea
+        lines: dict[tuple[int, int, int], list[str]] = {}
+        confidences = []
+        for i, word in enumerate(data["text"]):
+            confidence = float(data["conf"][i])
+            if confidence < 0:
+                continue
+            key = (data["block_num"][i], data["par_num"][i], data["line_num"][i])
+            lines.setdefault(key, []).append(word)
+            if word.strip():
+                confidences.append(confidence)
+
+        text = ""
+        previous_paragraph = None
+        for key in sorted(lines):
+            if previous_paragraph is not None:
+                text += "\n" if key[:2] == previous_paragraph else "\n\n"
+            text += " ".join(word for word in lines[key] if word.strip())
+            previous_paragraph = key[:2]
+
+        return OCRResult(
+            text=text,
+            confidence=sum(confidences) / len(confidences) if confidences else None,
+        )
+
+
+class TesserocrEngine(OCREngine):
+    """
+    Mantiene un handle de libtesseract abierto y lo reutiliza entre páginas,
+    evitando crear un proceso y recargar los modelos del idioma cada vez.
+    """
+
+    name = "tesserocr"
+
+    def __init__(self, lang: str = OCR_LANG):
+        super().__init__(lang)
+        self.api = tesserocr.PyTessBaseAPI(lang=lang)
+
+    def image_to_string(self, img: Image.Image) -> str:
+        self.api.SetImage(img)
+        return self.api.GetUTF8Text()
+
+    def image_to_data(self, img: Image.Image) -> OCRResult:
+        self.api.SetImage(img)
+        text = self.api.GetUTF8Text()
+        confidence = float(self.api.MeanTextConf()) if text.strip() else None
+        return OCRResult(text=text, confidence=confidence)
+
+
+def create_ocr_engine(name: str = OCR_ENGINE, lang: str = OCR_LANG) -> OCREngine:
+    if name == "auto":
+        name = "tesserocr" if tesserocr is not None else "pytesseract"
+
+    if name == "tesserocr":
+        if tesserocr is None:
+            raise ValueError("OCR_ENGINE=tesserocr pero tesserocr no está instalado")
+        try:
+            return TesserocrEngine(lang)
+        except RuntimeError as e:
+            printer.error(f"❌ No se pudo iniciar tesserocr, usando pytesseract: {e}")
+            return PytesseractEngine(lang)
+    elif name == "pytesseract":
+        return PytesseractEngine(lang)
+    else:
+        raise ValueError(f"Motor de OCR '{name}' no soportado")
+
+
+# Un motor por hilo y por proceso: el handle de tesseract no es thread-safe y no
+# debe heredarse a través de un fork
+_local = threading.local()
+
+
+def get_ocr_engine() -> OCREngine:
+    engine = getattr(_local, "engine", None)
+    if engine is None or _local.pid != os.getpid():
+        engine = create_ocr_engine()
+        _local.engine = engine
+        _local.pid = os.getpid()
+        printer.blue(f"Motor de OCR en el proceso {os.getpid()}: {engine.name}")
+    return engine
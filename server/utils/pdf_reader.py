@@ -1,157 +1,683 @@
-# utils/document_reader.py
-
-from abc import ABC, abstractmethod
-import os
-import hashlib
-import fitz  # PyMuPDF
-from fitz import Document as FPDFDocument
-from server.utils.printer import Printer
-import pytesseract
-
-from PIL import Image
-import io
-from docx import Document
-
-PAGE_CONNECTOR = "\n---PAGE---\n"
-
-
-# =========================
-# Estrategia base
-# =========================
-printer = Printer("PDF_READER")
-
-
-class DocumentStrategy(ABC):
-    document_hash: str | None = None
-
-    @abstractmethod
-    def read(self, path: str) -> str:
-        pass
-
-    def hash_text(self, text: str) -> str:
-        return hashlib.sha256(text.encode("utf-8")).hexdigest()
-
-    def split_pages(self, text: str) -> list[str]:
-        return text.split(PAGE_CONNECTOR)
-
-
-# =========================
-# Estrategias específicas
-# =========================
-
-
-def could_contain_digital_signature(text: str) -> bool:
-    suspect_terms = [
-        "firma ",
-        "OCSP",
-        "OCSP FEJEM",
-        "SHA256",
-        "EVIDENCIA CRIPTOGRÁFICA",
-        "algoritmo",
-    ]
-    return any(term in text.lower() for term in suspect_terms)
-
-class PyMuPDFWithOCRStrategy(DocumentStrategy):
-    SAMPLE_PAGES = 4
-
-    def read(self, path: str) -> str:
-        pages = []
-        with fitz.open(path, filetype="pdf") as pdf:
-
-            what_to_do = self.select_strategy(pdf)
-
-            for page in pdf:
-                text = page.get_text()
-                if not text.strip() or what_to_do == "OCR":
-                    pix = page.get_pixmap()
-                    img = Image.open(io.BytesIO(pix.tobytes()))
-                    text = pytesseract.image_to_string(img)
-
-                if could_contain_digital_signature(text):
-                    printer.magenta(
-                        f"Page {page.number} could contain digital signature"
-                    )
-
-                pages.append(text)
-        return PAGE_CONNECTOR.join(pages)
-
-    def select_strategy(self, sample: FPDFDocument):
-        printer.yellow(f"Number of pages for PDF: {sample.page_count}")
-        sample_count = min(sample.page_count, self.SAMPLE_PAGES)
-        printer.yellow(f"Sample count: {sample_count}")
-
-        sample_results = []
-
-        for page in sample.pages(0, sample_count):
-            text_result = page.get_text()
-            pix = page.get_pixmap()
-            img = Image.open(io.BytesIO(pix.tobytes()))
-            ocr_result = pytesseract.image_to_string(img)
-
-            if len(text_result) > len(ocr_result):
-                sample_results.append("TEXT")
-            else:
-                sample_results.append("OCR")
-
-        printer.yellow(f"Sample results: {sample_results}")
-
-        if sample_results.count("OCR") > sample_results.count("TEXT"):
-            return "OCR"
-        else:
-            return "TEXT"
-
-
-class DocxStrategy(DocumentStrategy):
-    def read(self, path: str) -> str:
-        doc = Document(path)
-        paragraphs = [p.text for p in doc.paragraphs if p.text]
-        return "\n".join(paragraphs)
-
-
-class MarkdownStrategy(DocumentStrategy):
-    def read(self, path: str) -> str:
-        with open(path, "r", encoding="utf-8") as f:
-            return f.read()
-
-
-# =========================
-# Lector de documentos
-# =========================
-
-
-class DocumentReader:
-    text: str | None = None
-
-    def __init__(self):
-        self.strategy: DocumentStrategy | None = None
-
-    def _get_strategy(self, path: str) -> DocumentStrategy:
-        ext = os.path.splitext(path)[1].lower()
-
-        if ext == ".pdf":
-            return PyMuPDFWithOCRStrategy()
-        elif ext == ".docx":
-            return DocxStrategy()
-        elif ext == ".md":
-            return MarkdownStrategy()
-        else:
-            raise ValueError(f"Tipo de archivo '{ext}' no soportado")
-
-    def read(self, path: str) -> str:
-        if not os.path.isfile(path):
-            raise FileNotFoundError(f"Archivo no encontrado: {path}")
-
-        self.strategy = self._get_strategy(path)
-        self.text = self.strategy.read(path)
-
-        return self.text
-
-    def split_pages(self, text: str) -> list[str]:
-        if self.strategy is None:
-            raise ValueError("No se ha leído ningún documento todavía")
-        return self.strategy.split_pages(text)
-
-    def get_hash(self) -> str:
-        if self.text is None:
-            raise ValueError("No se ha leído ningún documento todavía")
-        return self.strategy.hash_text(self.text)
+# utils/document_reader.py
+
+from abc import ABC, abstractmethod
+from typing import Iterator, Literal
+import os
+import time
+import hashlib
+import pickle
+import threading
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import fitz  # PyMuPDF
+from fitz import Document as FPDFDocument
+from server.utils.printer import Printer
+from server.utils.content_cache import (
+    extraction_cache,
+    hash_bytes,
+    hash_file,
+    page_ocr_cache,
+)
+from server.utils.text_buffer import INGEST_BUFFER_MAX_CHARS
+from server.utils.ocr_engine import (
+    OCR_ADAPTIVE,
+    OCR_HIGH_DPI,
+    OCR_LOW_DPI,
+    OCREngine,
+    OCRResult,
+    adaptive_cache_tag,
+    get_ocr_engine,
+    needs_higher_resolution,
+)
+
+from PIL import Image
+import io
+from docx import Document
+from pydantic import BaseModel
+
+PAGE_CONNECTOR = "\n---PAGE---\n"
+
+# Número máximo de procesos para el OCR de páginas, por defecto uno por núcleo
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", os.cpu_count() or 1))
+# Por debajo de este número de páginas no vale la pena levantar el pool
+MIN_PAGES_FOR_PARALLEL_OCR = int(os.getenv("MIN_PAGES_FOR_PARALLEL_OCR", 4))
+# Resolución a la que se renderizan las páginas antes del OCR
+OCR_DPI = int(os.getenv("OCR_DPI", 72))
+
+# Caracteres de la capa de texto por cada 1000 pt² a partir de los cuales
+# una página se considera digital sin necesidad de aplicarle OCR
+TEXT_DENSITY_THRESHOLD = float(os.getenv("TEXT_DENSITY_THRESHOLD", 1.0))
+# Fracción de la página cubierta por imágenes a partir de la cual se considera escaneada
+SCANNED_IMAGE_COVERAGE = float(os.getenv("SCANNED_IMAGE_COVERAGE", 0.9))
+
+# Modo híbrido: en páginas con capa de texto se aplica OCR solo a las imágenes
+# incrustadas (sellos, anexos escaneados) que no tienen texto encima. Desactivado
+# por defecto porque suma OCR a páginas que antes se leían solo por su texto
+OCR_HYBRID = os.getenv("OCR_HYBRID", "false").lower() == "true"
+# Fracción mínima de la página que debe ocupar una imagen para aplicarle OCR
+HYBRID_MIN_IMAGE_AREA = float(os.getenv("HYBRID_MIN_IMAGE_AREA", 0.05))
+
+
+# =========================
+# Estrategia base
+# =========================
+printer = Printer("PDF_READER")
+
+
+class PageRecord(BaseModel):
+    """Una página leída, tal como la entregan los iteradores de páginas."""
+
+    text: str
+    page_number: int
+    method: Literal["text", "ocr", "hybrid", "cache"]
+    seconds: float = 0.0
+    confidence: float | None = None
+    dpi: int | None = None
+
+
+class DocumentStrategy(ABC):
+    document_hash: str | None = None
+    # Incrementar cuando cambie el texto que produce la estrategia para invalidar el cache
+    VERSION = "1"
+
+    @abstractmethod
+    def read(self, source: str | bytes) -> str:
+        """`source` es la ruta del archivo o su contenido en bytes."""
+        pass
+
+    def iter_pages(self, source: str | bytes) -> Iterator[PageRecord]:
+        """
+        Entrega el documento página por página. Las estrategias sin páginas
+        (docx, markdown) entregan todo el texto como una sola página.
+        """
+        start = time.perf_counter()
+        text = self.read(source)
+        yield PageRecord(
+            text=text,
+            page_number=0,
+            method="text",
+            seconds=time.perf_counter() - start,
+        )
+
+    def hash_text(self, text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def split_pages(self, text: str) -> list[str]:
+        return text.split(PAGE_CONNECTOR)
+
+    def cache_key(self, content_hash: str) -> str:
+        return f"{self.__class__.__name__}:v{self.VERSION}:{content_hash}"
+
+
+# =========================
+# Estrategias específicas
+# =========================
+
+
+def open_pdf(source: str | bytes) -> FPDFDocument:
+    if isinstance(source, bytes):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source, filetype="pdf")
+
+
+def could_contain_digital_signature(text: str) -> bool:
+    suspect_terms = [
+        "firma ",
+        "OCSP",
+        "OCSP FEJEM",
+        "SHA256",
+        "EVIDENCIA CRIPTOGRÁFICA",
+        "algoritmo",
+    ]
+    return any(term in text.lower() for term in suspect_terms)
+
+def text_layer_profile(page: fitz.Page) -> dict:
+    """
+    Mide la capa de texto de una página sin aplicarle OCR: densidad de
+    caracteres, número de fuentes y fracción del área cubierta por imágenes.
+    """
+    page_area = abs(page.rect) or 1.0
+    text = page.get_text()
+
+    image_area = 0.0
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page.rect
+        image_area += abs(bbox)
+
+    return {
+        "text": text,
+        "density": len(text.strip()) / (page_area / 1000),
+        "fonts": len(page.get_fonts()),
+        "image_coverage": min(image_area / page_area, 1.0),
+    }
+
+
+def classify_text_layer(profile: dict) -> str | None:
+    """
+    Decide "TEXT" u "OCR" a partir del perfil de la página. Devuelve None
+    cuando la heurística no es concluyente y hace falta comparar con el OCR.
+    """
+    has_text_layer = profile["fonts"] > 0 and profile["density"] > 0
+    if not has_text_layer:
+        return "OCR"
+
+    if (
+        profile["density"] >= TEXT_DENSITY_THRESHOLD
+        and profile["image_coverage"] < SCANNED_IMAGE_COVERAGE
+    ):
+        return "TEXT"
+
+    if (
+        profile["density"] < TEXT_DENSITY_THRESHOLD
+        and profile["image_coverage"] >= SCANNED_IMAGE_COVERAGE
+    ):
+        return "OCR"
+
+    return None
+
+
+def hash_pixmap(pix: fitz.Pixmap) -> str:
+    digest = hashlib.sha256(f"{pix.width}x{pix.height}x{pix.n}:".encode("utf-8"))
+    digest.update(pix.samples_mv)
+    return digest.hexdigest()
+
+
+def render_page(
+    page: fitz.Page, dpi: int = OCR_DPI, clip: fitz.Rect | None = None
+) -> fitz.Pixmap:
+    """
+    Renderiza la página (o solo la región `clip`) en escala de grises, que es
+    lo que tesseract necesita.
+    """
+    return page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY, alpha=False, clip=clip)
+
+
+def pixmap_to_image(pix: fitz.Pixmap) -> Image.Image:
+    """
+    Construye la imagen de PIL directamente sobre el buffer del pixmap, sin
+    codificar ni decodificar PNG. La imagen comparte memoria con `pix`: hay
+    que cerrarla antes de que se libere el pixmap.
+    """
+    return Image.frombuffer(
+        "L", (pix.width, pix.height), pix.samples_mv, "raw", "L", pix.stride, 1
+    )
+
+
+def ocr_pixmap(
+    pix: fitz.Pixmap, engine: OCREngine, with_confidence: bool = False
+) -> OCRResult:
+    """
+    Aplica OCR a una página ya renderizada. Las páginas idénticas (membretes,
+    evidencias de firma, carátulas) se reconocen una sola vez gracias al
+    cache de OCR por página, compartido entre documentos y procesos.
+    """
+    method = "data" if with_confidence else "text"
+    cache_key = f"v2:{method}:{engine.cache_tag}:{hash_pixmap(pix)}"
+
+    cached = page_ocr_cache.get(cache_key)
+    if cached is not None:
+        result = OCRResult.model_validate_json(cached)
+        page_ocr_cache.count("saved_seconds", float(result.seconds))
+        return result
+
+    start = time.perf_counter()
+    img = pixmap_to_image(pix)
+    try:
+        if with_confidence:
+            result = engine.image_to_data(img)
+        else:
+            result = OCRResult(text=engine.image_to_string(img))
+    finally:
+        img.close()
+    result.seconds = time.perf_counter() - start
+
+    page_ocr_cache.set(cache_key, result.model_dump_json())
+    return result
+
+
+def ocr_page(
+    page: fitz.Page,
+    dpi: int = OCR_DPI,
+    adaptive: bool = OCR_ADAPTIVE,
+    clip: fitz.Rect | None = None,
+) -> OCRResult:
+    """
+    Renderiza la página (o la región `clip`) y le aplica OCR. En modo adaptativo
+    primero se usa OCR_LOW_DPI y solo se repite a OCR_HIGH_DPI si la confianza es baja.
+    """
+    engine = get_ocr_engine()
+    if not adaptive:
+        result = ocr_pixmap(render_page(page, dpi, clip), engine)
+        result.dpi = dpi
+        return result
+
+    result = ocr_pixmap(
+        render_page(page, OCR_LOW_DPI, clip), engine, with_confidence=True
+    )
+    result.dpi = OCR_LOW_DPI
+    if needs_higher_resolution(result):
+        low_seconds = result.seconds
+        result = ocr_pixmap(
+            render_page(page, OCR_HIGH_DPI, clip), engine, with_confidence=True
+        )
+        result.dpi = OCR_HIGH_DPI
+        result.seconds += low_seconds
+    return result
+
+
+def image_regions_to_ocr(page: fitz.Page) -> list[fitz.Rect]:
+    """
+    Regiones de imágenes incrustadas que merecen OCR: suficientemente grandes
+    y sin bloques de la capa de texto encima (en ese caso ya tienen su texto).
+    """
+    page_area = abs(page.rect) or 1.0
+    text_blocks = [
+        fitz.Rect(block[:4]) for block in page.get_text("blocks") if block[6] == 0
+    ]
+
+    regions = []
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page.rect
+        if abs(bbox) / page_area < HYBRID_MIN_IMAGE_AREA:
+            continue
+        covered_by_text = any(
+            abs(block & bbox) > 0.5 * abs(block) for block in text_blocks if abs(block)
+        )
+        if not covered_by_text:
+            regions.append(bbox)
+    return regions
+
+
+def ocr_page_hybrid(
+    page: fitz.Page, dpi: int = OCR_DPI, adaptive: bool = OCR_ADAPTIVE
+) -> OCRResult:
+    """
+    Conserva la capa de texto de la página y aplica OCR solo a sus imágenes
+    incrustadas; los bloques se unen en orden de lectura (arriba-abajo,
+    izquierda-derecha).
+    """
+    blocks = [
+        (block[1], block[0], block[4].strip())
+        for block in page.get_text("blocks")
+        if block[6] == 0
+    ]
+
+    seconds = 0.0
+    confidences = []
+    for region in image_regions_to_ocr(page):
+        result = ocr_page(page, dpi, adaptive, clip=region)
+        seconds += result.seconds
+        if result.confidence is not None:
+            confidences.append(result.confidence)
+        if result.text.strip():
+            blocks.append((region.y0, region.x0, result.text.strip()))
+
+    blocks.sort(key=lambda block: (round(block[0]), block[1]))
+    return OCRResult(
+        text="\n".join(text for _, _, text in blocks if text),
+        confidence=sum(confidences) / len(confidences) if confidences else None,
+        dpi=dpi if not adaptive else None,
+        seconds=seconds,
+    )
+
+
+def process_page(
+    page: fitz.Page, mode: str, dpi: int = OCR_DPI, adaptive: bool = OCR_ADAPTIVE
+) -> OCRResult:
+    if mode == "hybrid":
+        return ocr_page_hybrid(page, dpi, adaptive)
+    return ocr_page(page, dpi, adaptive)
+
+
+# =========================
+# Pool de OCR por páginas
+# =========================
+
+# Cada proceso (o hilo) del pool abre su propia copia del PDF una sola vez:
+# los documentos de PyMuPDF no se pueden compartir entre hilos
+_worker = threading.local()
+
+
+def _init_ocr_worker(source: str | bytes, dpi: int, adaptive: bool):
+    _worker.pdf = open_pdf(source)
+    _worker.dpi = dpi
+    _worker.adaptive = adaptive
+
+
+class OCRPageError(RuntimeError):
+    """Error del OCR de una página en el pool que no se podía enviar tal cual."""
+
+
+def _process_page_in_worker(job: tuple[int, str]) -> OCRResult:
+    page_number, mode = job
+    try:
+        return process_page(
+            _worker.pdf[page_number], mode, _worker.dpi, _worker.adaptive
+        )
+    except Exception as e:
+        # Algunas excepciones (TesseractNotFoundError) no se pueden reconstruir
+        # en el proceso padre y dejarían el pool roto en lugar de propagarse
+        try:
+            pickle.loads(pickle.dumps(e))
+        except Exception:
+            raise OCRPageError(
+                f"OCR de la página {page_number}: {type(e).__name__}: {e}"
+            ) from None
+        raise
+
+
+class PyMuPDFWithOCRStrategy(DocumentStrategy):
+    SAMPLE_PAGES = 4
+    VERSION = "3"
+
+    def __init__(
+        self,
+        workers: int = OCR_WORKERS,
+        dpi: int = OCR_DPI,
+        adaptive: bool = OCR_ADAPTIVE,
+        hybrid: bool = OCR_HYBRID,
+    ):
+        self.workers = max(1, workers)
+        self.dpi = dpi
+        self.adaptive = adaptive
+        self.hybrid = hybrid
+        # OCR ya calculado durante el muestreo, compartido con la lectura completa
+        self.page_memo: dict[int, OCRResult] = {}
+
+    def cache_key(self, content_hash: str) -> str:
+        # La resolución y el motor cambian el resultado del OCR
+        return (
+            f"{super().cache_key(content_hash)}:{self.dpi}dpi:"
+            f"{adaptive_cache_tag(self.adaptive)}:{get_ocr_engine().cache_tag}"
+            f"{':hybrid' if self.hybrid else ''}"
+        )
+
+    def read(self, source: str | bytes) -> str:
+        return PAGE_CONNECTOR.join(record.text for record in self.iter_pages(source))
+
+    def iter_pages(self, source: str | bytes) -> Iterator[PageRecord]:
+        """
+        Entrega las páginas en orden a medida que están listas: las de texto
+        digital de inmediato y las que requieren OCR conforme el pool las termina.
+        """
+        self.page_memo = {}
+        with open_pdf(source) as pdf:
+
+            what_to_do = self.select_strategy(pdf)
+
+            # (número de página, método, texto de la capa digital)
+            plan: list[tuple[int, str, str]] = []
+            for page in pdf:
+                text = page.get_text()
+                if not text.strip() or what_to_do == "OCR":
+                    method = "memo" if page.number in self.page_memo else "ocr"
+                elif self.hybrid and image_regions_to_ocr(page):
+                    method = "hybrid"
+                else:
+                    method = "text"
+                plan.append((page.number, method, text))
+
+            jobs = [
+                (page_number, method)
+                for page_number, method, _ in plan
+                if method in ("ocr", "hybrid")
+            ]
+            ocr_results = self.iter_ocr_pages(source, pdf, jobs)
+
+            for page_number, method, text in plan:
+                if method in ("ocr", "hybrid"):
+                    result = next(ocr_results)
+                elif method == "memo":
+                    result, method = self.page_memo[page_number], "ocr"
+                else:
+                    result = OCRResult(text=text)
+
+                if could_contain_digital_signature(result.text):
+                    printer.magenta(
+                        f"Page {page_number} could contain digital signature"
+                    )
+
+                yield PageRecord(
+                    text=result.text,
+                    page_number=page_number,
+                    method=method,
+                    seconds=result.seconds,
+                    confidence=result.confidence,
+                    dpi=result.dpi,
+                )
+
+            # Termina el iterador de OCR para que registre el resumen
+            next(ocr_results, None)
+
+    def iter_ocr_pages(
+        self, source: str | bytes, pdf: FPDFDocument, jobs: list[tuple[int, str]]
+    ) -> Iterator[OCRResult]:
+        """
+        Aplica OCR a las páginas indicadas (completas o solo sus imágenes, según
+        el modo de cada una) y entrega los resultados en el mismo orden.
+        Si hay suficientes páginas se reparten entre un pool de procesos acotado
+        por `self.workers`; cada proceso renderiza y reconoce sus propias páginas.
+        """
+        if not jobs:
+            return
+
+        start = time.perf_counter()
+        done = 0
+        workers = min(self.workers, len(jobs))
+        if workers > 1 and len(jobs) >= MIN_PAGES_FOR_PARALLEL_OCR:
+            printer.yellow(
+                f"OCR en paralelo de {len(jobs)} páginas con {workers} procesos"
+            )
+            executor = None
+            futures = []
+            try:
+                executor = self.ocr_executor(source, workers)
+                # Los procesos se crean al encolar el primer trabajo
+                futures = [
+                    executor.submit(_process_page_in_worker, job) for job in jobs
+                ]
+            except (AssertionError, OSError) as e:
+                # El fork falla por falta de recursos o el proceso no puede
+                # tener hijos (AssertionError)
+                printer.warning(
+                    f"⚠️ No se pudo iniciar el pool de OCR, se hará en serie: "
+                    f"{type(e).__name__}: {e}"
+                )
+            try:
+                for future in futures:
+                    result = future.result()
+                    self.log_ocr_result(jobs[done], result)
+                    done += 1
+                    yield result
+            except BrokenProcessPool as e:
+                # Un proceso del pool murió: las páginas que faltan se hacen aquí
+                printer.error(
+                    f"❌ El pool de OCR se interrumpió, se sigue en serie: {e}"
+                )
+            finally:
+                if executor is not None:
+                    executor.shutdown(wait=False, cancel_futures=True)
+
+        for page_number, mode in jobs[done:]:
+            result = process_page(pdf[page_number], mode, self.dpi, self.adaptive)
+            self.log_ocr_result((page_number, mode), result)
+            yield result
+
+        elapsed = time.perf_counter() - start
+        printer.yellow(
+            f"OCR de {len(jobs)} páginas en {elapsed:.2f}s "
+            f"({len(jobs) / max(elapsed, 1e-6):.2f} páginas/s)"
+        )
+
+    def ocr_executor(self, source: str | bytes, workers: int) -> Executor:
+        """
+        Pool de procesos para el OCR. Un proceso daemon, como los workers del
+        pool prefork de Celery, no puede crear procesos hijos: ahí se usan hilos,
+        que también reparten el trabajo porque tesseract libera el GIL.
+        """
+        initargs = (source, self.dpi, self.adaptive)
+        if multiprocessing.current_process().daemon:
+            printer.yellow(f"OCR con {workers} hilos: el proceso actual es daemon")
+            return ThreadPoolExecutor(
+                max_workers=workers, initializer=_init_ocr_worker, initargs=initargs
+            )
+        return ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_ocr_worker, initargs=initargs
+        )
+
+    def log_ocr_result(self, job: tuple[int, str], result: OCRResult):
+        page_number, mode = job
+        confidence = (
+            f"{result.confidence:.1f}" if result.confidence is not None else "-"
+        )
+        printer.blue(
+            f"OCR página {page_number} ({mode}): dpi={result.dpi}, "
+            f"confianza={confidence}, {result.seconds:.2f}s"
+        )
+
+    def select_strategy(self, sample: FPDFDocument):
+        printer.yellow(f"Number of pages for PDF: {sample.page_count}")
+        sample_count = min(sample.page_count, self.SAMPLE_PAGES)
+        printer.yellow(f"Sample count: {sample_count}")
+
+        sample_results = []
+
+        for page in sample.pages(0, sample_count):
+            profile = text_layer_profile(page)
+            decision = classify_text_layer(profile)
+            printer.yellow(
+                f"Page {page.number}: density={profile['density']:.2f}, "
+                f"fonts={profile['fonts']}, "
+                f"image_coverage={profile['image_coverage']:.2f} -> {decision}"
+            )
+            if decision is not None:
+                sample_results.append(decision)
+                continue
+
+            text_result = profile["text"]
+            ocr_result = ocr_page(page, self.dpi, self.adaptive)
+            self.page_memo[page.number] = ocr_result
+
+            if len(text_result) > len(ocr_result.text):
+                sample_results.append("TEXT")
+            else:
+                sample_results.append("OCR")
+
+        printer.yellow(f"Sample results: {sample_results}")
+
+        if sample_results.count("OCR") > sample_results.count("TEXT"):
+            return "OCR"
+        else:
+            return "TEXT"
+
+
+class DocxStrategy(DocumentStrategy):
+    def read(self, source: str | bytes) -> str:
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        doc = Document(source)
+        paragraphs = [p.text for p in doc.paragraphs if p.text]
+        return "\n".join(paragraphs)
+
+
+class MarkdownStrategy(DocumentStrategy):
+    def read(self, source: str | bytes) -> str:
+        if isinstance(source, bytes):
+            return source.decode("utf-8")
+        with open(source, "r", encoding="utf-8") as f:
+            return f.read()
+
+
+# =========================
+# Lector de documentos
+# =========================
+
+
+class DocumentReader:
+    text: str | None = None
+
+    def __init__(self):
+        self.strategy: DocumentStrategy | None = None
+
+    def _get_strategy(self, path: str) -> DocumentStrategy:
+        ext = os.path.splitext(path)[1].lower()
+
+        if ext == ".pdf":
+            return PyMuPDFWithOCRStrategy()
+        elif ext == ".docx":
+            return DocxStrategy()
+        elif ext == ".md":
+            return MarkdownStrategy()
+        else:
+            raise ValueError(f"Tipo de archivo '{ext}' no soportado")
+
+    def read(self, path: str) -> str:
+        self.text = PAGE_CONNECTOR.join(record.text for record in self.iter_pages(path))
+        return self.text
+
+    def read_bytes(
+        self, data: bytes, filename: str, content_hash: str | None = None
+    ) -> str:
+        """
+        Lee un documento a partir de su contenido en memoria, sin pasar por disco.
+        `filename` solo se usa para elegir la estrategia según la extensión.
+        """
+        self.text = PAGE_CONNECTOR.join(
+            record.text
+            for record in self.iter_pages_bytes(data, filename, content_hash)
+        )
+        return self.text
+
+    def iter_pages(self, path: str) -> Iterator[PageRecord]:
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"Archivo no encontrado: {path}")
+
+        yield from self._iter_pages(path, path, hash_file(path))
+
+    def iter_pages_bytes(
+        self, data: bytes, filename: str, content_hash: str | None = None
+    ) -> Iterator[PageRecord]:
+        yield from self._iter_pages(data, filename, content_hash or hash_bytes(data))
+
+    def _iter_pages(
+        self, source: str | bytes, filename: str, content_hash: str
+    ) -> Iterator[PageRecord]:
+        self.strategy = self._get_strategy(filename)
+        cache_key = self.strategy.cache_key(content_hash)
+
+        cached_text = extraction_cache.get(cache_key)
+        if cached_text is not None:
+            printer.green(f"Texto extraído encontrado en cache: {filename}")
+            for page_number, text in enumerate(self.strategy.split_pages(cached_text)):
+                yield PageRecord(text=text, page_number=page_number, method="cache")
+            return
+
+        # Los documentos que superan el buffer de ingesta no se guardan en cache
+        # para no retener una copia completa del texto en memoria
+        pages: list[str] | None = []
+        pages_chars = 0
+        for record in self.strategy.iter_pages(source):
+            if pages is not None:
+                pages.append(record.text)
+                pages_chars += len(record.text)
+                if pages_chars > INGEST_BUFFER_MAX_CHARS:
+                    printer.yellow(
+                        f"Documento demasiado grande para el cache: {filename}"
+                    )
+                    pages = None
+            yield record
+
+        # Solo se guarda en cache cuando el documento se leyó completo
+        if pages is not None:
+            extraction_cache.set(cache_key, PAGE_CONNECTOR.join(pages))
+
+    def split_pages(self, text: str) -> list[str]:
+        if self.strategy is None:
+            raise ValueError("No se ha leído ningún documento todavía")
+        return self.strategy.split_pages(text)
+
+    def get_hash(self) -> str:
+        if self.text is None:
+            raise ValueError("No se ha leído ningún documento todavía")
+        return self.strategy.hash_text(self.text)
@@ -1,590 +1,941 @@
-import os
-import hashlib
-import json
-import time
-
-import re
-import uuid
-from typing import Literal
-from pydantic import BaseModel, Field, field_validator
-from server.utils.pdf_reader import DocumentReader
-from server.utils.printer import Printer
-from server.utils.redis_cache import RedisCache
-from server.ai.ai_interface import (
-    AIInterface,
-    get_faq_questions,
-    get_system_prompt,
-    get_system_editor_prompt,
-    get_system_prompt_with_feedback,
-    get_prompt_from_file,
-)
-from fastapi import UploadFile
-from typing import List, Tuple
-
-from server.utils.image_reader import ImageReader
-from server.ai.vector_store import get_chroma_client
-from server.utils.detectors import is_spanish
-
-
-EXPIRATION_TIME = 60 * 60 * 24  # 24 horas
-LIMIT_CHARACTERS_FOR_TEXT = 10000
-
-N_CHARACTERS_FOR_FEEDBACK_VECTORIZATION = 3000
-
-DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
-
-
-printer = Printer("ROUTES")
-redis_cache = RedisCache()
-
-
-class DataSource(BaseModel):
-    type: Literal["document", "image"]
-    name: str
-    content: str
-    hash: str = Field(default="")
-
-    @field_validator("hash", mode="after", check_fields=False)
-    def compute_hash(cls, v, info):
-        txt = info.data.get("content", "")
-        return hashlib.sha256(txt.encode("utf-8")).hexdigest()
-
-
-def hasher(text: str):
-    return hashlib.sha256(text.encode("utf-8")).hexdigest()
-
-
-def flatten_list(nested_list):
-    """Aplana una lista de listas en una sola lista de elementos."""
-    if not nested_list:
-        return []
-    return [item for sublist in nested_list for item in sublist]
-
-
-def remove_duplicates(lst):
-    """Elimina duplicados de una lista manteniendo el orden."""
-    seen = set()
-    return [item for item in lst if not (item in seen or seen.add(item))]
-
-
-def get_faq_results(doc_hash: str):
-    chroma_client = get_chroma_client()
-    results_str = ""
-
-    questions = get_faq_questions()
-
-    documents = set()
-    for question in questions:
-        retrieval = chroma_client.get_results(
-            collection_name=f"doc_{doc_hash}",
-            query_texts=[question],
-            n_results=3,
-        )
-
-        _documents = flatten_list(retrieval.get("documents", []))
-        documents.update(_documents)
-
-    results_str += (
-        f"Número de preguntas para la base de datos vectorial: {len(questions)}"
-    )
-    documents = remove_duplicates(documents)
-    results_str += (
-        f"Resultados de la búsqueda en base de datos vectorial: {' '.join(documents)}"
-    )
-    # Save as a file called "faq_results.txt"
-    with open("faq_results.txt", "w") as f:
-        f.write(results_str)
-
-    try:
-        chroma_client.delete_collection(f"doc_{doc_hash}")
-    except Exception as e:
-        printer.error(f"❌ Error al eliminar la colección en vector store: {e}")
-    return results_str
-
-
-def translate_to_spanish(text: str):
-    system_prompt = """
-    Your task is to translate the given text to spanish, preserve the original meaning and structure of the text. Return only the translated text, without any other text or explanation. Your unique response must be the translated text.
-    """
-    ai_interface = AIInterface(
-        provider=os.getenv("PROVIDER", "ollama"),
-        api_key=os.getenv("PROVIDER_API_KEY", "asdasd"),
-        base_url=os.getenv("PROVIDER_BASE_URL", None),
-    )
-    response = ai_interface.chat(
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": text},
-        ],
-        model=os.getenv("MODEL", "gemma3"),
-    )
-    return response
-
-
-def clean_markdown_block(text: str) -> str:
-    start_tag = "```markdown"
-    end_tag = "```"
-
-    start_index = text.find(start_tag)
-    if start_index == -1:
-        return text
-
-    start_index += len(start_tag)
-    end_index = text.find(end_tag, start_index)
-    if end_index == -1:
-        return text
-
-    printer.yellow("🔍 La respusta está dentro de un bloque markdown, limpiando...")
-    content = text[start_index:end_index]
-    return content.strip()
-
-
-def clean_reasoning_tag(text: str):
-    # Print the reasoning content
-    end_index = text.find("</think>")
-    if end_index == -1:
-        return text
-    return text[end_index + len("</think>") :].lstrip()
-
-
-def remove_unwanted_elements(text: str) -> str:
-    header_pattern = r"^(#{2,6})\s*(\*\*|__)?\s*¿[^?]+\?\s*(\*\*|__)?\s*$"
-    paragraph_pattern = r"^(\*\*|__)?\s*¿[^?]+\?\s*(\*\*|__)?\s*$"
-    hr_pattern = r"^\s*(?:-{3,}|_{3,}|\*{3,})\s*$"
-
-    text = re.sub(header_pattern, "", text, flags=re.MULTILINE)
-    text = re.sub(paragraph_pattern, "", text, flags=re.MULTILINE)
-    text = re.sub(hr_pattern, "", text, flags=re.MULTILINE)
-    return text.strip()
-
-
-IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"}
-
-DOCUMENT_EXTENSIONS = {".pdf", ".docx", ".md"}
-
-
-def get_extension(filename: str) -> str:
-    return os.path.splitext(filename)[1].lower()
-
-
-def validate_attachments(
-    images: List[UploadFile], documents: List[UploadFile]
-) -> Tuple[List[UploadFile], List[UploadFile]]:
-    """
-    Clasifica y valida archivos recibidos como imágenes y documentos.
-    Devuelve dos listas: (imagenes_validas, documentos_validos).
-    Lanza HTTPException si encuentra una extensión no permitida.
-    """
-    valid_images = []
-    valid_documents = []
-
-    # Procesa archivos enviados como imágenes
-    for file in images:
-        ext = get_extension(file.filename)
-        if ext in IMAGE_EXTENSIONS:
-            valid_images.append(file)
-        elif ext in DOCUMENT_EXTENSIONS:
-            valid_documents.append(file)
-        else:
-            printer.error(
-                f"❌ Extensión no permitida en archivo, archivo ignorado: {file.filename}"
-            )
-            # raise HTTPException(
-            #     status_code=400,
-            #     detail=f"Extensión no permitida en archivo: {file.filename}"
-            # )
-
-    # Procesa archivos enviados como documentos
-    for file in documents:
-        ext = get_extension(file.filename)
-        if ext in DOCUMENT_EXTENSIONS:
-            valid_documents.append(file)
-        elif ext in IMAGE_EXTENSIONS:
-            valid_images.append(file)
-        else:
-            printer.error(
-                f"❌ Extensión no permitida en archivo, archivo ignorado: {file.filename}"
-            )
-            # raise HTTPException(
-            #     status_code=400,
-            #     detail=f"Extensión no permitida en archivo: {file.filename}"
-            # )
-
-    return valid_images, valid_documents
-
-
-def read_documents(document_paths: list[str]):
-    # chroma_client = get_chroma_client()
-    # number_of_documents = len(document_paths)
-    # if number_of_documents > 1:
-    #     max_characters_per_document = LIMIT_CHARACTERS_FOR_TEXT // number_of_documents
-    # else:
-    #     max_characters_per_document = LIMIT_CHARACTERS_FOR_TEXT
-    document_reader = DocumentReader()
-
-    complete_text = ""
-    # limited_text = ""
-    for document_path in document_paths:
-        document_text = document_reader.read(document_path)
-        printer.green(f"🔍 Documento leído: {document_path}")
-        printer.yellow(f"🔍 Inicio del documento: {document_text[:200]}")
-
-        complete_text += f"<document_text name='{document_path}'>: \n{document_text}\n </document_text>"
-
-    if DEBUG_MODE:
-        with open("last_complete_text.txt", "w") as f:
-            f.write(complete_text)
-
-    return complete_text
-
-
-def read_images(images_paths: list[str]):
-    image_reader = ImageReader()
-    text_from_all_documents = ""
-    for image_path in images_paths:
-        image_text = image_reader.read(image_path)
-        printer.yellow(f"🔍 Imagen leída: {image_path}")
-        printer.yellow(f"🔍 Inicio de la imagen: {image_text[:200]}")
-        text_from_all_documents += (
-            f"<image_text name={image_path}>: {image_text} </image_text>"
-        )
-    return text_from_all_documents
-
-
-def read_sources(document_paths: list[str], images_paths: list[str]):
-    text_from_all_documents = read_documents(document_paths)
-    text_from_all_documents += read_images(images_paths)
-    return text_from_all_documents
-
-
-def ensure_feedback_is_applied(sentence: str):
-    printer.blue("🔍 Aplicando retroalimentación a la respuesta...")
-    ai_interface = AIInterface(
-        provider=os.getenv("PROVIDER", "ollama"),
-        api_key=os.getenv("PROVIDER_API_KEY", "asdasd"),
-        base_url=os.getenv("PROVIDER_BASE_URL", None),
-    )
-    system_prompt = get_system_prompt_with_feedback()
-    if not system_prompt:
-        raise ValueError("No se encontró el prompt del sistema.")
-
-    feedback_text = get_feedback_from_redis(n_results=100)
-    system_prompt = system_prompt.replace("{{feedback}}", feedback_text)
-    system_prompt = system_prompt.replace("{{sentence}}", sentence)
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {
-            "role": "user",
-            "content": "Realiza únicamente las modificaciones necesarias.",
-        },
-    ]
-    response = ai_interface.chat(messages=messages, model=os.getenv("MODEL", "gemma3"))
-
-    _, rejected = was_rejected(response)
-    response = clean_reasoning_tag(response)
-    response = clean_markdown_block(response)
-
-    if rejected:
-        printer.yellow("❌ La respuesta fue rechazada por la IA.")
-        response += "\n\n<REJECTED />"
-
-    printer.green("✅ Retroalimentación aplicada a la respuesta.")
-
-    return response
-
-
-def was_rejected(response: str) -> tuple[str, bool]:
-    """
-    Busca si la respuesta contiene alguna de las etiquetas de rechazo.
-    Si existe, las elimina y retorna el texto limpio y True.
-    Si no, retorna el texto original y False.
-    """
-    tags = ["<REJECTED />", "<rejected />", "<rechazado />"]
-    found = any(tag in response for tag in tags)
-    if found:
-        for tag in tags:
-            response = response.replace(tag, "")
-    return response, found
-
-
-def generate_sentence_brief(
-    source_hash: str,
-):
-    extracted_data = get_extracted_data(source_hash)
-    feedback_text = get_feedback_from_redis(n_results=100)
-
-    system_prompt = get_system_prompt()
-    system_prompt = system_prompt.replace("{{feedback}}", feedback_text)
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {
-            "role": "user",
-            "content": "La siguiente es toda la información extraída de la fuentes subidas por el usuario:"
-            + extracted_data,
-        },
-    ]
-
-    time.sleep(0.5)
-    ai_interface = AIInterface(
-        provider=os.getenv("PROVIDER", "ollama"),
-        api_key=os.getenv("PROVIDER_API_KEY", "asdasd"),
-        base_url=os.getenv("PROVIDER_BASE_URL", None),
-    )
-
-    response = ai_interface.chat(messages=messages, model=os.getenv("MODEL", "gemma3"))
-    if DEBUG_MODE:
-        with open("last_response_before_cleaning.txt", "w") as f:
-            f.write(response)
-
-    response, rejected = was_rejected(response)
-
-    response = clean_markdown_block(response)
-    response = clean_reasoning_tag(response)
-    response = remove_unwanted_elements(response)
-    if not is_spanish(response[:150]):
-        printer.yellow("🔍 La respuesta no está en español, traduciendo...")
-        printer.yellow(f"🔍 Respuesta original: {response}")
-        response = translate_to_spanish(response)
-        response = clean_markdown_block(response)
-        response = clean_reasoning_tag(response)
-        response = remove_unwanted_elements(response)
-    else:
-        printer.green("🔍 La respuesta ya está en español en el primer intento.")
-    # response = ensure_feedback_is_applied(response)
-
-    redis_cache.set(
-        f"sentence_brief:{source_hash}",
-        json.dumps(
-            {
-                "sentence": response,
-                "message": (
-                    "Sentencia ciudadana generada con éxito."
-                    if not rejected
-                    else "Sentencia ciudadana rechazada."
-                ),
-                "workflow": "update" if not rejected else "rejected",
-                "rejected": rejected,
-            }
-        ),
-        ex=EXPIRATION_TIME,
-    )
-    printer.green(f"💾 Sentencia ciudadana guardada en cache: {source_hash}")
-
-    return response
-
-
-def update_system_prompt(previous_messages: list[dict], new_system_prompt: str):
-
-    for message in previous_messages:
-        if message["role"] == "system":
-            message["content"] = new_system_prompt
-
-    previous_messages = previous_messages[:2]
-    return previous_messages
-
-
-def change_user_message(previous_messages: list[dict], new_user_message: str):
-    for message in previous_messages:
-        if message["role"] == "user":
-            message["content"] = new_user_message
-    return previous_messages
-
-
-class UpdateResponse(BaseModel):
-    workflow: Literal["update", "question", "rejected"] = Field(
-        ...,
-        description="Indica el tipo de interacción que se debe realizar con el usuario.",
-    )
-    rejected: bool = Field(
-        ...,
-        description="Indica explícitamente si la solicitud de cambios fue rechazada o no.",
-    )
-    message: str = Field(
-        ...,
-        description="Mensaje de la respuesta para el usuario, si la solicitud de cambios fue rechazada, retorna un mensaje amigable indicando por qué debes rechazar la solicitud y la forma correcta de poder solicitar cambios. Si la solicitud de cambios fue aceptada, retorna un mensaje amigable indicando que se realizaron los cambios y que si quiere hacer más cambios, puede hacerlo.",
-    )
-    sentence: str = Field(
-        ...,
-        description="La respuesta final con los cambios realizados únicamente si el workflow es 'update', si no se realizaron cambios, retorna 'unchanged'.",
-    )
-
-
-def update_sentence_brief(
-    sources_hash: str, sentence: str, changes: str, prev_messages: str
-):
-    system_editor_prompt = get_system_editor_prompt()
-    messages = [
-        {
-            "role": "system",
-            "content": system_editor_prompt.replace("{{sentencia}}", sentence).replace(
-                "{{prev_messages}}", prev_messages
-            ),
-        },
-        {
-            "role": "user",
-            "content": changes,
-        },
-    ]
-
-    ai_interface = AIInterface(
-        provider=os.getenv("PROVIDER", "ollama"),
-        api_key=os.getenv("PROVIDER_API_KEY", "asdasd"),
-        base_url=os.getenv("PROVIDER_BASE_URL", None),
-    )
-    printer.yellow("🔍 Enviando mensaje al editor...")
-    response = ai_interface.chat_structured(
-        messages=messages,
-        model=os.getenv("MODEL", "gemma3"),
-        response_format={
-            "type": "json_schema",
-            "json_schema": {
-                "name": "update-sentence-schema",
-                "schema": UpdateResponse.model_json_schema(),
-            },
-        },
-    )
-
-    printer.yellow("🔍 Respuesta del editor: ", response.content)
-    update_response = UpdateResponse.model_validate_json(response.content)
-
-    if DEBUG_MODE:
-        with open("last_update_response.txt", "w") as f:
-            f.write(update_response.model_dump_json())
-
-    # clean the response
-    update_response.sentence = clean_reasoning_tag(update_response.sentence)
-    update_response.sentence = clean_markdown_block(update_response.sentence)
-    update_response.sentence = remove_unwanted_elements(update_response.sentence)
-    update_response.sentence = update_response.sentence.strip()
-
-    redis_cache.set(
-        f"sentence_brief:{sources_hash}",
-        update_response.model_dump_json(),
-        ex=EXPIRATION_TIME,
-    )
-    return update_response
-
-
-def generate_id(text: str) -> str:
-    return hashlib.md5(text.encode("utf-8")).hexdigest()
-
-
-def generate_random_id():
-    return str(uuid.uuid4())
-
-
-def upsert_feedback_in_redis(feedback: str):
-    key = "all_feedbacks"
-    try:
-        redis_cache.rpush(key, feedback)
-        printer.green(f"💾 Feedback guardado en Redis: {feedback}")
-        return True
-    except Exception as e:
-        printer.error(f"❌ Error al guardar el feedback en Redis: {e}")
-        return False
-
-
-def get_feedback_from_redis(n_results: int = 10):
-    key = "all_feedbacks"
-    try:
-        printer.blue("🔍 Buscando feedbacks en Redis...")
-        # Obtener los últimos n_results feedbacks
-        feedbacks = redis_cache.lrange(key, -n_results, -1)
-        # Redis devuelve bytes, decodifica si es necesario
-        feedbacks = [
-            fb.decode("utf-8") if isinstance(fb, bytes) else fb for fb in feedbacks
-        ]
-        printer.green(f"🔍 Feedbacks encontrados: {len(feedbacks)} feedbacks")
-        return "\n".join(feedbacks)
-    except Exception as e:
-        printer.error(f"❌ Error al obtener feedbacks de Redis: {e}")
-        return ""
-
-
-def get_source_text(source_hash: str):
-    source_text = redis_cache.get(f"source_text:{source_hash}")
-    if not source_text:
-        raise Exception("No se encontró el texto de origen en Redis")
-    return source_text
-
-
-def get_extracted_data(source_hash: str):
-    extracted_data = redis_cache.get(f"extracted_data:{source_hash}")
-    if not extracted_data:
-        raise Exception("No se encontró el texto de origen en Redis")
-    return extracted_data
-
-
-def split_text_in_chunks(text: str, n_characters: int) -> list[str]:
-    """
-    Splits the input text into chunks of at most n_characters each.
-
-    Args:
-        text (str): The text to split.
-        n_characters (int): The maximum number of characters per chunk.
-
-    Returns:
-        list[str]: List of text chunks.
-    """
-    return [text[i : i + n_characters] for i in range(0, len(text), n_characters)]
-
-
-def extract_data_from_chunk(chunk: str):
-    system_prompt = get_prompt_from_file("EXTRACTOR")
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": chunk},
-    ]
-    ai_interface = AIInterface(
-        provider=os.getenv("PROVIDER", "ollama"),
-        api_key=os.getenv("PROVIDER_API_KEY", "asdasd"),
-        base_url=os.getenv("PROVIDER_BASE_URL", None),
-    )
-    response = ai_interface.chat(messages=messages, model=os.getenv("MODEL", "gemma3"))
-    response = clean_reasoning_tag(response)
-    return response
-
-
-def sequencial_extraction(source_hash: str) -> str:
-    source_text = get_source_text(source_hash)
-    chunks = split_text_in_chunks(source_text, n_characters=40000)
-    printer.yellow(f"🔍 N chunks: {len(chunks)}")
-
-    cummulative_response = ""
-
-    for i, chunk in enumerate(chunks):
-        response = extract_data_from_chunk(chunk)
-        printer.yellow(f"🔍 Respuesta del chunk {i}...: {response}")
-        cummulative_response += response + "\n"
-
-    redis_cache.set(
-        f"extracted_data:{source_hash}", cummulative_response, ex=EXPIRATION_TIME
-    )
-
-    return cummulative_response
-
-
-def generate_feedback_from_messages(sources_hash: str, messages: str):
-    system_prompt = get_prompt_from_file("FEEDBACK_GENERATOR")
-
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": messages},
-    ]
-    ai_interface = AIInterface(
-        provider=os.getenv("PROVIDER", "ollama"),
-        api_key=os.getenv("PROVIDER_API_KEY", "asdasd"),
-        base_url=os.getenv("PROVIDER_BASE_URL", None),
-    )
-    res = ai_interface.chat(messages=messages, model=os.getenv("MODEL", "gemma3"))
-    res = clean_reasoning_tag(res)
-    res = clean_markdown_block(res)
-    printer.yellow("🔍 Feedback generado: ", res)
-    redis_cache.set(
-        f"feedback:{sources_hash}",
-        res,
-        ex=EXPIRATION_TIME,
-    )
-    return res
+import os
+import asyncio
+import hashlib
+import json
+import math
+import time
+
+import re
+import uuid
+from typing import Iterator, Literal
+from pydantic import BaseModel, Field, field_validator
+from server.utils.pdf_reader import PAGE_CONNECTOR, DocumentReader
+from server.utils.printer import Printer
+from server.utils.redis_cache import RedisCache
+from server.ai.ai_interface import (
+    get_ai_interface,
+    get_faq_questions,
+    get_system_prompt,
+    get_system_editor_prompt,
+    get_system_prompt_with_feedback,
+    get_prompt_from_file,
+)
+from fastapi import UploadFile
+from typing import List, Tuple
+
+from server.utils.image_reader import ImageReader
+from server.utils.uploads import UploadedSource
+from server.utils.text_buffer import SegmentedText
+from server.utils.chunker import (
+    EXTRACTION_MAX_OUTPUT_TOKENS,
+    TokenChunker,
+    get_token_counter,
+    iter_extraction_chunks,
+    prompt_token_budget,
+)
+from server.utils.token_stream import RedisTokenStream
+from server.ai.prompts import PromptBudgetExceeded, build_messages, count_prefix_tokens
+from server.ai.vector_store import get_chroma_client
+from server.utils.detectors import is_spanish
+
+
+EXPIRATION_TIME = 60 * 60 * 24  # 24 horas
+# Los archivos subidos solo se conservan hasta que el worker los procesa
+UPLOAD_EXPIRATION_TIME = 60 * 60  # 1 hora
+LIMIT_CHARACTERS_FOR_TEXT = 10000
+
+N_CHARACTERS_FOR_FEEDBACK_VECTORIZATION = 3000
+
+DEBUG_MODE = os.getenv("DEBUG_MODE", "false").lower() == "true"
+
+# Tokens reservados para la respuesta de la sentencia, del editor y del feedback
+RESPONSE_MAX_OUTPUT_TOKENS = int(os.getenv("RESPONSE_MAX_OUTPUT_TOKENS", 4096))
+
+
+printer = Printer("ROUTES")
+redis_cache = RedisCache()
+binary_redis_cache = RedisCache(decode_responses=False)
+
+
+class EmptyDocumentError(ValueError):
+    """El documento no tiene texto que extraer; reintentar no cambia nada."""
+
+
+class DataSource(BaseModel):
+    type: Literal["document", "image"]
+    name: str
+    content: str
+    hash: str = Field(default="")
+
+    @field_validator("hash", mode="after", check_fields=False)
+    def compute_hash(cls, v, info):
+        txt = info.data.get("content", "")
+        return hashlib.sha256(txt.encode("utf-8")).hexdigest()
+
+
+def hasher(text: str):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def flatten_list(nested_list):
+    """Aplana una lista de listas en una sola lista de elementos."""
+    if not nested_list:
+        return []
+    return [item for sublist in nested_list for item in sublist]
+
+
+def remove_duplicates(lst):
+    """Elimina duplicados de una lista manteniendo el orden."""
+    seen = set()
+    return [item for item in lst if not (item in seen or seen.add(item))]
+
+
+def get_faq_results(doc_hash: str):
+    chroma_client = get_chroma_client()
+    results_str = ""
+
+    questions = get_faq_questions()
+
+    documents = set()
+    for question in questions:
+        retrieval = chroma_client.get_results(
+            collection_name=f"doc_{doc_hash}",
+            query_texts=[question],
+            n_results=3,
+        )
+
+        _documents = flatten_list(retrieval.get("documents", []))
+        documents.update(_documents)
+
+    results_str += (
+        f"Número de preguntas para la base de datos vectorial: {len(questions)}"
+    )
+    documents = remove_duplicates(documents)
+    results_str += (
+        f"Resultados de la búsqueda en base de datos vectorial: {' '.join(documents)}"
+    )
+    # Save as a file called "faq_results.txt"
+    with open("faq_results.txt", "w") as f:
+        f.write(results_str)
+
+    try:
+        chroma_client.delete_collection(f"doc_{doc_hash}")
+    except Exception as e:
+        printer.error(f"❌ Error al eliminar la colección en vector store: {e}")
+    return results_str
+
+
+TRANSLATION_SYSTEM_PROMPT = """
+    Your task is to translate the given text to spanish, preserve the original meaning and structure of the text. Return only the translated text, without any other text or explanation. Your unique response must be the translated text.
+    """
+# Caracteres máximos de cada sección que se traduce por separado
+TRANSLATION_SECTION_CHARS = int(os.getenv("TRANSLATION_SECTION_CHARS", 4000))
+# Tokens de respuesta reservados por cada token de la sección a traducir
+TRANSLATION_OUTPUT_RATIO = 1.5
+
+COMPRESSION_SYSTEM_PROMPT = """
+    Resume la información que te entrega el usuario conservando todos los datos relevantes: partes, fechas, montos, plazos, decisiones y sus fundamentos. Elimina repeticiones y texto de relleno. Responde únicamente con la información resumida, en el mismo idioma, sin explicaciones adicionales.
+    """
+# Veces que se comprimen los datos extraídos para que quepan en el prompt
+COMPRESSION_MAX_ROUNDS = 3
+
+
+def split_to_fit(text: str, exceeded: PromptBudgetExceeded) -> list[str]:
+    """
+    Divide `text` en partes que caben en el presupuesto que el prompt excedió,
+    cortando entre páginas, párrafos u oraciones igual que el chunker.
+    """
+    counter = get_token_counter()
+    budget = counter.count(text) - exceeded.overflow
+    if budget <= 0:
+        raise exceeded
+    return [chunk.text for chunk in TokenChunker(budget, counter).chunks([text])]
+
+
+async def acompress_text(text: str) -> str:
+    """Resume `text` por partes; cada parte y su resumen caben en la ventana."""
+    counter = get_token_counter()
+    prefix_tokens = count_prefix_tokens(COMPRESSION_SYSTEM_PROMPT)
+    # Se reserva para la respuesta lo mismo que ocupa la parte a resumir
+    budget = (prompt_token_budget(0) - prefix_tokens) // 2
+
+    async def compress(chunk) -> str:
+        messages = build_messages(
+            "compression",
+            COMPRESSION_SYSTEM_PROMPT,
+            user_content=chunk.text,
+            max_output_tokens=chunk.tokens,
+        )
+        response = await get_ai_interface().achat(
+            messages=messages,
+            model=os.getenv("MODEL", "gemma3"),
+            max_tokens=chunk.tokens,
+        )
+        return clean_reasoning_tag(response)
+
+    chunks = TokenChunker(budget, counter).chunks([text])
+    return "\n".join(await asyncio.gather(*map(compress, chunks)))
+
+
+def split_text_in_sections(text: str, max_characters: int) -> list[str]:
+    """Agrupa párrafos completos en secciones de hasta `max_characters`."""
+    sections = []
+    current = []
+    current_length = 0
+    for paragraph in text.split("\n\n"):
+        if current and current_length + len(paragraph) > max_characters:
+            sections.append("\n\n".join(current))
+            current, current_length = [], 0
+        current.append(paragraph)
+        current_length += len(paragraph) + 2
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def translation_chunker() -> TokenChunker:
+    """Chunker cuyas secciones caben en la ventana junto con su traducción."""
+    prefix_tokens = count_prefix_tokens(TRANSLATION_SYSTEM_PROMPT)
+    available = prompt_token_budget(0) - prefix_tokens - 1
+    return TokenChunker(int(available / (1 + TRANSLATION_OUTPUT_RATIO)))
+
+
+async def atranslate_section(text: str) -> str:
+    max_tokens = math.ceil(get_token_counter().count(text) * TRANSLATION_OUTPUT_RATIO)
+    try:
+        messages = build_messages(
+            "translation",
+            TRANSLATION_SYSTEM_PROMPT,
+            user_content=text,
+            max_output_tokens=max_tokens,
+        )
+    except PromptBudgetExceeded as e:
+        printer.yellow(f"✂️ {e}, dividiendo la sección")
+        parts = [chunk.text for chunk in translation_chunker().chunks([text])]
+        return "\n\n".join(await asyncio.gather(*map(atranslate_section, parts)))
+
+    return await get_ai_interface().achat(
+        messages=messages,
+        model=os.getenv("MODEL", "gemma3"),
+        max_tokens=max_tokens,
+    )
+
+
+async def atranslate_to_spanish(text: str) -> str:
+    sections = split_text_in_sections(text, TRANSLATION_SECTION_CHARS)
+    translations = await asyncio.gather(*map(atranslate_section, sections))
+    return "\n\n".join(translations)
+
+
+def translate_to_spanish(text: str):
+    # Las secciones se traducen a la vez, hasta LLM_MAX_CONCURRENCY peticiones
+    return asyncio.run(atranslate_to_spanish(text))
+
+
+def clean_markdown_block(text: str) -> str:
+    start_tag = "```markdown"
+    end_tag = "```"
+
+    start_index = text.find(start_tag)
+    if start_index == -1:
+        return text
+
+    start_index += len(start_tag)
+    end_index = text.find(end_tag, start_index)
+    if end_index == -1:
+        return text
+
+    printer.yellow("🔍 La respusta está dentro de un bloque markdown, limpiando...")
+    content = text[start_index:end_index]
+    return content.strip()
+
+
+def clean_reasoning_tag(text: str):
+    # Print the reasoning content
+    end_index = text.find("</think>")
+    if end_index == -1:
+        return text
+    return text[end_index + len("</think>") :].lstrip()
+
+
+def remove_unwanted_elements(text: str) -> str:
+    header_pattern = r"^(#{2,6})\s*(\*\*|__)?\s*¿[^?]+\?\s*(\*\*|__)?\s*$"
+    paragraph_pattern = r"^(\*\*|__)?\s*¿[^?]+\?\s*(\*\*|__)?\s*$"
+    hr_pattern = r"^\s*(?:-{3,}|_{3,}|\*{3,})\s*$"
+
+    text = re.sub(header_pattern, "", text, flags=re.MULTILINE)
+    text = re.sub(paragraph_pattern, "", text, flags=re.MULTILINE)
+    text = re.sub(hr_pattern, "", text, flags=re.MULTILINE)
+    return text.strip()
+
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", ".webp"}
+
+DOCUMENT_EXTENSIONS = {".pdf", ".docx", ".md"}
+
+
+def get_extension(filename: str) -> str:
+    return os.path.splitext(filename)[1].lower()
+
+
+def validate_attachments(
+    images: List[UploadFile], documents: List[UploadFile]
+) -> Tuple[List[UploadFile], List[UploadFile]]:
+    """
+    Clasifica y valida archivos recibidos como imágenes y documentos.
+    Devuelve dos listas: (imagenes_validas, documentos_validos).
+    Lanza HTTPException si encuentra una extensión no permitida.
+    """
+    valid_images = []
+    valid_documents = []
+
+    # Procesa archivos enviados como imágenes
+    for file in images:
+        ext = get_extension(file.filename)
+        if ext in IMAGE_EXTENSIONS:
+            valid_images.append(file)
+        elif ext in DOCUMENT_EXTENSIONS:
+            valid_documents.append(file)
+        else:
+            printer.error(
+                f"❌ Extensión no permitida en archivo, archivo ignorado: {file.filename}"
+            )
+            # raise HTTPException(
+            #     status_code=400,
+            #     detail=f"Extensión no permitida en archivo: {file.filename}"
+            # )
+
+    # Procesa archivos enviados como documentos
+    for file in documents:
+        ext = get_extension(file.filename)
+        if ext in DOCUMENT_EXTENSIONS:
+            valid_documents.append(file)
+        elif ext in IMAGE_EXTENSIONS:
+            valid_images.append(file)
+        else:
+            printer.error(
+                f"❌ Extensión no permitida en archivo, archivo ignorado: {file.filename}"
+            )
+            # raise HTTPException(
+            #     status_code=400,
+            #     detail=f"Extensión no permitida en archivo: {file.filename}"
+            # )
+
+    return valid_images, valid_documents
+
+
+def iter_document_text(documents: list[UploadedSource]) -> Iterator[str]:
+    """
+    Entrega el texto de los documentos en fragmentos, página por página, sin
+    esperar a que se lea el documento completo.
+    """
+    document_reader = DocumentReader()
+    for document in documents:
+        yield f"<document_text name='{document.name}'>: \n"
+        for record in document_reader.iter_pages_bytes(
+            document.data, document.name, document.sha256
+        ):
+            if record.page_number == 0:
+                printer.yellow(f"🔍 Inicio del documento: {record.text[:200]}")
+            else:
+                yield PAGE_CONNECTOR
+            printer.blue(
+                f"Página {record.page_number} de {document.name}: "
+                f"{record.method}, {record.seconds:.2f}s"
+            )
+            yield record.text
+        printer.green(f"🔍 Documento leído: {document.name}")
+        yield "\n </document_text>"
+
+
+def iter_image_text(images: list[UploadedSource]) -> Iterator[str]:
+    image_reader = ImageReader()
+    for image in images:
+        for record in image_reader.iter_pages_bytes(
+            image.data, image.name, image.sha256
+        ):
+            printer.yellow(f"🔍 Imagen leída: {image.name}")
+            printer.yellow(f"🔍 Inicio de la imagen: {record.text[:200]}")
+            yield f"<image_text name={image.name}>: {record.text} </image_text>"
+
+
+def iter_source_text(
+    documents: list[UploadedSource], images: list[UploadedSource]
+) -> Iterator[str]:
+    yield from iter_document_text(documents)
+    yield from iter_image_text(images)
+
+
+def hash_sources(sources: list[UploadedSource]) -> str:
+    """Identificador del trabajo, derivado del contenido de los archivos subidos."""
+    return hasher("\n".join(f"{source.name}:{source.sha256}" for source in sources))
+
+
+def claim_ingest_job(job_hash: str) -> bool:
+    """
+    Marca el trabajo como en curso. Devuelve False si ya hay uno con los mismos
+    archivos en proceso: ese trabajo comparte las claves `upload:{hash}:*` y el
+    stream de la sentencia, así que no se vuelve a guardar ni a encolar.
+    """
+    return redis_cache.set(
+        f"ingest_job:{job_hash}", "1", ex=UPLOAD_EXPIRATION_TIME, nx=True
+    )
+
+
+def release_ingest_job(job_hash: str):
+    """Libera el trabajo cuando la sentencia terminó, bien o con error."""
+    redis_cache.delete(f"ingest_job:{job_hash}")
+
+
+def store_uploaded_sources(
+    job_hash: str, documents: list[UploadedSource], images: list[UploadedSource]
+):
+    """
+    Guarda en Redis el contenido de los archivos subidos para que el worker
+    de ingesta los lea, junto con un manifiesto con su tipo, nombre y hash.
+    """
+    manifest = []
+    for kind, sources in (("document", documents), ("image", images)):
+        for source in sources:
+            key = f"upload:{job_hash}:{len(manifest)}"
+            binary_redis_cache.set(key, source.data, ex=UPLOAD_EXPIRATION_TIME)
+            manifest.append(
+                {"type": kind, "name": source.name, "sha256": source.sha256, "key": key}
+            )
+
+    redis_cache.set(
+        f"upload_manifest:{job_hash}", json.dumps(manifest), ex=UPLOAD_EXPIRATION_TIME
+    )
+
+
+def load_uploaded_sources(
+    job_hash: str,
+) -> tuple[list[UploadedSource], list[UploadedSource]]:
+    manifest = redis_cache.get(f"upload_manifest:{job_hash}")
+    if not manifest:
+        raise Exception("No se encontraron los archivos subidos en Redis")
+
+    documents: list[UploadedSource] = []
+    images: list[UploadedSource] = []
+    for entry in json.loads(manifest):
+        data = binary_redis_cache.get(entry["key"])
+        if data is None:
+            raise Exception(f"El archivo subido expiró en Redis: {entry['name']}")
+        source = UploadedSource(name=entry["name"], data=data, sha256=entry["sha256"])
+        (documents if entry["type"] == "document" else images).append(source)
+
+    return documents, images
+
+
+def delete_uploaded_sources(job_hash: str):
+    manifest = redis_cache.get(f"upload_manifest:{job_hash}")
+    if not manifest:
+        return
+    keys = [entry["key"] for entry in json.loads(manifest)]
+    binary_redis_cache.delete(*keys, f"upload_manifest:{job_hash}")
+
+
+def ingest_sources(job_hash: str) -> int:
+    """
+    Lee (y aplica OCR si hace falta) los archivos subidos de un trabajo y deja
+    el texto en Redis para la etapa de extracción. Las páginas pasan por un
+    buffer acotado que se vuelca a Redis por segmentos, sin armar el texto
+    completo en memoria. Devuelve la cantidad de caracteres escritos.
+    """
+    documents, images = load_uploaded_sources(job_hash)
+    with source_text_buffer(job_hash).writer() as spooler:
+        spooler.write_all(iter_source_text(documents, images))
+    delete_uploaded_sources(job_hash)
+    return spooler.length
+
+
+def ensure_feedback_is_applied(sentence: str):
+    printer.blue("🔍 Aplicando retroalimentación a la respuesta...")
+    ai_interface = get_ai_interface()
+    system_prompt = get_system_prompt_with_feedback()
+    if not system_prompt:
+        raise ValueError("No se encontró el prompt del sistema.")
+
+    feedback_text = get_feedback_from_redis(n_results=100)
+    messages = build_messages(
+        "feedback_check",
+        system_prompt,
+        {"feedback": feedback_text, "sentence": sentence},
+        user_content="Realiza únicamente las modificaciones necesarias.",
+        max_output_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+    response = ai_interface.chat(
+        messages=messages,
+        model=os.getenv("MODEL", "gemma3"),
+        max_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+
+    _, rejected = was_rejected(response)
+    response = clean_reasoning_tag(response)
+    response = clean_markdown_block(response)
+
+    if rejected:
+        printer.yellow("❌ La respuesta fue rechazada por la IA.")
+        response += "\n\n<REJECTED />"
+
+    printer.green("✅ Retroalimentación aplicada a la respuesta.")
+
+    return response
+
+
+def was_rejected(response: str) -> tuple[str, bool]:
+    """
+    Busca si la respuesta contiene alguna de las etiquetas de rechazo.
+    Si existe, las elimina y retorna el texto limpio y True.
+    Si no, retorna el texto original y False.
+    """
+    tags = ["<REJECTED />", "<rejected />", "<rechazado />"]
+    found = any(tag in response for tag in tags)
+    if found:
+        for tag in tags:
+            response = response.replace(tag, "")
+    return response, found
+
+
+def sentence_brief_messages(feedback_text: str, extracted_data: str) -> list[dict]:
+    # El feedback y los datos extraídos van después de las instrucciones fijas
+    return build_messages(
+        "sentence_brief",
+        get_system_prompt(),
+        {"feedback": feedback_text},
+        user_content="La siguiente es toda la información extraída de la fuentes subidas por el usuario:"
+        + extracted_data,
+        max_output_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+
+
+def fit_sentence_brief_messages(feedback_text: str, extracted_data: str):
+    """
+    Si los datos extraídos no caben en el prompt se resumen, hasta
+    COMPRESSION_MAX_ROUNDS veces, en lugar de enviarlos y cortar la respuesta.
+    """
+    for _ in range(COMPRESSION_MAX_ROUNDS):
+        try:
+            return sentence_brief_messages(feedback_text, extracted_data)
+        except PromptBudgetExceeded as e:
+            printer.yellow(f"🗜️ {e}, resumiendo los datos extraídos")
+            extracted_data = asyncio.run(acompress_text(extracted_data))
+    return sentence_brief_messages(feedback_text, extracted_data)
+
+
+def generate_sentence_brief(
+    source_hash: str,
+):
+    extracted_data = get_extracted_data(source_hash)
+    feedback_text = get_feedback_from_redis(n_results=100)
+    messages = fit_sentence_brief_messages(feedback_text, extracted_data)
+
+    time.sleep(0.5)
+    ai_interface = get_ai_interface()
+
+    # Los tokens se publican en sentence_stream:{hash} mientras se generan
+    token_stream = RedisTokenStream(source_hash)
+    token_stream.start()
+    response = ai_interface.chat(
+        messages=messages,
+        model=os.getenv("MODEL", "gemma3"),
+        stream=True,
+        token_sink=token_stream,
+        max_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+    if DEBUG_MODE:
+        with open("last_response_before_cleaning.txt", "w") as f:
+            f.write(response)
+
+    response, rejected = was_rejected(response)
+
+    response = clean_markdown_block(response)
+    response = clean_reasoning_tag(response)
+    response = remove_unwanted_elements(response)
+    if not is_spanish(response[:150]):
+        printer.yellow("🔍 La respuesta no está en español, traduciendo...")
+        printer.yellow(f"🔍 Respuesta original: {response}")
+        response = translate_to_spanish(response)
+        response = clean_markdown_block(response)
+        response = clean_reasoning_tag(response)
+        response = remove_unwanted_elements(response)
+    else:
+        printer.green("🔍 La respuesta ya está en español en el primer intento.")
+    # response = ensure_feedback_is_applied(response)
+
+    sentence_brief = {
+        "sentence": response,
+        "message": (
+            "Sentencia ciudadana generada con éxito."
+            if not rejected
+            else "Sentencia ciudadana rechazada."
+        ),
+        "workflow": "update" if not rejected else "rejected",
+        "rejected": rejected,
+    }
+    redis_cache.set(
+        f"sentence_brief:{source_hash}",
+        json.dumps(sentence_brief),
+        ex=EXPIRATION_TIME,
+    )
+    # La versión final (limpia y traducida si hizo falta) reemplaza a los tokens
+    token_stream.done(sentence_brief)
+    printer.green(f"💾 Sentencia ciudadana guardada en cache: {source_hash}")
+
+    return response
+
+
+def update_system_prompt(previous_messages: list[dict], new_system_prompt: str):
+
+    for message in previous_messages:
+        if message["role"] == "system":
+            message["content"] = new_system_prompt
+
+    previous_messages = previous_messages[:2]
+    return previous_messages
+
+
+def change_user_message(previous_messages: list[dict], new_user_message: str):
+    for message in previous_messages:
+        if message["role"] == "user":
+            message["content"] = new_user_message
+    return previous_messages
+
+
+class UpdateResponse(BaseModel):
+    workflow: Literal["update", "question", "rejected"] = Field(
+        ...,
+        description="Indica el tipo de interacción que se debe realizar con el usuario.",
+    )
+    rejected: bool = Field(
+        ...,
+        description="Indica explícitamente si la solicitud de cambios fue rechazada o no.",
+    )
+    message: str = Field(
+        ...,
+        description="Mensaje de la respuesta para el usuario, si la solicitud de cambios fue rechazada, retorna un mensaje amigable indicando por qué debes rechazar la solicitud y la forma correcta de poder solicitar cambios. Si la solicitud de cambios fue aceptada, retorna un mensaje amigable indicando que se realizaron los cambios y que si quiere hacer más cambios, puede hacerlo.",
+    )
+    sentence: str = Field(
+        ...,
+        description="La respuesta final con los cambios realizados únicamente si el workflow es 'update', si no se realizaron cambios, retorna 'unchanged'.",
+    )
+
+
+def sentence_editor_messages(
+    sentence: str, changes: str, prev_messages: str
+) -> list[dict]:
+    return build_messages(
+        "sentence_editor",
+        get_system_editor_prompt(),
+        {"sentencia": sentence, "prev_messages": prev_messages},
+        user_content=changes,
+        max_output_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+
+
+def update_sentence_brief(
+    sources_hash: str, sentence: str, changes: str, prev_messages: str
+):
+    try:
+        messages = sentence_editor_messages(sentence, changes, prev_messages)
+    except PromptBudgetExceeded as e:
+        if not prev_messages:
+            raise
+        printer.yellow(f"✂️ {e}, se conserva solo el final del historial")
+        recent_messages = split_to_fit(prev_messages, e)[-1]
+        messages = sentence_editor_messages(sentence, changes, recent_messages)
+
+    ai_interface = get_ai_interface()
+    printer.yellow("🔍 Enviando mensaje al editor...")
+    response = ai_interface.chat_structured(
+        messages=messages,
+        model=os.getenv("MODEL", "gemma3"),
+        response_format={
+            "type": "json_schema",
+            "json_schema": {
+                "name": "update-sentence-schema",
+                "schema": UpdateResponse.model_json_schema(),
+            },
+        },
+        max_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+
+    printer.yellow("🔍 Respuesta del editor: ", response.content)
+    update_response = UpdateResponse.model_validate_json(response.content)
+
+    if DEBUG_MODE:
+        with open("last_update_response.txt", "w") as f:
+            f.write(update_response.model_dump_json())
+
+    # clean the response
+    update_response.sentence = clean_reasoning_tag(update_response.sentence)
+    update_response.sentence = clean_markdown_block(update_response.sentence)
+    update_response.sentence = remove_unwanted_elements(update_response.sentence)
+    update_response.sentence = update_response.sentence.strip()
+
+    redis_cache.set(
+        f"sentence_brief:{sources_hash}",
+        update_response.model_dump_json(),
+        ex=EXPIRATION_TIME,
+    )
+    return update_response
+
+
+def generate_id(text: str) -> str:
+    return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+
+def generate_random_id():
+    return str(uuid.uuid4())
+
+
+def upsert_feedback_in_redis(feedback: str):
+    key = "all_feedbacks"
+    try:
+        redis_cache.rpush(key, feedback)
+        printer.green(f"💾 Feedback guardado en Redis: {feedback}")
+        return True
+    except Exception as e:
+        printer.error(f"❌ Error al guardar el feedback en Redis: {e}")
+        return False
+
+
+def get_feedback_from_redis(n_results: int = 10):
+    key = "all_feedbacks"
+    try:
+        printer.blue("🔍 Buscando feedbacks en Redis...")
+        # Obtener los últimos n_results feedbacks
+        feedbacks = redis_cache.lrange(key, -n_results, -1)
+        # Redis devuelve bytes, decodifica si es necesario
+        feedbacks = [
+            fb.decode("utf-8") if isinstance(fb, bytes) else fb for fb in feedbacks
+        ]
+        printer.green(f"🔍 Feedbacks encontrados: {len(feedbacks)} feedbacks")
+        return "\n".join(feedbacks)
+    except Exception as e:
+        printer.error(f"❌ Error al obtener feedbacks de Redis: {e}")
+        return ""
+
+
+def source_text_buffer(source_hash: str) -> SegmentedText:
+    return SegmentedText(f"source_text:{source_hash}", ex=EXPIRATION_TIME)
+
+
+def get_extracted_data(source_hash: str):
+    extracted_data = redis_cache.get(f"extracted_data:{source_hash}")
+    if extracted_data is None:
+        raise Exception("No se encontró el texto de origen en Redis")
+    return extracted_data
+
+
+def extraction_messages(chunk: str) -> list[dict]:
+    return build_messages(
+        "extractor",
+        get_prompt_from_file("EXTRACTOR"),
+        user_content=chunk,
+        max_output_tokens=EXTRACTION_MAX_OUTPUT_TOKENS,
+    )
+
+
+def extract_data_from_chunk(chunk: str):
+    try:
+        messages = extraction_messages(chunk)
+    except PromptBudgetExceeded as e:
+        # Pasa si el tokenizer cuenta distinto que al planificar los chunks
+        printer.yellow(f"✂️ {e}, dividiendo el chunk")
+        return "\n".join(map(extract_data_from_chunk, split_to_fit(chunk, e)))
+
+    ai_interface = get_ai_interface()
+    response = ai_interface.chat(
+        messages=messages,
+        model=os.getenv("MODEL", "gemma3"),
+        max_tokens=EXTRACTION_MAX_OUTPUT_TOKENS,
+    )
+    response = clean_reasoning_tag(response)
+    return response
+
+
+async def aextract_data_from_chunk(chunk: str):
+    try:
+        messages = extraction_messages(chunk)
+    except PromptBudgetExceeded as e:
+        printer.yellow(f"✂️ {e}, dividiendo el chunk")
+        parts = split_to_fit(chunk, e)
+        return "\n".join(await asyncio.gather(*map(aextract_data_from_chunk, parts)))
+
+    ai_interface = get_ai_interface()
+    response = await ai_interface.achat(
+        messages=messages,
+        model=os.getenv("MODEL", "gemma3"),
+        max_tokens=EXTRACTION_MAX_OUTPUT_TOKENS,
+    )
+    return clean_reasoning_tag(response)
+
+
+def plan_extraction_chunks(source_hash: str) -> list[str]:
+    """
+    Divide el texto de origen en chunks para el extractor y los guarda en Redis
+    (`extraction_chunks:{hash}`) para que cada uno se procese por separado.
+    Devuelve el hash de cada chunk, en orden.
+    """
+    source_text = source_text_buffer(source_hash)
+    if not source_text.exists():
+        raise Exception("No se encontró el texto de origen en Redis")
+    printer.yellow(f"🔍 Caracteres del texto de origen: {len(source_text)}")
+
+    # Los segmentos se leen de Redis de a uno y se agrupan en chunks que
+    # respetan las páginas y el presupuesto de tokens del extractor
+    key = f"extraction_chunks:{source_hash}"
+    redis_cache.delete(key)
+    digests = []
+    for chunk in iter_extraction_chunks(source_text.iter_segments()):
+        printer.yellow(f"🔍 Chunk {len(digests)}: {chunk.tokens} tokens")
+        redis_cache.rpush(key, chunk.text)
+        digests.append(hasher(chunk.text))
+    if not digests:
+        raise EmptyDocumentError(f"Documento sin texto: {source_hash}")
+    redis_cache.expire(key, EXPIRATION_TIME)
+    printer.yellow(f"🔍 N chunks: {len(digests)}")
+    return digests
+
+
+def extraction_checkpoint_key(source_hash: str) -> str:
+    """
+    Hash de Redis con la respuesta de cada chunk ya procesado. Cambiar el prompt
+    del extractor o el modelo invalida los checkpoints anteriores.
+    """
+    prompt_version = hasher(get_prompt_from_file("EXTRACTOR"))[:12]
+    model = os.getenv("MODEL", "gemma3")
+    return f"extraction_checkpoint:{source_hash}:{prompt_version}:{model}"
+
+
+def chunk_checkpoint_field(index: int, digest: str) -> str:
+    # El hash del chunk evita reutilizar respuestas si cambió la división del texto
+    return f"{index}:{digest}"
+
+
+def missing_extraction_chunks(source_hash: str, digests: list[str]) -> list[int]:
+    done = redis_cache.hgetall(extraction_checkpoint_key(source_hash))
+    missing = [
+        index
+        for index, digest in enumerate(digests)
+        if chunk_checkpoint_field(index, digest) not in done
+    ]
+    if len(missing) < len(digests):
+        printer.green(
+            f"🔍 Reutilizando {len(digests) - len(missing)} chunks ya extraídos"
+        )
+    return missing
+
+
+def load_extraction_chunk(
+    source_hash: str, index: int
+) -> tuple[str, str, str | None]:
+    """Devuelve el texto del chunk, su campo de checkpoint y la respuesta guardada."""
+    chunk = redis_cache.lrange(f"extraction_chunks:{source_hash}", index, index)
+    if not chunk:
+        raise Exception(f"No se encontró el chunk {index} en Redis")
+    field = chunk_checkpoint_field(index, hasher(chunk[0]))
+    response = redis_cache.hget(extraction_checkpoint_key(source_hash), field)
+    if response is not None:
+        printer.green(f"🔍 Chunk {index} ya extraído, se reutiliza")
+    return chunk[0], field, response
+
+
+def save_extraction_checkpoint(source_hash: str, field: str, response: str):
+    checkpoint_key = extraction_checkpoint_key(source_hash)
+    redis_cache.hset(checkpoint_key, field, response)
+    redis_cache.expire(checkpoint_key, EXPIRATION_TIME)
+
+
+def extract_chunk(source_hash: str, index: int) -> str:
+    chunk, field, response = load_extraction_chunk(source_hash, index)
+    if response is not None:
+        return response
+
+    response = extract_data_from_chunk(chunk)
+    printer.yellow(f"🔍 Respuesta del chunk {index}...: {response}")
+    save_extraction_checkpoint(source_hash, field, response)
+    return response
+
+
+async def aextract_chunk(source_hash: str, index: int) -> str:
+    chunk, field, response = load_extraction_chunk(source_hash, index)
+    if response is not None:
+        return response
+
+    response = await aextract_data_from_chunk(chunk)
+    printer.yellow(f"🔍 Respuesta del chunk {index}...: {response}")
+    save_extraction_checkpoint(source_hash, field, response)
+    return response
+
+
+async def aextract_chunks(source_hash: str, indexes: list[int]):
+    results = await asyncio.gather(
+        *(aextract_chunk(source_hash, index) for index in indexes),
+        return_exceptions=True,
+    )
+    # Los chunks que sí terminaron ya quedaron guardados como checkpoint
+    errors = [result for result in results if isinstance(result, Exception)]
+    if errors:
+        raise errors[0]
+
+
+def assemble_extracted_data(source_hash: str, digests: list[str]) -> str:
+    """Une en orden las respuestas de los chunks en `extracted_data:{hash}`."""
+    done = redis_cache.hgetall(extraction_checkpoint_key(source_hash))
+    responses = []
+    for index, digest in enumerate(digests):
+        response = done.get(chunk_checkpoint_field(index, digest))
+        if response is None:
+            raise Exception(f"Falta la respuesta del chunk {index} en Redis")
+        responses.append(response + "\n")
+    cummulative_response = "".join(responses)
+    redis_cache.set(
+        f"extracted_data:{source_hash}", cummulative_response, ex=EXPIRATION_TIME
+    )
+    redis_cache.delete(f"extraction_chunks:{source_hash}")
+    return cummulative_response
+
+
+def concurrent_extraction(source_hash: str) -> str:
+    """
+    Extrae todos los chunks desde el proceso actual con peticiones async
+    simultáneas (hasta LLM_MAX_CONCURRENCY), sin repartirlos entre workers.
+    """
+    digests = plan_extraction_chunks(source_hash)
+    missing = missing_extraction_chunks(source_hash, digests)
+    asyncio.run(aextract_chunks(source_hash, missing))
+    return assemble_extracted_data(source_hash, digests)
+
+
+def feedback_generator_messages(messages: str) -> list[dict]:
+    return build_messages(
+        "feedback_generator",
+        get_prompt_from_file("FEEDBACK_GENERATOR"),
+        user_content=messages,
+        max_output_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+
+
+def generate_feedback_from_messages(sources_hash: str, messages: str):
+    try:
+        messages = feedback_generator_messages(messages)
+    except PromptBudgetExceeded as e:
+        printer.yellow(f"✂️ {e}, se conserva solo el final de la conversación")
+        messages = feedback_generator_messages(split_to_fit(messages, e)[-1])
+    ai_interface = get_ai_interface()
+    res = ai_interface.chat(
+        messages=messages,
+        model=os.getenv("MODEL", "gemma3"),
+        max_tokens=RESPONSE_MAX_OUTPUT_TOKENS,
+    )
+    res = clean_reasoning_tag(res)
+    res = clean_markdown_block(res)
+    printer.yellow("🔍 Feedback generado: ", res)
+    redis_cache.set(
+        f"feedback:{sources_hash}",
+        res,
+        ex=EXPIRATION_TIME,
+    )
+    return res
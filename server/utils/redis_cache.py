@@ -1,63 +1,147 @@
-import os
-import redis
-from dotenv import load_dotenv
-
-
-load_dotenv()
-
-
-class RedisCache:
-    def __init__(self):
-        self.client = redis.Redis(
-            host=os.getenv("REDIS_HOST", "localhost"),
-            port=int(os.getenv("REDIS_PORT", 6379)),
-            db=int(os.getenv("REDIS_DB", 0)),
-            password=os.getenv("REDIS_PASSWORD", None),
-            decode_responses=True,
-        )
-
-    # ------------ Strings ------------
-    def exists(self, key: str) -> bool:
-        return self.client.exists(key) == 1
-
-    def get(self, key: str) -> str | None:
-        return self.client.get(key)
-
-    def set(self, key: str, value: str, ex: int | None = None) -> None:
-        self.client.set(key, value, ex=ex)
-
-    def delete(self, key: str) -> None:
-        self.client.delete(key)
-
-    def flush_all(self):
-        self.client.flushall()
-
-    def hset(self, name: str, key: str, value: str) -> None:
-        self.client.hset(name, key, value)
-
-    def hget(self, name: str, key: str) -> str | None:
-        return self.client.hget(name, key)
-
-    def hdel(self, name: str, key: str) -> None:
-        self.client.hdel(name, key)
-
-    def hgetall(self, name: str) -> dict:
-        return self.client.hgetall(name)
-
-    def rpush(self, key: str, value: str) -> None:
-        self.client.rpush(key, value)
-
-    def lrange(self, key: str, start: int, end: int) -> list[str]:
-        return self.client.lrange(key, start, end)
-
-    def lpop(self, key: str) -> str | None:
-        return self.client.lpop(key)
-
-    def lset(self, key: str, index: int, value: str) -> None:
-        self.client.lset(key, index, value)
-
-    def lrem(self, key: str, count: int, value: str) -> None:
-        self.client.lrem(key, count, value)
-
-    def llen(self, key: str) -> int:
-        return self.client.llen(key)
+import os
+import redis
+import redis.asyncio
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def connection_kwargs(decode_responses: bool = True) -> dict:
+    return dict(
+        host=os.getenv("REDIS_HOST", "localhost"),
+        port=int(os.getenv("REDIS_PORT", 6379)),
+        db=int(os.getenv("REDIS_DB", 0)),
+        password=os.getenv("REDIS_PASSWORD", None),
+        decode_responses=decode_responses,
+    )
+
+
+class RedisCache:
+    def __init__(self, decode_responses: bool = True):
+        # decode_responses=False permite guardar contenido binario (archivos subidos)
+        self.client = redis.Redis(**connection_kwargs(decode_responses))
+
+    # ------------ Strings ------------
+    def exists(self, key: str) -> bool:
+        return self.client.exists(key) == 1
+
+    def get(self, key: str) -> str | None:
+        return self.client.get(key)
+
+    def set(
+        self, key: str, value: str, ex: int | None = None, nx: bool = False
+    ) -> bool:
+        """Con `nx` solo escribe si la clave no existe; devuelve si escribió."""
+        return bool(self.client.set(key, value, ex=ex, nx=nx))
+
+    def expire(self, key: str, seconds: int) -> None:
+        self.client.expire(key, seconds)
+
+    def delete(self, *keys: str) -> None:
+        self.client.delete(*keys)
+
+    def flush_all(self):
+        self.client.flushall()
+
+    def hset(self, name: str, key: str, value: str) -> None:
+        self.client.hset(name, key, value)
+
+    def hget(self, name: str, key: str) -> str | None:
+        return self.client.hget(name, key)
+
+    def hdel(self, name: str, key: str) -> None:
+        self.client.hdel(name, key)
+
+    def hgetall(self, name: str) -> dict:
+        return self.client.hgetall(name)
+
+    def rpush(self, key: str, value: str) -> None:
+        self.client.rpush(key, value)
+
+    def lrange(self, key: str, start: int, end: int) -> list[str]:
+        return self.client.lrange(key, start, end)
+
+    def lpop(self, key: str) -> str | None:
+        return self.client.lpop(key)
+
+    def lset(self, key: str, index: int, value: str) -> None:
+        self.client.lset(key, index, value)
+
+    def lrem(self, key: str, count: int, value: str) -> None:
+        self.client.lrem(key, count, value)
+
+    def llen(self, key: str) -> int:
+        return self.client.llen(key)
+
+    # ------------ Counters ------------
+    def incrby(self, key: str, amount: int = 1) -> int:
+        return self.client.incrby(key, amount)
+
+    def hincrby(self, name: str, key: str, amount: int = 1) -> int:
+        return self.client.hincrby(name, key, amount)
+
+    def hincrbyfloat(self, name: str, key: str, amount: float) -> float:
+        return self.client.hincrbyfloat(name, key, amount)
+
+    def hincrby_many(self, name: str, amounts: dict[str, int | float]) -> None:
+        """Suma varios campos de un hash en una sola ida y vuelta."""
+        pipeline = self.client.pipeline(transaction=False)
+        for key, amount in amounts.items():
+            if isinstance(amount, float):
+                pipeline.hincrbyfloat(name, key, amount)
+            else:
+                pipeline.hincrby(name, key, amount)
+        pipeline.execute()
+
+    # ------------ Scripts ------------
+    def register_script(self, script: str):
+        """Script de Lua que Redis ejecuta de forma atómica (se envía por su SHA)."""
+        return self.client.register_script(script)
+
+    # ------------ Pub/Sub ------------
+    def publish(self, channel: str, message: str) -> int:
+        return self.client.publish(channel, message)
+
+    # ------------ Streams ------------
+    def xadd(self, name: str, fields: dict, maxlen: int | None = None) -> str:
+        return self.client.xadd(name, fields, maxlen=maxlen, approximate=True)
+
+    # ------------ Sorted sets ------------
+    def zadd(self, name: str, mapping: dict) -> None:
+        self.client.zadd(name, mapping)
+
+    def zrem(self, name: str, *values: str) -> None:
+        self.client.zrem(name, *values)
+
+    def zcount(self, name: str, min: float | str, max: float | str) -> int:
+        return self.client.zcount(name, min, max)
+
+    def zremrangebyscore(self, name: str, min: float | str, max: float | str) -> None:
+        self.client.zremrangebyscore(name, min, max)
+
+
+class AsyncRedisCache:
+    """
+    Cliente de Redis para las rutas async que esperan eventos (streams, pub/sub)
+    sin bloquear el event loop de FastAPI.
+    """
+
+    def __init__(self):
+        self.client = redis.asyncio.Redis(**connection_kwargs())
+
+    async def get(self, key: str) -> str | None:
+        return await self.client.get(key)
+
+    async def exists(self, key: str) -> bool:
+        return await self.client.exists(key) == 1
+
+    async def delete(self, *keys: str) -> None:
+        await self.client.delete(*keys)
+
+    async def xread(
+        self, streams: dict, count: int | None = None, block: int | None = None
+    ) -> list:
+        return await self.client.xread(streams, count=count, block=block)
+
+    def pubsub(self) -> redis.asyncio.client.PubSub:
+        return self.client.pubsub()
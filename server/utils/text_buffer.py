@@ -0,0 +1,134 @@
+import os
+from typing import Iterable, Iterator
+from server.utils.printer import Printer
+from server.utils.redis_cache import RedisCache
+
+printer = Printer("TEXT_BUFFER")
+
+# Máximo de caracteres que el buffer de ingesta mantiene en memoria antes de
+# volcarlos a Redis; también es el tamaño de cada segmento guardado
+INGEST_BUFFER_MAX_CHARS = int(os.getenv("INGEST_BUFFER_MAX_CHARS", 1_048_576))
+
+
+class SegmentedText:
+    """
+    Texto largo guardado en Redis como una lista de segmentos de tamaño fijo
+    (`{key}:segments`) más sus metadatos (`{key}:meta`). Se escribe con
+    `writer()` y se lee por rangos sin cargar el texto completo en memoria.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        segment_chars: int = INGEST_BUFFER_MAX_CHARS,
+        ex: int | None = None,
+    ):
+        self.redis = RedisCache()
+        self.key = key
+        self.segments_key = f"{key}:segments"
+        self.meta_key = f"{key}:meta"
+        self.segment_chars = max(1, segment_chars)
+        self.ex = ex
+
+    def exists(self) -> bool:
+        return self.redis.hget(self.meta_key, "length") is not None
+
+    def delete(self) -> None:
+        self.redis.delete(self.segments_key, self.meta_key)
+
+    def writer(self) -> "TextSpooler":
+        return TextSpooler(self)
+
+    def _meta(self) -> tuple[int, int]:
+        length = self.redis.hget(self.meta_key, "length")
+        if length is None:
+            raise KeyError(f"No se encontró el texto en Redis: {self.key}")
+        return int(length), int(self.redis.hget(self.meta_key, "segment_chars"))
+
+    def __len__(self) -> int:
+        return self._meta()[0]
+
+    def read(self, offset: int = 0, size: int | None = None) -> str:
+        """Lee `size` caracteres desde `offset` trayendo solo los segmentos necesarios."""
+        length, segment_chars = self._meta()
+        end = length if size is None else min(length, offset + size)
+        if offset >= end:
+            return ""
+        first = offset // segment_chars
+        last = (end - 1) // segment_chars
+        text = "".join(self.redis.lrange(self.segments_key, first, last))
+        start = offset - first * segment_chars
+        return text[start : start + end - offset]
+
+    def iter_segments(self) -> Iterator[str]:
+        self._meta()  # Falla si el texto no existe
+        index = 0
+        while True:
+            segment = self.redis.lrange(self.segments_key, index, index)
+            if not segment:
+                return
+            yield segment[0]
+            index += 1
+
+
+class TextSpooler:
+    """
+    Acumula fragmentos de texto y vuelca a Redis cada segmento completo, por lo
+    que la memoria usada no depende del tamaño del documento.
+    """
+
+    def __init__(self, text: SegmentedText):
+        self.text = text
+        self.pending: list[str] = []
+        self.pending_chars = 0
+        self.length = 0
+        self.segments = 0
+        # Un reintento no debe mezclar segmentos de una escritura anterior
+        self.text.delete()
+
+    def write(self, fragment: str) -> None:
+        if not fragment:
+            return
+        self.pending.append(fragment)
+        self.pending_chars += len(fragment)
+        self.length += len(fragment)
+        if self.pending_chars >= self.text.segment_chars:
+            self._flush(final=False)
+
+    def write_all(self, fragments: Iterable[str]) -> None:
+        for fragment in fragments:
+            self.write(fragment)
+
+    def _flush(self, final: bool) -> None:
+        buffered = "".join(self.pending)
+        size = self.text.segment_chars
+        cut = len(buffered) if final else len(buffered) - len(buffered) % size
+        for i in range(0, cut, size):
+            self.text.redis.rpush(self.text.segments_key, buffered[i : i + size])
+            self.segments += 1
+        rest = buffered[cut:]
+        self.pending = [rest] if rest else []
+        self.pending_chars = len(rest)
+
+    def close(self) -> int:
+        """Escribe el último segmento y los metadatos. Devuelve la longitud total."""
+        self._flush(final=True)
+        self.text.redis.hset(self.text.meta_key, "length", str(self.length))
+        self.text.redis.hset(
+            self.text.meta_key, "segment_chars", str(self.text.segment_chars)
+        )
+        if self.text.ex:
+            self.text.redis.expire(self.text.segments_key, self.text.ex)
+            self.text.redis.expire(self.text.meta_key, self.text.ex)
+        printer.blue(
+            f"Texto guardado en {self.text.key}: {self.length} caracteres "
+            f"en {self.segments} segmentos"
+        )
+        return self.length
+
+    def __enter__(self) -> "TextSpooler":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
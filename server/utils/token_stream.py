@@ -0,0 +1,67 @@
+import json
+import os
+import time
+from server.ai.ai_interface import TokenSink
+from server.utils.printer import Printer
+from server.utils.redis_cache import RedisCache
+
+printer = Printer("TOKEN_STREAM")
+
+# Los tokens se agrupan y se publican como mucho cada este número de segundos
+TOKEN_STREAM_FLUSH_SECONDS = float(os.getenv("TOKEN_STREAM_FLUSH_SECONDS", 0.05))
+TOKEN_STREAM_EXPIRATION_TIME = 60 * 60  # 1 hora
+
+
+def sentence_stream_key(source_hash: str) -> str:
+    return f"sentence_stream:{source_hash}"
+
+
+class RedisTokenStream(TokenSink):
+    """
+    Publica la generación de una sentencia en un stream de Redis
+    (`sentence_stream:{hash}`). Cada entrada tiene un `type`:
+    token (texto parcial), reset (la generación empieza de nuevo),
+    done (sentencia final en `data`) o error.
+    """
+
+    def __init__(self, source_hash: str):
+        self.redis = RedisCache()
+        self.key = sentence_stream_key(source_hash)
+        self.pending: list[str] = []
+        self.last_flush = time.monotonic()
+
+    def start(self):
+        # Un reintento de la tarea empieza una generación nueva
+        self.pending = []
+        self.publish("reset")
+
+    def publish(self, event_type: str, data: str = ""):
+        try:
+            self.redis.xadd(self.key, {"type": event_type, "data": data})
+            self.redis.expire(self.key, TOKEN_STREAM_EXPIRATION_TIME)
+        except Exception as e:
+            # El stream es opcional, la sentencia se guarda igual al terminar
+            printer.error(f"❌ Error publicando en {self.key}: {e}")
+
+    def write(self, token: str):
+        self.pending.append(token)
+        if time.monotonic() - self.last_flush >= TOKEN_STREAM_FLUSH_SECONDS:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.publish("token", "".join(self.pending))
+            self.pending = []
+        self.last_flush = time.monotonic()
+
+    def reset(self):
+        self.pending = []
+        self.publish("reset")
+
+    def done(self, payload: dict):
+        self.flush()
+        self.publish("done", json.dumps(payload))
+
+    def error(self, message: str):
+        self.flush()
+        self.publish("error", message)
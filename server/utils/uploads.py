@@ -0,0 +1,34 @@
+import hashlib
+import io
+
+from fastapi import UploadFile
+from pydantic import BaseModel
+
+# Tamaño de los bloques leídos del archivo subido
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadedSource(BaseModel):
+    """Archivo subido por el usuario, ya leído en memoria junto con su SHA-256."""
+
+    name: str
+    data: bytes
+    sha256: str
+
+
+async def read_upload(upload: UploadFile) -> UploadedSource:
+    """
+    Lee el archivo subido por bloques calculando su SHA-256 al mismo tiempo,
+    sin escribirlo en ningún directorio compartido.
+    """
+    digest = hashlib.sha256()
+    buffer = io.BytesIO()
+    while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+        digest.update(chunk)
+        buffer.write(chunk)
+
+    return UploadedSource(
+        name=upload.filename,
+        data=buffer.getvalue(),
+        sha256=digest.hexdigest(),
+    )